@@ -0,0 +1,384 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Processing paths the benchmark can run; "realesrgan" needs model weights, so it is opt-in
+BENCHMARK_PATHS = ("classic", "multithreaded", "parallel", "extract", "compile", "extract_raw", "compile_raw", "mux", "process", "realesrgan")
+DEFAULT_PATHS = ("classic", "multithreaded", "parallel", "extract", "compile", "extract_raw", "compile_raw", "mux", "process")
+# Only these paths read the audio track, the others run on the clips without audio
+AUDIO_PATHS = ("mux", "process")
+
+MOTION_PROFILES = ("static", "pan", "noise", "cuts")
+DEFAULT_RESOLUTIONS = ("320x240", "1280x720")
+DEFAULT_LENGTHS = (48, 192)
+DEFAULT_MOTIONS = ("static", "pan", "noise")
+CLIP_FPS = 24
+
+# Functions of bytecrush that are timed as stages; nested stages are included in their parent's time
+STAGE_FUNCTIONS = (
+    "create_images_from_video", "compile_images_to_video", "create_raw_frames_from_video", "compile_raw_frames_to_video", "upscale_with_realesrgan", "upscale_with_realesrgan_streaming",
+    "upscale_and_enhance_video", "upscale_and_enhance_video_multithreaded", "upscale_and_enhance_video_parallel",
+    "stream_video", "concat_video_segments", "add_audio_to_video", "mux_audio",
+)
+# How often the temp directory of a running case is measured (seconds)
+DISK_POLL_INTERVAL = 0.05
+
+# --startup times these commands in a fresh interpreter, keeping the median of STARTUP_RUNS runs
+STARTUP_COMMANDS = {
+    "import": ["-c", "import bytecrush"],
+    "cli": ["bytecrush.py", "run", "--help"],
+}
+STARTUP_RUNS = 5
+# Median startup time every command must stay under (seconds)
+STARTUP_TIME_TARGET = 0.5
+# Modules bytecrush only imports on first use; none of them may be loaded at startup
+LAZY_MODULES = ("moviepy", "torch", "basicsr", "realesrgan", "tkinter", "PIL", "matplotlib")
+
+
+def make_texture(width, height, seed):
+    # Smooth random blobs with some fine detail, closer to real footage than white noise
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(2, height // 16), max(2, width // 16), 3), dtype=np.uint8)
+    texture = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    fine = rng.integers(-12, 13, (height, width, 3))
+    return np.clip(texture.astype(np.int16) + fine, 0, 255).astype(np.uint8)
+
+
+def make_clip(path, width, height, frame_count, motion, audio, fps=CLIP_FPS):
+    # Write a synthetic clip; with audio, a sine tone is muxed in with ffmpeg
+    from bytecrush import get_ffmpeg_exe
+
+    video_path = path if not audio else path + ".video.mp4"
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    texture = make_texture(width, height, 0)
+    rng = np.random.default_rng(1)
+    for i in range(frame_count):
+        if motion == "static":
+            frame = texture.copy()
+        elif motion == "pan":
+            frame = np.roll(texture, 4 * i, axis=1)
+        elif motion == "noise":
+            frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        elif motion == "cuts":
+            # A new shot every two seconds, panning within the shot
+            frame = np.roll(make_texture(width, height, i // (2 * fps)), 4 * i, axis=1)
+        else:
+            raise ValueError(f"Unknown motion profile: {motion}")
+        cv2.putText(frame, str(i), (10, height // 2), cv2.FONT_HERSHEY_SIMPLEX, max(0.5, height / 240), (255, 255, 255), 2)
+        out.write(frame)
+    out.release()
+
+    if audio:
+        duration = frame_count / fps
+        subprocess.run(
+            [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", video_path, "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+             "-c:v", "copy", "-c:a", "aac", "-shortest", path],
+            check=True,
+        )
+        os.remove(video_path)
+
+
+def get_clip_name(width, height, frame_count, motion, audio):
+    return f"{width}x{height}_{frame_count}f_{motion}{'_audio' if audio else ''}"
+
+
+def get_directory_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def get_peak_rss():
+    # Peak resident set size of this process and its finished children, in bytes
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    unit = 1 if sys.platform == "darwin" else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * unit
+
+
+def instrument_stages(module, stages):
+    # Replace the stage functions of the module with wrappers that add up their wall time
+    for name in STAGE_FUNCTIONS:
+        function = getattr(module, name, None)
+        if function is None:
+            continue
+
+        def timed(*args, _function=function, _name=name, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return _function(*args, **kwargs)
+            finally:
+                stages[_name] = stages.get(_name, 0.0) + time.perf_counter() - start_time
+
+        setattr(module, name, timed)
+
+
+def run_case(case, work_dir):
+    # Runs in a fresh child process so peak RSS belongs to this case only
+    import bytecrush
+
+    clip_path = case["clip_path"]
+    output_path = os.path.join(work_dir, "output.mp4")
+    scale = case["scale"]
+    num_workers = case["workers"]
+
+    # Untimed setup for the paths that start from intermediate files
+    images_path = os.path.join(work_dir, "images")
+    if case["path"] == "compile":
+        os.makedirs(images_path)
+        bytecrush.create_images_from_video(clip_path, images_path)
+    frames_path = os.path.join(work_dir, "frames.frames")
+    if case["path"] == "compile_raw":
+        bytecrush.create_raw_frames_from_video(clip_path, frames_path)
+
+    stages = {}
+    instrument_stages(bytecrush, stages)
+
+    start_time = time.perf_counter()
+    if case["path"] == "classic":
+        bytecrush.upscale_and_enhance_video(clip_path, output_path, None, scale, case["sharpen"], case["denoise"])
+    elif case["path"] == "multithreaded":
+        bytecrush.upscale_and_enhance_video_multithreaded(clip_path, output_path, scale, case["sharpen"], case["denoise"], num_workers)
+    elif case["path"] == "parallel":
+        bytecrush.upscale_and_enhance_video_parallel(clip_path, output_path, scale, case["sharpen"], case["denoise"], num_workers, temp_segments_path=os.path.join(work_dir, "segments"))
+    elif case["path"] == "extract":
+        os.makedirs(images_path)
+        bytecrush.create_images_from_video(clip_path, images_path)
+        output_path = images_path
+    elif case["path"] == "compile":
+        bytecrush.compile_images_to_video(images_path, output_path, bytecrush.get_video_fps(clip_path))
+    elif case["path"] == "extract_raw":
+        bytecrush.create_raw_frames_from_video(clip_path, frames_path)
+        output_path = frames_path
+    elif case["path"] == "compile_raw":
+        bytecrush.compile_raw_frames_to_video(frames_path, output_path, bytecrush.get_video_fps(clip_path))
+    elif case["path"] == "mux":
+        # The clip stands in for the processed video, so only the muxing is measured
+        bytecrush.add_audio_to_video(clip_path, clip_path, output_path)
+    elif case["path"] == "process":
+        bytecrush.process_video(clip_path, output_path, scale, case["sharpen"], case["denoise"], jobs_dir=os.path.join(work_dir, "jobs"))
+    elif case["path"] == "realesrgan":
+        bytecrush.upscale_with_realesrgan_streaming(clip_path, output_path, case["outscale"], {"model_name": case["model"]})
+    else:
+        raise ValueError(f"Unknown benchmark path: {case['path']}")
+    seconds = time.perf_counter() - start_time
+
+    # The processing functions print their errors instead of raising, so check the output
+    return {
+        "ok": os.path.exists(output_path),
+        "seconds": seconds,
+        "fps": case["frames"] / seconds if seconds > 0 else None,
+        "peak_rss_bytes": get_peak_rss(),
+        "stages": stages,
+    }
+
+
+def run_case_in_subprocess(case, work_dir):
+    # Run one case in a child process and measure the peak size of its temp directory meanwhile
+    os.makedirs(work_dir)
+    case_path = os.path.join(work_dir, "case.json")
+    result_path = os.path.join(work_dir, "result.json")
+    log_path = os.path.join(work_dir, "log.txt")
+    with open(case_path, "w") as f:
+        json.dump(case, f)
+
+    # The CPU backend is benchmarked, so results compare across machines with and without a GPU
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+    peak_temp_bytes = 0
+    with open(log_path, "w") as log:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--case", case_path, "--result", result_path],
+                                 env=env, stdout=log, stderr=subprocess.STDOUT)
+        while child.poll() is None:
+            peak_temp_bytes = max(peak_temp_bytes, get_directory_size(work_dir))
+            time.sleep(DISK_POLL_INTERVAL)
+
+    result = {"ok": False}
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            result = json.load(f)
+    if not result["ok"]:
+        with open(log_path, errors="replace") as f:
+            result["log_tail"] = f.read()[-2000:]
+    # The case's own files (case.json, logs) are small next to frames and videos
+    result["peak_temp_bytes"] = peak_temp_bytes
+    return result
+
+
+def measure_startup(runs=STARTUP_RUNS, target=STARTUP_TIME_TARGET):
+    # Time each startup command and list the lazy modules that importing bytecrush loads anyway
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {"target": target, "runs": runs, "commands": {}}
+    for name, args in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(runs):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=package_dir, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start_time)
+        median = sorted(times)[len(times) // 2]
+        results["commands"][name] = {"median": median, "times": times, "ok": median <= target}
+        print(f"{name}: {median:.3f}s (target {target:.3f}s)", file=sys.stderr)
+
+    check = f"import sys, bytecrush; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, "-c", check], cwd=package_dir, check=True, capture_output=True, text=True).stdout.strip()
+    results["eager_modules"] = [module for module in loaded.split(",") if module]
+    for module in results["eager_modules"]:
+        print(f"{module} is imported at startup", file=sys.stderr)
+    results["ok"] = all(command["ok"] for command in results["commands"].values()) and not results["eager_modules"]
+    return results
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline):
+    # Print the frames/sec change of every case that is also in the baseline
+    baseline_cases = {case["name"]: case for case in baseline["cases"]}
+    for case in results["cases"]:
+        old = baseline_cases.get(case["name"])
+        if old is None or not case.get("fps") or not old.get("fps"):
+            continue
+        change = (case["fps"] / old["fps"] - 1) * 100
+        print(f"{case['name']}: {old['fps']:.2f} -> {case['fps']:.2f} frames/sec ({change:+.1f}%)", file=sys.stderr)
+
+
+def parse_resolution(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bytecrush processing paths on synthetic clips")
+    parser.add_argument("-o", "--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--paths", default=",".join(DEFAULT_PATHS), help=f"Comma separated paths: {', '.join(BENCHMARK_PATHS)}")
+    parser.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS), help="Comma separated WIDTHxHEIGHT")
+    parser.add_argument("--lengths", default=",".join(map(str, DEFAULT_LENGTHS)), help="Comma separated clip lengths in frames")
+    parser.add_argument("--motions", default=",".join(DEFAULT_MOTIONS), help=f"Comma separated motion profiles: {', '.join(MOTION_PROFILES)}")
+    parser.add_argument("--audio", choices=("with", "without", "both"), default="both", help="Clips with and/or without an audio track")
+    parser.add_argument("--scale", type=float, default=2.0, help="Scale factor for the resize paths")
+    parser.add_argument("--sharpen", type=float, default=5, help="Sharpening intensity for the resize paths")
+    parser.add_argument("--denoise", type=float, default=0, help="Denoise strength for the resize paths")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Threads/processes for the multithreaded and parallel paths")
+    parser.add_argument("--model", default="realesr-animevideov3", help="RealESRGAN model for the realesrgan path")
+    parser.add_argument("--outscale", type=float, default=2, help="RealESRGAN output scale")
+    parser.add_argument("--work-dir", help="Directory for clips and temp files (default: a new temp directory, removed afterwards)")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare frames/sec against")
+    parser.add_argument("--startup", action="store_true", help=f"Only check the startup time against the {STARTUP_TIME_TARGET:g}s target and that the lazy modules stay unloaded")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        # Child process: run a single case and write its result
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        with open(args.case) as f:
+            case = json.load(f)
+        result = run_case(case, os.path.dirname(os.path.abspath(args.case)))
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    if args.startup:
+        results = measure_startup()
+        results.update({"commit": get_git_commit(), "python": platform.python_version(), "platform": platform.platform()})
+        text = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return 0 if results["ok"] else 1
+
+    paths = [path for path in args.paths.split(",") if path]
+    for path in paths:
+        if path not in BENCHMARK_PATHS:
+            parser.error(f"unknown path: {path}")
+    motions = [motion for motion in args.motions.split(",") if motion]
+    for motion in motions:
+        if motion not in MOTION_PROFILES:
+            parser.error(f"unknown motion profile: {motion}")
+    resolutions = [parse_resolution(value) for value in args.resolutions.split(",") if value]
+    lengths = [int(value) for value in args.lengths.split(",") if value]
+    audio_options = {"with": [True], "without": [False], "both": [False, True]}[args.audio]
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bytecrush_bench_")
+    clips_dir = os.path.join(work_dir, "clips")
+    runs_dir = os.path.join(work_dir, "runs")
+    os.makedirs(clips_dir, exist_ok=True)
+    shutil.rmtree(runs_dir, ignore_errors=True)
+
+    results = {
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "settings": {"scale": args.scale, "sharpen": args.sharpen, "denoise": args.denoise, "workers": args.workers, "model": args.model, "outscale": args.outscale},
+        "cases": [],
+    }
+
+    try:
+        for (width, height), frame_count, motion, audio in itertools.product(resolutions, lengths, motions, audio_options):
+            clip_name = get_clip_name(width, height, frame_count, motion, audio)
+            clip_path = os.path.join(clips_dir, clip_name + ".mp4")
+            if not os.path.exists(clip_path):
+                make_clip(clip_path, width, height, frame_count, motion, audio)
+
+            for path in paths:
+                # Audio only matters to the paths that mux it, and muxing needs an audio track
+                if audio and path not in AUDIO_PATHS:
+                    continue
+                if not audio and path == "mux":
+                    continue
+                name = f"{path}/{clip_name}"
+                print("Running", name, file=sys.stderr)
+                case = {
+                    "path": path, "clip_path": clip_path, "frames": frame_count, "scale": args.scale, "sharpen": args.sharpen,
+                    "denoise": args.denoise, "workers": args.workers, "model": args.model, "outscale": args.outscale,
+                }
+                result = run_case_in_subprocess(case, os.path.join(runs_dir, name.replace("/", "_")))
+                result.update({"name": name, "path": path, "clip": {"width": width, "height": height, "frames": frame_count, "motion": motion, "audio": audio}})
+                results["cases"].append(result)
+                shutil.rmtree(os.path.join(runs_dir, name.replace("/", "_")), ignore_errors=True)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_results(results, json.load(f))
+
+    return 0 if all(case["ok"] for case in results["cases"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
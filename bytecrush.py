@@ -1,118 +1,1276 @@
+# Only what every command needs is imported here. tkinter and PIL are imported when the GUI
+# starts, moviepy when audio is re-encoded and torch when RealESRGAN is first used, so the
+# headless commands start quickly (see benchmark.py --startup).
 import cv2
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import ttk
 import numpy as np
 from tqdm import tqdm
-from tkinter import PhotoImage
-from PIL import Image, ImageTk
 import threading
 import queue
 import multiprocessing
-from moviepy.editor import VideoFileClip, AudioFileClip
+from multiprocessing import shared_memory
+import concurrent.futures
 import platform
+import argparse
 import subprocess
 import os
+import asyncio
+import collections
+import hashlib
+import itertools
+import http.server
+import json
+import math
+import re
+import shutil
+import sys
+import time
+import urllib.parse
+import uuid
+
+from rawframes import RAW_FRAMES_EXT, RawFrameWriter, is_raw_frames, open_raw_frames, read_raw_frames_header
+
+
+# Set once the first filter chain has enabled OpenCL
+opencl_enabled = False
+
+
+def enable_opencl():
+    # Probing the OpenCL devices can take a while, so it waits until there is something to filter
+    global opencl_enabled
+    if not opencl_enabled:
+        cv2.ocl.setUseOpenCL(True)
+        opencl_enabled = True
+
+# RealESRGAN model used by the GUI
+DEFAULT_REALESRGAN_MODEL = "realesr-general-x4v3"
+
+
+
+
+# Histogram buckets (seconds) for per-frame stage times and queue waits
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PipelineMetrics:
+    # Counters, gauges and histograms for the processing stages, keyed by name and labels.
+    # Stage names: decode, filter, inference, encode and mux, plus spill/load for the temp frame path.
+    # Snapshots are plain dicts, so worker processes can send theirs back to be merged.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def set_max(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = max(self.gauges.get(key, value), value)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * (len(METRICS_BUCKETS) + 1), "sum": 0.0, "count": 0}
+            histogram["counts"][self.bucket_index(value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @staticmethod
+    def bucket_index(value):
+        for i, bound in enumerate(METRICS_BUCKETS):
+            if value <= bound:
+                return i
+        return len(METRICS_BUCKETS)
+
+    def observe_stage(self, stage, seconds, frame_count=1):
+        # Time per frame of one stage; a batch counts as frame_count frames of equal cost
+        for _ in range(frame_count):
+            self.observe("bytecrush_stage_seconds", seconds / frame_count, stage=stage)
+        self.inc("bytecrush_stage_busy_seconds_total", seconds, stage=stage)
+
+    def observe_queue(self, queue_name, wait_seconds, depth):
+        self.observe("bytecrush_queue_wait_seconds", wait_seconds, queue=queue_name)
+        self.set("bytecrush_queue_depth", depth, queue=queue_name)
+        self.set_max("bytecrush_queue_depth_max", depth, queue=queue_name)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.gauges.items()],
+                "histograms": [{"name": name, "labels": dict(labels), "counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]} for (name, labels), h in self.histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        # Add the counters and histograms of another registry; its gauges replace ours
+        with self.lock:
+            for counter in snapshot["counters"]:
+                key = (counter["name"], tuple(sorted(counter["labels"].items())))
+                self.counters[key] = self.counters.get(key, 0) + counter["value"]
+            for gauge in snapshot["gauges"]:
+                self.gauges[(gauge["name"], tuple(sorted(gauge["labels"].items())))] = gauge["value"]
+            for other in snapshot["histograms"]:
+                key = (other["name"], tuple(sorted(other["labels"].items())))
+                histogram = self.histograms.setdefault(key, {"counts": [0] * (len(METRICS_BUCKETS) + 1), "sum": 0.0, "count": 0})
+                histogram["counts"] = [a + b for a, b in zip(histogram["counts"], other["counts"])]
+                histogram["sum"] += other["sum"]
+                histogram["count"] += other["count"]
+
+    def summary(self):
+        # Mean time per frame and utilization of every stage, to see which one bounds throughput
+        summary = {}
+        with self.lock:
+            for (name, labels), h in self.histograms.items():
+                if h["count"]:
+                    label = dict(labels).get("stage") or "queue:" + dict(labels).get("queue", "")
+                    summary.setdefault(label, {})["count"] = h["count"]
+                    summary[label]["mean_seconds"] = h["sum"] / h["count"]
+            for (name, labels), value in self.gauges.items():
+                if name == "bytecrush_stage_utilization":
+                    summary.setdefault(dict(labels)["stage"], {})["utilization"] = value
+                elif name == "bytecrush_queue_depth_max":
+                    summary.setdefault("queue:" + dict(labels)["queue"], {})["max_depth"] = value
+        return summary
+
+    def render_prometheus(self):
+        # Prometheus text exposition format
+        def format_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+        lines = []
+        with self.lock:
+            for metric_type, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for (metric_name, labels), value in sorted(metrics.items()):
+                        if metric_name == name:
+                            lines.append(f"{name}{format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric_name, labels), h in sorted(self.histograms.items()):
+                    if metric_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(METRICS_BUCKETS + ("+Inf",), h["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {h['sum']}")
+                    lines.append(f"{name}_count{format_labels(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide metrics of every job run by this process
+METRICS = PipelineMetrics()
+# JSON lines file that job events are appended to, if set
+metrics_log_path = None
+metrics_log_lock = threading.Lock()
+
+
+def record_stage_time(stage, stage_start, frame_count=1, metrics=METRICS):
+    # Record the time since stage_start for one stage and return it
+    seconds = time.perf_counter() - stage_start
+    metrics.observe_stage(stage, seconds, frame_count)
+    return seconds
+
+
+def record_stage_utilization(stage_seconds, elapsed, metrics=METRICS):
+    # For single-threaded loops: the share of the wall time spent in each stage
+    for stage, seconds in stage_seconds.items():
+        metrics.set("bytecrush_stage_workers", 1, stage=stage)
+        if elapsed > 0:
+            metrics.set("bytecrush_stage_utilization", seconds / elapsed, stage=stage)
+
+
+def set_metrics_log(path):
+    global metrics_log_path
+    metrics_log_path = path
+
+
+def log_metrics_event(event, **fields):
+    # Append one structured record with the current per-stage summary to the metrics log
+    if metrics_log_path is None:
+        return
+    record = {"time": time.time(), "event": event, **fields, "stages": METRICS.summary()}
+    with metrics_log_lock:
+        with open(metrics_log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    # Serve METRICS at http://host:port/metrics for Prometheus to scrape
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = METRICS.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+# Sharpening intensity (the GUI slider goes from 0 to 10) at which the sharpen kernel equals
+# the classic [[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]] kernel
+FULL_SHARPEN_INTENSITY = 10.0
+
+# Non-local means settings per denoise mode: (template window, search window, processing scale).
+# "quality" uses OpenCV's default windows, "fast" searches a smaller window (~2.5x faster) and
+# "draft" also denoises at half resolution (~8x faster but softer) for long videos.
+DENOISE_MODES = {
+    "quality": (7, 21, 1.0),
+    "fast": (5, 11, 1.0),
+    "draft": (5, 11, 0.5),
+}
+DEFAULT_DENOISE_MODE = "fast"
+
+
+def build_sharpen_kernel(sharpen_intensity):
+    # Identity plus a scaled Laplacian, so the intensity controls the strength of the sharpening
+    amount = sharpen_intensity / FULL_SHARPEN_INTENSITY
+    kernel = np.full((3, 3), -amount, dtype=np.float32)
+    kernel[1, 1] = 1 + 8 * amount
+    return kernel
+
+
+class FilterChain:
+    # The denoise/resize/sharpen filters of one job, built once and applied to every frame.
+    # The kernel is precomputed from the intensity and intermediate frames go into per-thread
+    # buffers that are reused across frames instead of being allocated each time.
+    # resize_first sharpens at the output resolution, which looks cleaner for large upscale factors
+    # but costs more per frame. Denoising always runs at the smaller of the input and output sizes.
+
+    def __init__(self, output_size, sharpen_intensity=0, resize_first=False, denoise_strength=0, denoise_mode=DEFAULT_DENOISE_MODE, interpolation=cv2.INTER_LINEAR):
+        if denoise_mode not in DENOISE_MODES:
+            raise ValueError(f"Unknown denoise mode: {denoise_mode}")
+        enable_opencl()
+        self.output_size = output_size
+        self.kernel = build_sharpen_kernel(sharpen_intensity) if sharpen_intensity > 0 else None
+        self.resize_first = resize_first
+        self.denoise_strength = denoise_strength
+        self.denoise_mode = denoise_mode
+        self.interpolation = interpolation
+        self._buffers = threading.local()
+
+    def buffer(self, name, shape, dtype):
+        buffer = getattr(self._buffers, name, None)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            setattr(self._buffers, name, buffer)
+        return buffer
+
+    def denoise(self, frame):
+        # Non-local means denoising into a per-thread buffer
+        template_window, search_window, scale = DENOISE_MODES[self.denoise_mode]
+        height, width = frame.shape[:2]
+        denoised = self.buffer("denoised", frame.shape, frame.dtype)
+        if scale < 1:
+            small_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            small = self.buffer("denoise_small", (small_size[1], small_size[0]) + frame.shape[2:], frame.dtype)
+            cv2.resize(frame, small_size, dst=small, interpolation=cv2.INTER_AREA)
+            cv2.fastNlMeansDenoisingColored(small, small, self.denoise_strength, self.denoise_strength, template_window, search_window)
+            cv2.resize(small, (width, height), dst=denoised, interpolation=self.interpolation)
+        else:
+            cv2.fastNlMeansDenoisingColored(frame, denoised, self.denoise_strength, self.denoise_strength, template_window, search_window)
+        return denoised
+
+    def apply(self, frame, out=None):
+        # out is an optional preallocated output frame. Only pass one when the result is consumed
+        # (e.g. encoded) before the next call, since it is overwritten every time.
+        width, height = self.output_size
+        output_shape = (height, width) + frame.shape[2:]
+        if out is None:
+            out = np.empty(output_shape, frame.dtype)
+
+        if self.denoise_strength > 0:
+            if width * height < frame.shape[0] * frame.shape[1]:
+                # Downscaling: denoise the smaller output frame, then sharpen it
+                resized = self.buffer("resized", output_shape, frame.dtype)
+                cv2.resize(frame, (width, height), dst=resized, interpolation=self.interpolation)
+                denoised = self.denoise(resized)
+                if self.kernel is None:
+                    np.copyto(out, denoised)
+                else:
+                    cv2.filter2D(denoised, -1, self.kernel, dst=out)
+                return out
+
+            # Denoise before sharpening so the noise is not amplified
+            frame = self.denoise(frame)
+
+        if self.kernel is None:
+            cv2.resize(frame, (width, height), dst=out, interpolation=self.interpolation)
+        elif self.resize_first:
+            resized = self.buffer("resized", output_shape, frame.dtype)
+            cv2.resize(frame, (width, height), dst=resized, interpolation=self.interpolation)
+            cv2.filter2D(resized, -1, self.kernel, dst=out)
+        else:
+            sharpened = self.buffer("sharpened", frame.shape, frame.dtype)
+            cv2.filter2D(frame, -1, self.kernel, dst=sharpened)
+            cv2.resize(sharpened, (width, height), dst=out, interpolation=self.interpolation)
+        return out
+
+
+def print_throughput(frame_count, elapsed):
+    if elapsed > 0:
+        print(f"Processed {frame_count} frames in {elapsed:.1f}s ({frame_count / elapsed:.2f} frames/sec)")
+
+
+# Mean absolute pixel difference (0-255) under which two frames count as the same
+# when reusing the enhanced output of duplicate frames
+DEFAULT_REUSE_THRESHOLD = 1.0
+
+
+class FrameReuseCache:
+    # Reuses the enhanced output of identical or near-identical frames (screen recordings, animation holds).
+    # Exact duplicates are found by hashing the frame bytes; near duplicates by comparing a small
+    # thumbnail first and then the full frame against the last few distinct frames.
+    # threshold=0 only reuses exact duplicates.
+
+    def __init__(self, threshold=DEFAULT_REUSE_THRESHOLD, max_entries=4):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()  # digest -> (thumbnail, frame, output)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, frame):
+        # Returns (digest, thumbnail, output); output is None on a miss
+        frame = np.ascontiguousarray(frame)
+        digest = hashlib.blake2b(frame.data, digest_size=16).digest()
+        thumbnail = None
+        if self.threshold > 0:
+            thumbnail = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA)
+
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return digest, thumbnail, entry[2]
+
+            if thumbnail is not None:
+                # Most recent frames first; comparing against the stored frame rather than the
+                # previous near-duplicate keeps slow fades from drifting through the threshold
+                for key, (cached_thumbnail, cached_frame, output) in reversed(self.entries.items()):
+                    if cached_frame.shape != frame.shape:
+                        continue
+                    if cv2.norm(thumbnail, cached_thumbnail, cv2.NORM_L1) / thumbnail.size > self.threshold:
+                        continue
+                    if cv2.norm(frame, cached_frame, cv2.NORM_L1) / frame.size > self.threshold:
+                        continue
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return digest, thumbnail, output
+
+            self.misses += 1
+        return digest, thumbnail, None
+
+    def store(self, digest, thumbnail, frame, output):
+        with self._lock:
+            self.entries[digest] = (thumbnail, frame, output)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def wrap(self, enhance_frame):
+        # Wrap a per-frame enhance function
+        def enhance(frame):
+            digest, thumbnail, output = self.lookup(frame)
+            if output is None:
+                output = enhance_frame(frame)
+                self.store(digest, thumbnail, frame, output)
+            return output
+
+        return enhance
+
+    def wrap_batch(self, enhance_frames):
+        # Wrap a batched enhance function; only the frames that miss are sent to it
+        def enhance(frames):
+            lookups = [self.lookup(frame) for frame in frames]
+            outputs = [output for _, _, output in lookups]
+            missed = [i for i, output in enumerate(outputs) if output is None]
+            if missed:
+                results = enhance_frames([frames[i] for i in missed])
+                for i, output in zip(missed, results):
+                    digest, thumbnail, _ = lookups[i]
+                    self.store(digest, thumbnail, frames[i], output)
+                    outputs[i] = output
+            return outputs
+
+        return enhance
+
+    def report(self):
+        print_frame_reuse(self.hits, self.misses)
+
+
+def print_frame_reuse(hits, misses):
+    total = hits + misses
+    if total:
+        print(f"Frame reuse: {hits} reused, {misses} enhanced ({100.0 * hits / total:.1f}% skipped)")
+
+
+# Persistent cache of enhanced frames, shared across runs
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bytecrush", "frames")
+DEFAULT_CACHE_SIZE = 20 * 1024 ** 3  # bytes
+
+# Per-job working directories (temp videos, images, segments and the resume manifest)
+DEFAULT_JOBS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bytecrush", "jobs")
+
+# Frames per checkpointed segment of a resumable job
+DEFAULT_SEGMENT_FRAMES = 1000
+
+
+# Bump when a processing change makes previously cached outputs stale
+CACHE_VERSION = 2
+
+# Real-ESRGAN options that only affect speed or file naming, not the upscaled pixels
+CACHE_IGNORED_OPTIONS = ("suffix", "ext", "batch_size", "memory_budget", "num_threads", "gpu_id", "fp32", "target_fps", "max_model_cost")
+
+
+class ResultCache:
+    # Content-addressed on-disk cache of enhanced frames.
+    # Entries are keyed by a hash of the input frame bytes and the processing parameters, stored as
+    # raw .npy files so a hit costs one read, and evicted least-recently-used once max_bytes is exceeded.
+    # Writes are atomic, so several processes can share one cache directory.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = None  # measured on the first write
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getstate__(self):
+        # Picklable so segment worker processes can use the same cache
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["total_bytes"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            output = np.load(path)
+        except (OSError, ValueError):
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return output
+
+    def put(self, key, output):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, output)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, size, _ in self.entries())
+            else:
+                self.total_bytes += os.path.getsize(path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def entries(self):
+        # (path, size, last used) for every cached frame
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith(".npy"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        # Remove least recently used entries until the cache is back under 90% of its cap
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+        self.total_bytes = total_bytes
+
+    def bind(self, **params):
+        # A view of the cache for one job's processing parameters
+        return BoundResultCache(self, params)
+
+
+class BoundResultCache:
+    # ResultCache lookups for one set of processing parameters, with hit/miss counters.
+    # get(frame)/put(frame, output) is also the interface enhance_images expects.
+
+    def __init__(self, cache, params):
+        self.cache = cache
+        params = dict(params, version=CACHE_VERSION)
+        self.params_digest = hashlib.blake2b(repr(sorted(params.items())).encode(), digest_size=16).digest()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, frame):
+        frame = np.ascontiguousarray(frame)
+        hasher = hashlib.blake2b(self.params_digest, digest_size=20)
+        hasher.update(repr((frame.shape, frame.dtype.str)).encode())
+        hasher.update(frame.data)
+        return hasher.hexdigest()
+
+    def get(self, frame):
+        output = self.cache.get(self.key(frame))
+        if output is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return output
 
+    def put(self, frame, output):
+        try:
+            self.cache.put(self.key(frame), output)
+        except OSError as e:
+            # A full or read-only cache should not fail the job
+            print("An error occurred while writing to the result cache:", str(e))
+
+    def wrap(self, enhance_frame):
+        def enhance(frame):
+            output = self.get(frame)
+            if output is None:
+                output = enhance_frame(frame)
+                self.put(frame, output)
+            return output
 
-cv2.ocl.setUseOpenCL(True)
-
+        return enhance
 
+    def wrap_batch(self, enhance_frames):
+        def enhance(frames):
+            outputs = [self.get(frame) for frame in frames]
+            missed = [i for i, output in enumerate(outputs) if output is None]
+            if missed:
+                results = enhance_frames([frames[i] for i in missed])
+                for i, output in zip(missed, results):
+                    self.put(frames[i], output)
+                    outputs[i] = output
+            return outputs
+
+        return enhance
+
+    def report(self):
+        print_result_cache(self.hits, self.misses)
+
+
+def print_result_cache(hits, misses):
+    total = hits + misses
+    if total:
+        print(f"Result cache: {hits} hits, {misses} misses ({100.0 * hits / total:.1f}% from cache)")
+
+
+def get_classic_cache_params(scale_factor, sharpen_intensity, denoise_strength, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE):
+    # Parameters that determine the output of the denoise/resize/sharpen path
+    params = {"path": "classic", "scale_factor": scale_factor, "sharpen_intensity": sharpen_intensity, "denoise_strength": denoise_strength, "resize_first": resize_first}
+    if denoise_strength > 0:
+        params["denoise_mode"] = denoise_mode
+    return params
+
+
+def get_realesrgan_cache_params(outscale, realesrgan_options):
+    # Parameters that determine the output of the Real-ESRGAN path
+    params = {k: v for k, v in realesrgan_options.items() if k not in CACHE_IGNORED_OPTIONS}
+    params["path"] = "realesrgan"
+    params["outscale"] = float(outscale)
+    return params
+
+
+# Named encoder settings; a job picks one and can override single fields (codec, preset, crf, threads)
+ENCODER_PRESETS = {
+    "fast": {"backend": "ffmpeg", "codec": "libx264", "preset": "ultrafast", "crf": 20},
+    "balanced": {"backend": "ffmpeg", "codec": "libx264", "preset": "veryfast", "crf": 20},
+    "small": {"backend": "ffmpeg", "codec": "libx265", "preset": "medium", "crf": 26},
+    "opencv": {"backend": "opencv", "fourcc": "mp4v"},
+}
+DEFAULT_ENCODER_PRESET = "balanced"
+# Container of the intermediate videos (temp videos and segments). Matroska holds every codec ffmpeg
+# can encode, so the codec of a job only has to suit the container of its final output.
+INTERMEDIATE_VIDEO_EXT = ".mkv"
+
+
+def get_encoder_options(preset_name=None, **overrides):
+    # Resolve a preset name plus overrides into a full encoder options dict
+    options = dict(ENCODER_PRESETS[preset_name or DEFAULT_ENCODER_PRESET])
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
+
+
+def get_video_fps(input_path):
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return fps
+
+
+def get_video_frame_count(input_path):
+    cap = cv2.VideoCapture(input_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
+
+
+def get_video_frame_size(input_path):
+    cap = cv2.VideoCapture(input_path)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    return frame_size
+
+
+class OpenCVEncoder:
+    # cv2.VideoWriter, the original writer of every path
+
+    def __init__(self, output_path, fps, frame_size, fourcc="mp4v", **_):
+        self.output_path = output_path
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+        if not self.writer.isOpened():
+            raise Exception(f"Could not open video writer for {output_path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegEncoder:
+    # Pipes raw BGR frames over stdin into a local ffmpeg process
+
+    def __init__(self, output_path, fps, frame_size, codec="libx264", preset=None, crf=None, threads=0, pix_fmt="yuv420p", **_):
+        self.output_path = output_path
+        width, height = frame_size
+        cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-an", "-c:v", codec, "-pix_fmt", pix_fmt, "-threads", str(threads)]
+        if preset is not None:
+            cmd += ["-preset", str(preset)]
+        if crf is not None:
+            cmd += ["-crf", str(crf)]
+        # 4:2:0 chroma needs even dimensions
+        if pix_fmt == "yuv420p" and (width % 2 or height % 2):
+            cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        cmd.append(output_path)
+
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.release()
+            raise
+
+    def release(self):
+        if self.process.stdin.closed:
+            return
+        self.process.stdin.close()
+        stderr = self.process.stderr.read().decode(errors="replace").strip()
+        if self.process.wait() != 0:
+            raise Exception(f"ffmpeg failed to encode {self.output_path}: {stderr}")
+
+
+def open_encoder(output_path, fps, frame_size, encoder_options=None):
+    # Create the encoder described by encoder_options (see get_encoder_options)
+    options = dict(encoder_options or get_encoder_options())
+    backend = options.pop("backend", "ffmpeg")
+    if backend == "ffmpeg":
+        return FFmpegEncoder(output_path, fps, frame_size, **options)
+    if backend == "opencv":
+        return OpenCVEncoder(output_path, fps, frame_size, **options)
+    raise ValueError(f"Unknown encoder backend: {backend}")
 
 
 # Function for RealESRGAN-based upscaling
-def upscale_with_realesrgan(temp_images, output_path, outscale, realesrgan_options):
+def get_realesrgan_service():
+    # Imported on first use so the GUI still starts when torch/basicsr are not installed
+    from inference_realesrgan import get_upscaler_service
+    return get_upscaler_service()
+
+
+def warm_realesrgan_model(model_name, **options):
+    # Load the model in the background so the first job does not wait for the weights
+    def load():
+        try:
+            get_realesrgan_service().get_upsampler(model_name, **options)
+            print("RealESRGAN model loaded:", model_name)
+        except Exception as e:
+            print("An error occurred while loading the RealESRGAN model:", str(e))
+
+    thread = threading.Thread(target=load)
+    thread.daemon = True
+    thread.start()
+
+
+# Rows and columns whose brightest pixel is at most this level count as letterbox/pillarbox bars
+BORDER_MAX_LEVEL = 24
+# Bars are only cropped once the same active area has been found in this many frames in a row
+BORDER_CONFIRM_FRAMES = 8
+# Cropping is skipped when it would save less than this fraction of the pixels, and an active area
+# narrower or lower than this fraction of the frame is taken for a dark scene rather than bars
+BORDER_MIN_SAVING = 0.05
+BORDER_MIN_ACTIVE = 0.4
+
+
+def detect_active_area(frame):
+    # Box (x0, y0, x1, y1) inside the dark bars around the picture, or None for a frame that is dark all over.
+    # The box is widened to even coordinates so 2x models see whole pixel pairs.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    active_rows = np.flatnonzero(cv2.reduce(gray, 1, cv2.REDUCE_MAX).ravel() > BORDER_MAX_LEVEL)
+    if len(active_rows) == 0:
+        return None
+    active_columns = np.flatnonzero(cv2.reduce(gray, 0, cv2.REDUCE_MAX).ravel() > BORDER_MAX_LEVEL)
+    height, width = gray.shape
+    x0 = int(active_columns[0]) // 2 * 2
+    y0 = int(active_rows[0]) // 2 * 2
+    x1 = min(width, (int(active_columns[-1]) + 2) // 2 * 2)
+    y1 = min(height, (int(active_rows[-1]) + 2) // 2 * 2)
+    return x0, y0, x1, y1
+
+
+class ActiveAreaCropper:
+    # Upscales only the active picture area of letterboxed or pillarboxed frames and synthesizes the
+    # bars at the output size, so the model does not spend time on black pixels.
+    # The bars are found per frame, but only cropped once they have held for BORDER_CONFIRM_FRAMES
+    # frames, which makes the crop follow the shots. A frame with picture in the bars is processed
+    # whole. With a roi (x, y, width, height), only that region is upscaled by the model and the rest
+    # of the frame is resized with plain interpolation.
+    # Only the RealESRGAN enhancers of get_realesrgan_enhancer use it (streaming, segment and per-shot
+    # paths); the classic filters, including the shared-memory workers, always process whole frames.
+
+    def __init__(self, outscale, roi=None):
+        self.outscale = float(outscale)
+        self.roi = tuple(int(value) for value in roi) if roi else None
+        self.box = None
+        self.border_color = None
+        self.candidate = None
+        self.streak = 0
+        self._lock = threading.Lock()
+
+    def get_box(self, frame):
+        # Returns (box, border_color) for this frame; box is None when the whole frame is enhanced
+        height, width = frame.shape[:2]
+        if self.roi is not None:
+            x, y, roi_width, roi_height = self.roi
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(width, x + roi_width), min(height, y + roi_height)
+            if x1 <= x0 or y1 <= y0:
+                return None, None
+            return (x0, y0, x1, y1), None
+
+        area = detect_active_area(frame)
+        with self._lock:
+            if area is not None and area == self.candidate:
+                self.streak += 1
+            else:
+                self.candidate = area
+                self.streak = 1
+
+            if self.streak == BORDER_CONFIRM_FRAMES and area != self.box:
+                x0, y0, x1, y1 = area
+                # A dark scene is not taken for bars; bars that hardly save anything are not cropped
+                if x1 - x0 >= width * BORDER_MIN_ACTIVE and y1 - y0 >= height * BORDER_MIN_ACTIVE:
+                    if (x1 - x0) * (y1 - y0) > (1 - BORDER_MIN_SAVING) * width * height:
+                        if self.box is not None:
+                            print("Active area: full frame")
+                        self.box = None
+                    else:
+                        self.box = area
+                        self.border_color = self.get_border_color(frame, area)
+                        print(f"Active area: {x1 - x0}x{y1 - y0} at ({x0}, {y0})")
+
+            box = self.box
+            if box is None:
+                return None, None
+            # Picture in the bars: this frame is enhanced whole until the new bars are confirmed
+            if area is not None and (area[0] < box[0] or area[1] < box[1] or area[2] > box[2] or area[3] > box[3]):
+                return None, None
+            return box, self.border_color
+
+    def get_border_color(self, frame, box):
+        x0, y0, x1, y1 = box
+        strips = [frame[:y0].reshape(-1, 3), frame[y1:].reshape(-1, 3), frame[y0:y1, :x0].reshape(-1, 3), frame[y0:y1, x1:].reshape(-1, 3)]
+        return np.concatenate(strips).mean(axis=0).round().astype(np.uint8)
+
+    def crop(self, frame, box):
+        x0, y0, x1, y1 = box
+        return np.ascontiguousarray(frame[y0:y1, x0:x1])
+
+    def compose(self, frame, box, border_color, enhanced):
+        # Place the enhanced active area in a frame of the full output size
+        height, width = frame.shape[:2]
+        output_width, output_height = int(width * self.outscale), int(height * self.outscale)
+        x0, y0, x1, y1 = box
+        output_x0, output_x1 = round(x0 * output_width / width), round(x1 * output_width / width)
+        output_y0, output_y1 = round(y0 * output_height / height), round(y1 * output_height / height)
+        if enhanced.shape[:2] != (output_y1 - output_y0, output_x1 - output_x0):
+            enhanced = cv2.resize(enhanced, (output_x1 - output_x0, output_y1 - output_y0), interpolation=cv2.INTER_LANCZOS4)
+
+        if border_color is None:
+            output = cv2.resize(frame, (output_width, output_height), interpolation=cv2.INTER_LINEAR)
+        else:
+            output = np.empty((output_height, output_width, 3), np.uint8)
+            output[:] = border_color
+        output[output_y0:output_y1, output_x0:output_x1] = enhanced
+        return output
+
+    def wrap(self, enhance_frame):
+        # Wrap a per-frame enhance function
+        def enhance(frame):
+            box, border_color = self.get_box(frame)
+            if box is None:
+                return enhance_frame(frame)
+            return self.compose(frame, box, border_color, enhance_frame(self.crop(frame, box)))
+
+        return enhance
+
+    def wrap_batch(self, enhance_frames):
+        # Wrap a batch enhance function; frames cropped to the same size go through it together
+        def enhance(frames):
+            boxes = [self.get_box(frame) for frame in frames]
+            groups = collections.defaultdict(list)
+            for i, (frame, (box, _)) in enumerate(zip(frames, boxes)):
+                groups[frame.shape if box is None else (box[3] - box[1], box[2] - box[0])].append(i)
+
+            results = [None] * len(frames)
+            for indices in groups.values():
+                inputs = [frames[i] if boxes[i][0] is None else self.crop(frames[i], boxes[i][0]) for i in indices]
+                for i, output in zip(indices, enhance_frames(inputs)):
+                    box, border_color = boxes[i]
+                    results[i] = output if box is None else self.compose(frames[i], box, border_color, output)
+            return results
+
+        return enhance
+
+
+def get_realesrgan_enhancer(outscale, realesrgan_options):
+    # Build the per-frame enhance function used by the streaming and segment pipelines.
+    # Returns (enhance, batch_size); when batch_size > 1, enhance takes and returns a list of frames.
+    service = get_realesrgan_service()
+    options = dict(realesrgan_options)
+    model_name = options.pop("model_name")
+    batch_size = options.pop("batch_size", 1)
+    memory_budget = options.pop("memory_budget", None)
+    num_threads = options.pop("num_threads", None)
+    crop_borders = options.pop("crop_borders", False)
+    roi = options.pop("roi", None)
+    upsampler_options, output_options = service.split_options(options)
+    face_enhance = output_options.get("face_enhance", False)
+    outscale = float(outscale)
+
+    if num_threads:
+        from inference_realesrgan import set_num_threads
+        set_num_threads(num_threads)
+
+    # Only the active picture area goes through the model
+    cropper = None
+    if crop_borders or roi:
+        cropper = ActiveAreaCropper(outscale, roi)
+
+    # Face enhancement works on one image at a time
+    if batch_size > 1 and not face_enhance:
+        def enhance_frames(frames):
+            return service.enhance_batch(frames, model_name, outscale, memory_budget=memory_budget, **upsampler_options)
+
+        if cropper is not None:
+            enhance_frames = cropper.wrap_batch(enhance_frames)
+        return enhance_frames, batch_size
+
+    def enhance_frame(frame):
+        return service.enhance(frame, model_name, outscale, face_enhance=face_enhance, memory_budget=memory_budget, **upsampler_options)
+
+    if cropper is not None:
+        enhance_frame = cropper.wrap(enhance_frame)
+    return enhance_frame, 1
+
+
+# Model name that lets the shot policy pick the model for each shot
+AUTO_MODEL = "auto"
+# Pseudo model for shots that are upscaled with a plain Lanczos resize
+RESIZE_MODEL = "resize"
+
+# Approximate cost per frame relative to realesr-general-x4v3, measured on CPU at the same input size
+SHOT_MODEL_COSTS = {
+    "RealESRGAN_x4plus": 18.0,
+    "RealESRGAN_x4plus_anime_6B": 5.8,
+    "RealESRGAN_x2plus": 4.2,
+    "realesr-general-x4v3": 1.0,
+    "realesr-animevideov3": 0.6,
+    RESIZE_MODEL: 0.0,
+}
+# Models the policy picks from, best first, for live action (x4 and up to x2 output) and animation
+SHOT_MODELS = ["RealESRGAN_x4plus", "realesr-general-x4v3", "realesr-animevideov3"]
+SHOT_MODELS_X2 = ["RealESRGAN_x2plus", "realesr-general-x4v3", "realesr-animevideov3"]
+SHOT_MODELS_ANIMATED = ["RealESRGAN_x4plus_anime_6B", "realesr-animevideov3"]
+# Without a target frame rate, shots use models up to this relative cost
+DEFAULT_SHOT_MAX_COST = 1.0
+# Every shot that is only resized because no model fits the budget shrinks the measured time per unit
+# of cost by this factor, so the cheapest model is tried again after a few shots and measured anew
+SHOT_BUDGET_RECOVERY = 0.8
+
+# Shot detection and classification work on thumbnails this wide
+SHOT_THUMBNAIL_WIDTH = 160
+# Hue/saturation histogram correlation under which two consecutive frames belong to different shots
+SHOT_CUT_THRESHOLD = 0.6
+# A cut is only taken after this many frames, so flashes do not switch models back and forth
+SHOT_MIN_FRAMES = 12
+# Standard deviation of the thumbnail's Laplacian under which a shot is only resized,
+# and from which it is detailed enough for the best model in the budget
+SHOT_LOW_DETAIL = 4.0
+SHOT_HIGH_DETAIL = 20.0
+# Fraction of flat thumbnail pixels from which a shot is treated as animation
+SHOT_ANIMATED_FLAT_FRACTION = 0.6
+
+
+class ShotModelPolicy:
+    # Picks the model for a shot from its content and the throughput budget.
+    # With a target frame rate, the budget follows the measured time per frame of the models used so far.
+
+    def __init__(self, outscale, target_fps=None, max_cost=DEFAULT_SHOT_MAX_COST):
+        self.outscale = float(outscale)
+        self.target_fps = target_fps
+        self.max_cost = max_cost
+        self.cost_unit_seconds = None
+        # Models that have run at least once; their first run loads the weights and warms up the backend
+        self.warm_models = set()
+        self.lock = threading.Lock()
+
+    def get_max_cost(self):
+        with self.lock:
+            if self.target_fps and self.cost_unit_seconds:
+                return 1.0 / self.target_fps / self.cost_unit_seconds
+        return self.max_cost
+
+    def choose(self, detail, animated):
+        if detail < SHOT_LOW_DETAIL:
+            return RESIZE_MODEL
+
+        if animated:
+            models = SHOT_MODELS_ANIMATED
+        elif self.outscale <= 2:
+            models = SHOT_MODELS_X2
+        else:
+            models = SHOT_MODELS
+        # Only detailed shots get the heaviest model
+        if detail < SHOT_HIGH_DETAIL:
+            models = models[1:]
+
+        max_cost = self.get_max_cost()
+        for model_name in models:
+            if SHOT_MODEL_COSTS[model_name] <= max_cost:
+                return model_name
+        # Not even the cheapest model fits the budget. Resized shots are not measured, so the
+        # estimate is relaxed instead to let a later shot find out whether the budget still holds.
+        with self.lock:
+            if self.cost_unit_seconds is not None:
+                self.cost_unit_seconds *= SHOT_BUDGET_RECOVERY
+        return RESIZE_MODEL
+
+    def record(self, model_name, seconds, frame_count):
+        # Running average of the seconds one unit of model cost takes on this machine
+        cost = SHOT_MODEL_COSTS.get(model_name)
+        if not cost or not frame_count:
+            return
+        cost_unit_seconds = seconds / frame_count / cost
+        with self.lock:
+            if model_name not in self.warm_models:
+                # Loading the model would make it look orders of magnitude slower than it is
+                self.warm_models.add(model_name)
+                return
+            if self.cost_unit_seconds is None:
+                self.cost_unit_seconds = cost_unit_seconds
+            else:
+                self.cost_unit_seconds = 0.8 * self.cost_unit_seconds + 0.2 * cost_unit_seconds
+
+
+class ShotAdaptiveEnhancer:
+    # Splits the video into shots and upscales each shot with the model the policy picks for it
+    # (or with a plain resize). Frames must be passed in order from a single thread, as the
+    # streaming pipeline's Real-ESRGAN worker and the segment loop do, because cuts are found by
+    # comparing each frame with the previous one.
+
+    def __init__(self, outscale, realesrgan_options, reuse_threshold=None, result_cache=None):
+        options = dict(realesrgan_options)
+        options.pop("model_name")
+        target_fps = options.pop("target_fps", None)
+        max_cost = options.pop("max_model_cost", DEFAULT_SHOT_MAX_COST)
+        self.outscale = float(outscale)
+        self.options = options
+        self.batch_size = options.get("batch_size", 1)
+        self.reuse_threshold = reuse_threshold
+        self.result_cache = result_cache
+        self.policy = ShotModelPolicy(outscale, target_fps, max_cost)
+
+        # model name -> (enhance, frame cache, bound result cache)
+        self.enhancers = {}
+        self.previous_histogram = None
+        self.shot_model = None
+        self.shot_length = 0
+        self.frame_index = 0
+        self.shots = []
+        self.frame_counts = collections.Counter()
+
+    def resize_frames(self, frames):
+        return [cv2.resize(frame, (int(frame.shape[1] * self.outscale), int(frame.shape[0] * self.outscale)), interpolation=cv2.INTER_LANCZOS4) for frame in frames]
+
+    def get_enhancer(self, model_name):
+        # Each model gets its own enhance function and caches, built the first time a shot uses it
+        if model_name in self.enhancers:
+            return self.enhancers[model_name][0]
+
+        if model_name == RESIZE_MODEL:
+            enhance = self.resize_frames
+        else:
+            model_options = dict(self.options, model_name=model_name)
+            enhance_model, batch_size = get_realesrgan_enhancer(self.outscale, model_options)
+            if batch_size > 1:
+                enhance = enhance_model
+            else:
+                def enhance(frames, enhance_model=enhance_model):
+                    return [enhance_model(frame) for frame in frames]
+
+        # Only the model itself is timed, not the frames that come out of the caches
+        def timed_enhance(frames, enhance=enhance):
+            start_time = time.perf_counter()
+            results = enhance(frames)
+            self.policy.record(model_name, time.perf_counter() - start_time, len(frames))
+            return results
+
+        enhance = timed_enhance
+        bound_cache = None
+        if self.result_cache is not None:
+            bound_cache = self.result_cache.bind(**get_realesrgan_cache_params(self.outscale, dict(self.options, model_name=model_name)))
+            enhance = bound_cache.wrap_batch(enhance)
+        frame_cache = None
+        if self.reuse_threshold is not None:
+            frame_cache = FrameReuseCache(self.reuse_threshold)
+            enhance = frame_cache.wrap_batch(enhance)
+
+        self.enhancers[model_name] = (enhance, frame_cache, bound_cache)
+        return enhance
+
+    def classify(self, frame):
+        # Returns the model for this frame, starting a new shot at a cut
+        height, width = frame.shape[:2]
+        thumbnail_size = (SHOT_THUMBNAIL_WIDTH, max(1, round(height * SHOT_THUMBNAIL_WIDTH / width)))
+        thumbnail = cv2.resize(frame, thumbnail_size, interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+        cv2.normalize(histogram, histogram)
+
+        cut = self.previous_histogram is None
+        if not cut and self.shot_length >= SHOT_MIN_FRAMES:
+            cut = cv2.compareHist(self.previous_histogram, histogram, cv2.HISTCMP_CORREL) < SHOT_CUT_THRESHOLD
+        self.previous_histogram = histogram
+
+        if cut:
+            gray = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+            laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+            detail = float(laplacian.std())
+            animated = float(np.mean(np.abs(laplacian) < 1)) >= SHOT_ANIMATED_FLAT_FRACTION
+            self.shot_model = self.policy.choose(detail, animated)
+            self.shot_length = 0
+            self.shots.append((self.frame_index, self.shot_model))
+
+        self.shot_length += 1
+        self.frame_index += 1
+        return self.shot_model
+
+    def enhance_batch(self, frames):
+        # Consecutive frames with the same model are enhanced together
+        models = [self.classify(frame) for frame in frames]
+        results = []
+        run_start = 0
+        for i in range(1, len(frames) + 1):
+            if i == len(frames) or models[i] != models[run_start]:
+                results.extend(self.get_enhancer(models[run_start])(frames[run_start:i]))
+                self.frame_counts[models[run_start]] += i - run_start
+                run_start = i
+        return results
+
+    def enhance_frame(self, frame):
+        return self.enhance_batch([frame])[0]
+
+    def stats(self):
+        stats = collections.Counter()
+        for _, frame_cache, bound_cache in self.enhancers.values():
+            if frame_cache is not None:
+                stats["reuse_hits"] += frame_cache.hits
+                stats["reuse_misses"] += frame_cache.misses
+            if bound_cache is not None:
+                stats["cache_hits"] += bound_cache.hits
+                stats["cache_misses"] += bound_cache.misses
+        return stats
+
+    def report(self):
+        print(f"{len(self.shots)} shots:", ", ".join(f"{model_name} {count} frames" for model_name, count in self.frame_counts.most_common()))
+        stats = self.stats()
+        if self.reuse_threshold is not None:
+            print_frame_reuse(stats["reuse_hits"], stats["reuse_misses"])
+        if self.result_cache is not None:
+            print_result_cache(stats["cache_hits"], stats["cache_misses"])
+
+
+def upscale_with_realesrgan(temp_images, output_path, outscale, realesrgan_options, result_cache=None):
     try:
-        cmd = [
-            "python", "inference_realesrgan.py",
-            "-n", realesrgan_options["model_name"],
-            "-i", temp_images,
-            "-o", output_path,
-            "--outscale", str(outscale),
-            "--fp32"
-        ]
-
-        # Add other options
-        for option, value in realesrgan_options.items():
-            if option not in ["model_name"]:
-                cmd.append(f"--{option}")
-                if value is not None:
-                    cmd.append(str(value))
+        options = dict(realesrgan_options)
+        model_name = options.pop("model_name")
+
+        # Images upscaled by an earlier run with the same settings are read back from the cache
+        bound_cache = None
+        if result_cache is not None:
+            bound_cache = result_cache.bind(**get_realesrgan_cache_params(outscale, realesrgan_options))
+            options["result_cache"] = bound_cache
+
+        # Stop between images when the job is cancelled
+        context = get_job_context()
+        if context is not None and context.cancel_event is not None:
+            options["cancel_event"] = context.cancel_event
+
+        # The service keeps the model warm, so only the first job pays for loading the weights
+        inference_start = time.perf_counter()
+        get_realesrgan_service().enhance_folder(temp_images, output_path, model_name, float(outscale), **options)
+        if is_raw_frames(temp_images):
+            frame_count = read_raw_frames_header(temp_images)["shape"][0]
+        else:
+            frame_count = len(os.listdir(temp_images))
+        record_stage_time("inference", inference_start, max(1, frame_count))
 
-        subprocess.run(cmd, check=True)
+        if bound_cache is not None:
+            bound_cache.report()
 
         print("RealESRGAN upscaling complete. Output saved as", output_path)
+        return True
 
     except Exception as e:
-        print("An error occurred during RealESRGAN upscaling:", str(e))
-        
+        # A cancelled job is reported by process_video
+        if not isinstance(e, JobCancelled):
+            print("An error occurred during RealESRGAN upscaling:", str(e))
+        return False
 
 
-def upscale_and_enhance_video(input_path, output_path, temp_upscaled_images_path, scale_factor, sharpen_intensity, denoise_strength, outscale_value=2, realesrgan_options=None):
-    
+def upscale_and_enhance_video(input_path, output_path, temp_upscaled_images_path, scale_factor, sharpen_intensity, denoise_strength, outscale_value=2, realesrgan_options=None, reuse_threshold=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
+    reader = out = None
     try:
         if realesrgan_options is not None:
-            # Apply RealESRGAN upscaling
-            
-            upscale_with_realesrgan(temp_upscaled_images_path, outscale_value, realesrgan_options)
-
-            # Load the upscaled image using OpenCV
-            upscaled_image = cv2.imread(temp_upscaled_images_path)
-
-            # Initialize the video writer with the upscaled image dimensions
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, 30.0, (upscaled_image.shape[1], upscaled_image.shape[0]))
-
-            # Release the temporary image
-            cv2.destroyAllWindows()
+            # Apply RealESRGAN upscaling frame by frame without temp images
+            return upscale_with_realesrgan_streaming(input_path, output_path, outscale_value, realesrgan_options, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, decoder_options=decoder_options)
 
         else:
             if scale_factor is None or scale_factor <= 0:
                 raise ValueError("Scale factor must be specified and greater than 0 when RealESRGAN is disabled.")
 
             else:
-            # Open the input video file
-                cap = cv2.VideoCapture(input_path)
+            # Open the input video file; frames are decoded ahead on the reader's thread
+                reader = FrameReader(input_path, decoder_options=decoder_options)
 
                 # Get the original video's frame width and height
-                frame_width = int(cap.get(3))
-                frame_height = int(cap.get(4))
+                frame_width, frame_height = reader.frame_size
 
                 # Calculate the new frame dimensions after upscaling
                 new_width = int(frame_width * scale_factor)
                 new_height = int(frame_height * scale_factor)
 
-                # Define the codec for video
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(output_path, fourcc, 30.0, (new_width, new_height))
+                # Create the encoder, keeping the source frame rate
+                fps = reader.fps
+                out = open_encoder(output_path, fps, (new_width, new_height), encoder_options)
 
                 # Calculate the total number of frames in the video
-                total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                total_frames = reader.frame_count
 
                 # Create a tqdm progress bar
                 progress_bar = tqdm(total=total_frames, desc="Processing Frames", unit="frame")
 
+        # Denoise, sharpen and resize with kernels and buffers prepared once for the whole video
+        filter_chain = FilterChain((new_width, new_height), sharpen_intensity, resize_first, denoise_strength, denoise_mode)
+
+        # Each frame is encoded before the next one is filtered, so one output frame can be reused,
+        # unless a cache keeps references to the outputs
+        output_buffer = None
+        if result_cache is None and reuse_threshold is None:
+            output_buffer = np.empty((new_height, new_width, 3), np.uint8)
+
+        def process_frame(frame):
+            return filter_chain.apply(frame, out=output_buffer)
+
+        # Frames processed by an earlier run with the same settings are read back from the cache
+        bound_cache = None
+        if result_cache is not None:
+            bound_cache = result_cache.bind(**get_classic_cache_params(scale_factor, sharpen_intensity, denoise_strength, resize_first, denoise_mode))
+            process_frame = bound_cache.wrap(process_frame)
+
+        # Skip the filters for frames that repeat a recent one
+        frame_cache = None
+        if reuse_threshold is not None:
+            frame_cache = FrameReuseCache(reuse_threshold)
+            process_frame = frame_cache.wrap(process_frame)
+
+        start_time = time.perf_counter()
+        stage_seconds = collections.Counter()
+
             # Loop through the frames of the input video
         while True:
-            ret, frame = cap.read()
+            ret, frame = reader.read()
 
             # Break the loop if we have reached the end of the video
             if not ret:
                 break
 
-            # Apply sharpening with user-defined intensity
-            if sharpen_intensity > 0:
-                kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], dtype=np.float32)
-                frame = cv2.filter2D(frame, -1, kernel)
-
-            # Apply deinterlacing with user-defined strength
-            
-            
-            # Resize the frame to the new dimensions
-            resized_frame = cv2.resize(frame, (new_width, new_height))
+            stage_start = time.perf_counter()
+            resized_frame = process_frame(frame)
+            stage_seconds["filter"] += record_stage_time("filter", stage_start)
 
             # Write the resized frame to the output video
+            stage_start = time.perf_counter()
             out.write(resized_frame)
+            stage_seconds["encode"] += record_stage_time("encode", stage_start)
 
             # Update the progress bar
             progress_bar.update(1)
@@ -121,32 +1279,54 @@ def upscale_and_enhance_video(input_path, output_path, temp_upscaled_images_path
         progress_bar.close()
 
         # Release video objects
-        cap.release()
+        reader.release()
         out.release()
 
+        elapsed = time.perf_counter() - start_time
+        stage_seconds["decode"] = reader.decode_seconds
+        print_throughput(progress_bar.n, elapsed)
+        record_stage_utilization(stage_seconds, elapsed)
+        if frame_cache is not None:
+            frame_cache.report()
+        if bound_cache is not None:
+            bound_cache.report()
+
         print("Video processing complete. Temporary video saved as", output_path)
+        return True
 
     except Exception as e:
-        print("An error occurred:", str(e))
+        # A cancelled job is reported by process_video
+        if not isinstance(e, JobCancelled):
+            print("An error occurred:", str(e))
+        # Stop the reader thread and the encoder of a run that failed or was cancelled halfway
+        if reader is not None:
+            reader.release()
+        if out is not None:
+            try:
+                out.release()
+            except Exception:
+                pass
+        return False
 
 
 
 from tqdm import tqdm
 
-def create_images_from_video(input_video_path, output_image_folder):
+def create_images_from_video(input_video_path, output_image_folder, decoder_options=None):
+    reader = None
     try:
-        # Open the input video file
-        cap = cv2.VideoCapture(input_video_path)
+        # Open the input video file; frames are decoded while the previous ones are written
+        reader = FrameReader(input_video_path, decoder_options=decoder_options)
         frame_number = 0
 
         # Calculate the total number of frames in the video
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        total_frames = reader.frame_count
 
         # Create a tqdm progress bar
         progress_bar = tqdm(total=total_frames, desc="Creating Images", unit="frame")
 
         while True:
-            ret, frame = cap.read()
+            ret, frame = reader.read()
 
             if not ret:
                 break
@@ -154,39 +1334,787 @@ def create_images_from_video(input_video_path, output_image_folder):
             # Save the frame as an image in the output image folder
             image_filename = f"frame_{frame_number:04d}.png"
             image_path = os.path.join(output_image_folder, image_filename)
+            stage_start = time.perf_counter()
             cv2.imwrite(image_path, frame)
+            record_stage_time("spill", stage_start)
 
             frame_number += 1
 
             # Update the progress bar
             progress_bar.update(1)
 
-        cap.release()
+        reader.release()
         progress_bar.close()
 
         print("Images created from video frames. Images saved in", output_image_folder)
+        return True
+
+    except Exception as e:
+        if not isinstance(e, JobCancelled):
+            print("An error occurred during image creation:", str(e))
+        if reader is not None:
+            reader.release()
+        return False
+
+
+# Formats for the temp frames handed to RealESRGAN when not streaming.
+# raw skips the PNG codec on both sides but takes width * height * 3 bytes per frame on disk, so it
+# goes through the video in segments; png spills the whole video, compressed, before upscaling.
+SPILL_FORMATS = ("raw", "png")
+DEFAULT_SPILL_FORMAT = "raw"
+# Disk space the raw input and upscaled frames of one segment may take (MB)
+RAW_SPILL_SEGMENT_MB = 2048
+
+
+def create_raw_frames_from_video(input_video_path, output_frames_path, decoder_options=None):
+    # Same as create_images_from_video, but all frames go uncompressed into one raw frames file
+    reader = None
+    try:
+        reader = FrameReader(input_video_path, decoder_options=decoder_options)
+        progress_bar = tqdm(total=reader.frame_count, desc="Spilling Frames", unit="frame")
+
+        with RawFrameWriter(output_frames_path) as writer:
+            for frame in reader:
+                stage_start = time.perf_counter()
+                writer.write(frame)
+                record_stage_time("spill", stage_start)
+                progress_bar.update(1)
+
+        reader.release()
+        progress_bar.close()
+
+        print("Raw frames created from video. Frames saved in", output_frames_path)
+        return True
+
+    except Exception as e:
+        if not isinstance(e, JobCancelled):
+            print("An error occurred during raw frame creation:", str(e))
+        if reader is not None:
+            reader.release()
+        return False
+
+
+def get_raw_spill_frame_bytes(frame_size, outscale):
+    # Disk space a frame takes in a raw spill segment: the input frame and its upscaled frame
+    width, height = frame_size
+    return width * height * 3 + int(width * outscale) * int(height * outscale) * 3
+
+
+def get_raw_spill_segment_frames(frame_size, outscale):
+    return max(1, int(RAW_SPILL_SEGMENT_MB * MB // get_raw_spill_frame_bytes(frame_size, outscale)))
+
+
+def has_raw_spill_space(input_video_path, outscale, work_dir):
+    # Whether the raw frames of one segment fit on the disk of work_dir
+    frame_size = get_video_frame_size(input_video_path)
+    cap = cv2.VideoCapture(input_video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    segment_frames = min(max(1, total_frames), get_raw_spill_segment_frames(frame_size, outscale))
+    needed = segment_frames * get_raw_spill_frame_bytes(frame_size, outscale)
+    free = shutil.disk_usage(work_dir).free
+    if free < needed:
+        print(f"Not enough disk space for raw frames ({needed / MB:.0f} MB needed, {free / MB:.0f} MB free); using PNG files instead.")
+        return False
+    return True
+
+
+def upscale_with_realesrgan_raw(input_video_path, output_path, work_dir, outscale, realesrgan_options, result_cache=None, encoder_options=None, decoder_options=None):
+    # Same as create_raw_frames_from_video + upscale_with_realesrgan + compile_raw_frames_to_video, but
+    # one segment at a time: a segment's frames are spilled to a raw frames file, upscaled into another
+    # one and encoded before the next segment is decoded, so the disk holds one segment and not the
+    # whole uncompressed video
+    reader = out = None
+    try:
+        reader = FrameReader(input_video_path, decoder_options=decoder_options)
+        segment_frames = get_raw_spill_segment_frames(reader.frame_size, float(outscale))
+        frames = iter(reader)
+        first_frame = 0
+        while True:
+            frames_path = os.path.join(work_dir, f"frames_{first_frame:06d}{RAW_FRAMES_EXT}")
+            upscaled_frames_path = os.path.join(work_dir, f"upscaled_frames_{first_frame:06d}{RAW_FRAMES_EXT}")
+            with RawFrameWriter(frames_path, first_frame) as writer:
+                for frame in itertools.islice(frames, segment_frames):
+                    stage_start = time.perf_counter()
+                    writer.write(frame)
+                    record_stage_time("spill", stage_start)
+            if writer.count == 0:
+                os.remove(frames_path)
+                break
+
+            if not upscale_with_realesrgan(frames_path, upscaled_frames_path, outscale, realesrgan_options, result_cache=result_cache):
+                return False
+            check_cancelled()
+            os.remove(frames_path)
+
+            upscaled_frames, _ = open_raw_frames(upscaled_frames_path)
+            if len(upscaled_frames) != writer.count:
+                raise Exception(f"{len(upscaled_frames)} of the {writer.count} frames from frame {first_frame} were upscaled")
+            if out is None:
+                height, width = upscaled_frames.shape[1:3]
+                out = open_encoder(output_path, reader.fps, (width, height), encoder_options)
+            for frame in upscaled_frames:
+                stage_start = time.perf_counter()
+                out.write(np.ascontiguousarray(frame))
+                record_stage_time("encode", stage_start)
+            del upscaled_frames
+            os.remove(upscaled_frames_path)
+            first_frame += writer.count
+
+        if out is None:
+            raise Exception("No frames found in " + input_video_path)
+        out.release()
+        out = None
+
+        print("RealESRGAN upscaling complete. Output saved as", output_path)
+        return True
+
+    except Exception as e:
+        if not isinstance(e, JobCancelled):
+            print("An error occurred during RealESRGAN upscaling:", str(e))
+        return False
+
+    finally:
+        if reader is not None:
+            reader.release()
+        if out is not None:
+            try:
+                out.release()
+            except Exception:
+                pass
+
+# Number of decoded/enhanced frames allowed to wait between pipeline stages.
+# Peak memory of the streaming pipeline is bounded by this, not by the clip length.
+DEFAULT_QUEUE_SIZE = 8
+
+# Marks the end of a frame stream in the pipeline queues
+END_OF_STREAM = None
+
+
+def put_until_stopped(frame_queue, item, stop_event):
+    # Block on a bounded queue, but give up if another stage has failed
+    while not stop_event.is_set():
+        try:
+            frame_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get_until_stopped(frame_queue, stop_event):
+    # Counterpart of put_until_stopped; returns END_OF_STREAM if the pipeline was stopped
+    while not stop_event.is_set():
+        try:
+            return frame_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return END_OF_STREAM
+
+
+class JobCancelled(Exception):
+    # Raised inside a job once it has been cancelled
+    def __init__(self, message="The job was cancelled"):
+        super().__init__(message)
+
+
+class JobContext:
+    # What the threads working on one job share: the event that cancels the job, and the log its
+    # output goes to (used by the job server). Either may be None.
+    def __init__(self, cancel_event=None, log=None):
+        self.cancel_event = cancel_event
+        self.log = log
+
+
+# The job context of the current thread
+job_context = threading.local()
+
+
+def get_job_context():
+    return getattr(job_context, "current", None)
+
+
+def set_job_context(context):
+    job_context.current = context
+
+
+def in_job_context(target):
+    # Wrap a thread target so the new thread works in the job context of the thread creating it
+    context = get_job_context()
+
+    def run(*args):
+        set_job_context(context)
+        return target(*args)
+
+    return run
+
+
+def is_cancelled():
+    context = get_job_context()
+    return context is not None and context.cancel_event is not None and context.cancel_event.is_set()
+
+
+def check_cancelled():
+    if is_cancelled():
+        raise JobCancelled()
+
+
+# A tqdm progress line, e.g. "Processing frames:  45%|####5     | 136/301 [00:02<00:03, 50.1it/s]"
+# or "Processing frames: 136it [00:02, 50.1it/s]" when the total is unknown
+PROGRESS_PATTERN = re.compile(r"^(?P<stage>[^:|]*):\s*(?:\d+%\|[^|]*\|\s*)?(?P<n>\d+)(?:/(?P<total>\d+))?\w*\s\[")
+
+
+class JobLog:
+    # Base for the log of a JobContext: splits what the job prints into lines and keeps the latest
+    # tqdm progress. tqdm redraws its bar with "\r", so only lines ending in "\n" reach add_line.
+    def __init__(self):
+        self.progress = None
+        self.partial = ""
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            parts = re.split(r"([\r\n])", self.partial + text)
+            self.partial = parts.pop()
+            for line, end in zip(parts[::2], parts[1::2]):
+                match = PROGRESS_PATTERN.match(line)
+                if match:
+                    total = match.group("total")
+                    self.progress = {"stage": match.group("stage").strip(), "n": int(match.group("n")), "total": int(total) if total else None}
+                    self.progress_changed()
+                if end == "\n" and line.strip():
+                    self.add_line(line)
+
+    def progress_changed(self):
+        pass
+
+    def add_line(self, line):
+        pass
+
+
+# Frames a FrameReader decodes ahead of the stage that consumes them
+DEFAULT_PREFETCH_FRAMES = DEFAULT_QUEUE_SIZE
+# Gaps between selected frames from which FrameReader seeks instead of grabbing every frame in between
+SEEK_STRIDE = 30
+
+
+def open_video_capture(input_path, decoder_options=None):
+    # cv2.VideoCapture with the decoder settings of a job:
+    # {"threads": FFmpeg decoder threads (0 = OpenCV default), "hw_accel": try hardware decoding}.
+    # Falls back to the default decoder if the backend does not accept them.
+    decoder_options = decoder_options or {}
+    params = []
+    if decoder_options.get("threads"):
+        params += [cv2.CAP_PROP_N_THREADS, int(decoder_options["threads"])]
+    if decoder_options.get("hw_accel"):
+        params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+    if params:
+        cap = cv2.VideoCapture(input_path, cv2.CAP_FFMPEG, params)
+        if cap.isOpened():
+            return cap
+        print("The decoder options are not supported for", input_path, "- using the default decoder.")
+    return cv2.VideoCapture(input_path)
+
+
+class FrameReader:
+    # The input side of every pipeline, so a job decodes its input once.
+    # With prefetch > 0 a dedicated thread decodes up to prefetch frames ahead of read(); pipelines
+    # that already have a reader thread pass prefetch=0 and read() decodes on the calling thread.
+    # Only frames start_frame <= index < end_frame, every stride-th one, are returned. The frames in
+    # between are grab()bed without the colour conversion, or seeked over when they are far apart.
+    # Decode times go to metrics and add up in decode_seconds. Cancelling the job makes the next
+    # read() raise JobCancelled, which stops every pipeline at its input.
+
+    def __init__(self, input_path, start_frame=0, end_frame=None, stride=1, prefetch=DEFAULT_PREFETCH_FRAMES, decoder_options=None, metrics=METRICS):
+        self.cap = open_video_capture(input_path, decoder_options)
+        if not self.cap.isOpened():
+            raise Exception(f"Could not open input video: {input_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.stride = max(1, stride)
+        self.end_frame = end_frame
+        self.metrics = metrics
+        self.decode_seconds = 0.0
+
+        # Estimated from the container, like CAP_PROP_FRAME_COUNT itself
+        total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        last_frame = total_frames if end_frame is None else min(end_frame, total_frames)
+        self.frame_count = max(0, math.ceil((last_frame - start_frame) / self.stride))
+
+        # Index of the frame the decoder produces next, and of the next frame to return
+        self.position = 0
+        self.next_frame = start_frame
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            self.position = start_frame
+
+        self.frames = None
+        self.thread = None
+        self.finished = False
+        self.error = None
+        self.stop_event = threading.Event()
+        if prefetch > 0:
+            self.frames = queue.Queue(maxsize=prefetch)
+            self.thread = threading.Thread(target=in_job_context(self.prefetch_frames))
+            self.thread.daemon = True
+            self.thread.start()
+
+    def decode(self, frame=None):
+        # Decode the next selected frame, into frame if given; returns None after the last one
+        check_cancelled()
+        if self.end_frame is not None and self.next_frame >= self.end_frame:
+            return None
+        decode_start = time.perf_counter()
+        if self.next_frame - self.position >= SEEK_STRIDE:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.next_frame)
+            self.position = self.next_frame
+        while self.position < self.next_frame:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+        ret, frame = self.cap.read(frame)
+        if not ret:
+            return None
+        self.position += 1
+        self.next_frame += self.stride
+        decode_time = time.perf_counter() - decode_start
+        self.decode_seconds += decode_time
+        self.metrics.observe_stage("decode", decode_time)
+        return frame
+
+    def prefetch_frames(self):
+        try:
+            while not self.stop_event.is_set():
+                frame = self.decode()
+                if frame is None:
+                    break
+                if not put_until_stopped(self.frames, frame, self.stop_event):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            put_until_stopped(self.frames, END_OF_STREAM, self.stop_event)
+
+    def read(self, frame=None):
+        # Same contract as cv2.VideoCapture.read; raises if the prefetch thread failed
+        if self.finished:
+            return False, None
+        if self.thread is None:
+            result = self.decode(frame)
+        else:
+            result = get_until_stopped(self.frames, self.stop_event)
+            if result is END_OF_STREAM and self.error is not None:
+                raise self.error
+            if result is not END_OF_STREAM and frame is not None:
+                np.copyto(frame, result)
+                result = frame
+        if result is None:
+            self.finished = True
+            return False, None
+        return True, result
+
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                return
+            yield frame
+
+    def release(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.cap.release()
+
+
+def stream_video(input_path, output_path, enhance_frame, queue_size=DEFAULT_QUEUE_SIZE, desc="Processing Frames", num_workers=1, batch_size=1, encoder_options=None, stage="filter", decoder_options=None):
+    # Decode -> enhance -> encode entirely in memory.
+    # A reader thread decodes frames tagged with their sequence number into a bounded queue,
+    # num_workers threads run enhance_frame, and a writer thread puts the results back in order
+    # and encodes them while the workers are still running.
+    # With batch_size > 1, enhance_frame is called with a list of up to batch_size frames
+    # and must return a list of the same length.
+    # Per-frame times of each stage (enhance_frame is recorded as `stage`), queue waits and depths
+    # and the utilization of every thread go to METRICS.
+    # The reader thread below already decodes ahead into decoded_frames, so the reader does not prefetch
+    frame_reader = FrameReader(input_path, prefetch=0, decoder_options=decoder_options)
+    fps = frame_reader.fps
+    progress_bar = tqdm(total=frame_reader.frame_count, desc=desc, unit="frame")
+
+    decoded_frames = queue.Queue(maxsize=queue_size)
+    enhanced_frames = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    errors = []
+
+    # Frames the writer is holding back for reordering also count against the budget,
+    # so a slow frame cannot make the other workers buffer the rest of the video
+    frames_in_flight = threading.Semaphore(2 * queue_size + num_workers * batch_size)
+    start_time = time.perf_counter()
+
+    # Seconds each thread spent working, appended when it finishes, for the utilization gauges
+    busy_seconds = collections.defaultdict(list)
+
+    def fail(e, failed_stage):
+        if not isinstance(e, JobCancelled):
+            METRICS.inc("bytecrush_errors_total", stage=failed_stage)
+        errors.append(e)
+        stop_event.set()
+
+    def read_frames():
+        frame_index = 0
+        try:
+            while not stop_event.is_set():
+                if not frames_in_flight.acquire(timeout=0.1):
+                    continue
+                ret, frame = frame_reader.read()
+                if not ret:
+                    break
+                if not put_until_stopped(decoded_frames, (frame_index, frame), stop_event):
+                    break
+                frame_index += 1
+        except Exception as e:
+            fail(e, "decode")
+        finally:
+            busy_seconds["decode"].append(frame_reader.decode_seconds)
+            # One end marker per worker
+            for _ in range(num_workers):
+                put_until_stopped(decoded_frames, END_OF_STREAM, stop_event)
+
+    def enhance_frames():
+        enhance_seconds = 0.0
+        try:
+            end_of_stream = False
+            while not end_of_stream:
+                # Collect up to batch_size frames; a short batch is flushed at the end of the stream
+                batch = []
+                while len(batch) < batch_size:
+                    wait_start = time.perf_counter()
+                    item = get_until_stopped(decoded_frames, stop_event)
+                    METRICS.observe_queue("decoded", time.perf_counter() - wait_start, decoded_frames.qsize())
+                    if item is END_OF_STREAM:
+                        end_of_stream = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+
+                frame_indices = [frame_index for frame_index, _ in batch]
+                enhance_start = time.perf_counter()
+                if batch_size > 1:
+                    results = enhance_frame([frame for _, frame in batch])
+                else:
+                    results = [enhance_frame(batch[0][1])]
+                enhance_time = time.perf_counter() - enhance_start
+                enhance_seconds += enhance_time
+                METRICS.observe_stage(stage, enhance_time, len(batch))
+
+                for frame_index, frame in zip(frame_indices, results):
+                    if not put_until_stopped(enhanced_frames, (frame_index, frame), stop_event):
+                        return
+        except Exception as e:
+            fail(e, stage)
+        finally:
+            busy_seconds[stage].append(enhance_seconds)
+            put_until_stopped(enhanced_frames, END_OF_STREAM, stop_event)
+
+    def write_frames():
+        out = None
+        pending_frames = {}
+        next_index = 0
+        finished_workers = 0
+        encode_seconds = 0.0
+        try:
+            while finished_workers < num_workers:
+                wait_start = time.perf_counter()
+                item = get_until_stopped(enhanced_frames, stop_event)
+                METRICS.observe_queue("enhanced", time.perf_counter() - wait_start, enhanced_frames.qsize())
+                METRICS.set("bytecrush_queue_depth", len(pending_frames), queue="reorder")
+                METRICS.set_max("bytecrush_queue_depth_max", len(pending_frames), queue="reorder")
+                if item is END_OF_STREAM:
+                    if stop_event.is_set():
+                        break
+                    finished_workers += 1
+                    continue
+
+                frame_index, frame = item
+                pending_frames[frame_index] = frame
+
+                # Write every frame that is now in sequence
+                while next_index in pending_frames:
+                    frame = pending_frames.pop(next_index)
+
+                    # The output size is only known once the first frame has been enhanced
+                    encode_start = time.perf_counter()
+                    if out is None:
+                        out = open_encoder(output_path, fps, (frame.shape[1], frame.shape[0]), encoder_options)
+
+                    out.write(frame)
+                    encode_time = time.perf_counter() - encode_start
+                    encode_seconds += encode_time
+                    METRICS.observe_stage("encode", encode_time)
+                    next_index += 1
+                    frames_in_flight.release()
+                    progress_bar.update(1)
+        except Exception as e:
+            fail(e, "encode")
+        finally:
+            if out is not None:
+                encode_start = time.perf_counter()
+                out.release()
+                encode_seconds += time.perf_counter() - encode_start
+            busy_seconds["encode"].append(encode_seconds)
+
+    reader = threading.Thread(target=in_job_context(read_frames))
+    workers = [threading.Thread(target=in_job_context(enhance_frames)) for _ in range(num_workers)]
+    writer = threading.Thread(target=in_job_context(write_frames))
+    threads = [reader] + workers + [writer]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        writer.join()
+    finally:
+        # Unblock the other stages if the writer stopped early
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+        frame_reader.release()
+        progress_bar.close()
+
+    # Share of the wall time each stage's threads were busy; the stage closest to 1 bounds throughput
+    elapsed = time.perf_counter() - start_time
+    for busy_stage, seconds in busy_seconds.items():
+        METRICS.set("bytecrush_stage_workers", len(seconds), stage=busy_stage)
+        if elapsed > 0:
+            METRICS.set("bytecrush_stage_utilization", sum(seconds) / (elapsed * len(seconds)), stage=busy_stage)
+
+    if errors:
+        # Do not leave a truncated video behind for the next step to pick up
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise errors[0]
+    print_throughput(progress_bar.n, time.perf_counter() - start_time)
+
+
+def upscale_with_realesrgan_streaming(input_video_path, output_path, outscale, realesrgan_options, queue_size=DEFAULT_QUEUE_SIZE, reuse_threshold=None, result_cache=None, encoder_options=None, decoder_options=None):
+    # Same as create_images_from_video + upscale_with_realesrgan + compile_images_to_video,
+    # but frames stay in memory instead of going through PNG files in temp folders
+    try:
+        if realesrgan_options["model_name"] == AUTO_MODEL:
+            # Pick the model per shot; the single worker sees the frames in order
+            enhancer = ShotAdaptiveEnhancer(outscale, realesrgan_options, reuse_threshold, result_cache)
+            enhance = enhancer.enhance_batch if enhancer.batch_size > 1 else enhancer.enhance_frame
+            stream_video(input_video_path, output_path, enhance, queue_size=max(queue_size, enhancer.batch_size), desc="Upscaling Frames", batch_size=enhancer.batch_size, encoder_options=encoder_options, stage="inference", decoder_options=decoder_options)
+            enhancer.report()
+            print("RealESRGAN upscaling complete. Output saved as", output_path)
+            return True
+
+        enhance, batch_size = get_realesrgan_enhancer(outscale, realesrgan_options)
+
+        # Frames upscaled by an earlier run with the same settings are read back from the cache
+        bound_cache = None
+        if result_cache is not None:
+            bound_cache = result_cache.bind(**get_realesrgan_cache_params(outscale, realesrgan_options))
+            enhance = bound_cache.wrap_batch(enhance) if batch_size > 1 else bound_cache.wrap(enhance)
+
+        # Skip the model for frames that repeat a recent one
+        frame_cache = None
+        if reuse_threshold is not None:
+            frame_cache = FrameReuseCache(reuse_threshold)
+            enhance = frame_cache.wrap_batch(enhance) if batch_size > 1 else frame_cache.wrap(enhance)
+
+        stream_video(input_video_path, output_path, enhance, queue_size=max(queue_size, batch_size), desc="Upscaling Frames", batch_size=batch_size, encoder_options=encoder_options, stage="inference", decoder_options=decoder_options)
+
+        if frame_cache is not None:
+            frame_cache.report()
+        if bound_cache is not None:
+            bound_cache.report()
+
+        print("RealESRGAN upscaling complete. Output saved as", output_path)
+        return True
 
     except Exception as e:
-        print("An error occurred during image creation:", str(e))
+        # A cancelled job is reported by process_video
+        if not isinstance(e, JobCancelled):
+            print("An error occurred during RealESRGAN upscaling:", str(e))
+        return False
+
+
+# Bytes per MB, the unit of memory budgets
+MB = 1024 * 1024
+# Memory a RealESRGAN worker needs besides its frames: weights, torch and the smallest tiles (MB)
+REALESRGAN_WORKER_OVERHEAD = 512
+# Tile budget every extra RealESRGAN worker must get, so workers are not kept at the cost of tiny tiles (MB)
+WORKER_TILE_MEMORY_BUDGET = 256
+# Smallest tile budget handed to RealESRGAN (MB); tiles do not get smaller than 32 pixels anyway
+MIN_TILE_MEMORY_BUDGET = 16
+
+
+def plan_memory_budget(memory_budget, frame_size, output_size, num_workers=1, batch_size=1, queue_size=DEFAULT_QUEUE_SIZE, use_realesrgan=False):
+    # Fit a job into memory_budget (MB) from its frame sizes.
+    # Returns (queue_size, num_workers, worker_budget): the depth of each queue between stages, the
+    # number of workers that fit, and what each worker may use on top of its own frames (MB), from
+    # which RealESRGAN picks its tile size. Workers are dropped before queues get shorter, and when
+    # even one worker with one queued frame does not fit, the job runs on the smallest plan with
+    # small tiles instead of failing.
+    input_bytes = frame_size[0] * frame_size[1] * 3
+    output_bytes = output_size[0] * output_size[1] * 3
+    frame_bytes = input_bytes + output_bytes
+    if use_realesrgan:
+        # enhance_batch keeps float32 copies of its input and output next to the uint8 result
+        fixed_bytes = batch_size * (4 * input_bytes + 5 * output_bytes) + REALESRGAN_WORKER_OVERHEAD * MB
+    else:
+        # The filter chain keeps an intermediate and an output buffer per thread
+        fixed_bytes = batch_size * (input_bytes + 2 * output_bytes)
+    budget = memory_budget * MB
+
+    # Each worker holds its batch of frames and its working memory, next to at least one frame per queue
+    worker_bytes = fixed_bytes + batch_size * frame_bytes
+    if use_realesrgan:
+        worker_bytes += WORKER_TILE_MEMORY_BUDGET * MB
+    num_workers = max(1, min(num_workers, int((budget - 2 * frame_bytes) // worker_bytes)))
+    queue_size = max(1, min(queue_size, int((budget - num_workers * worker_bytes) // (2 * frame_bytes))))
 
-# Example usage:
+    worker_budget = (budget - 2 * queue_size * frame_bytes) / num_workers - batch_size * frame_bytes - fixed_bytes
+    if worker_budget < 0:
+        needed = (2 * frame_bytes + fixed_bytes + batch_size * frame_bytes) / MB
+        print(f"Warning: the memory budget of {memory_budget:g} MB is below the {needed:.0f} MB this job needs; running with the smallest settings.")
+    return queue_size, num_workers, max(MIN_TILE_MEMORY_BUDGET, worker_budget / MB)
 
-output_image_folder = "temp_images"  # Replace with the folder where you want to save the images
 
-# Create the image folder if it doesn't exist
-os.makedirs(output_image_folder, exist_ok=True)
+def record_job_metrics(input_video_path, output_video_path, succeeded, start_time):
+    status = "succeeded" if succeeded else "cancelled" if is_cancelled() else "failed"
+    METRICS.inc("bytecrush_jobs_total", status=status)
+    log_metrics_event("job", input=input_video_path, output=output_video_path, succeeded=succeeded, seconds=time.time() - start_time)
 
 
+class StageFailed(Exception):
+    # A stage of process_video returned False; the stage function has already printed why
+    pass
 
 
+def run_stage(succeeded):
+    # Check the result of a stage function. A stage that stopped because the job was cancelled
+    # is reported as a cancellation rather than as a failure.
+    check_cancelled()
+    if not succeeded:
+        raise StageFailed()
 
 
+def process_video(input_video_path, output_video_path, scale_factor=1, sharpen_intensity=0, denoise_strength=0, realesrgan_options=None, outscale_value=2, use_streaming=True, num_threads=1, num_processes=1, resumable=False, reuse_threshold=None, result_cache=None, jobs_dir=DEFAULT_JOBS_DIR, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, use_shared_memory=False, spill_format=DEFAULT_SPILL_FORMAT, memory_budget=None, decoder_options=None):
+    # Run one upscale job end to end (upscale, add audio, clean up) and return True if the output was written.
+    # Shared by the GUI and the headless command line.
+    use_realesrgan = realesrgan_options is not None
+
+    job_dir = None
+    job_succeeded = False
+    start_time = time.time()
+
+    try:
+        if not use_realesrgan and (scale_factor is None or scale_factor <= 0):
+            raise ValueError("Scale factor must be specified and greater than 0 when RealESRGAN is disabled.")
+
+        queue_size = None
+        if memory_budget:
+            # Size queue depths, worker counts and RealESRGAN's tile size from the frame dimensions.
+            # RealESRGAN runs one worker per process; the classic paths use threads or processes.
+            frame_size = get_video_frame_size(input_video_path)
+            scale = float(outscale_value) if use_realesrgan else scale_factor
+            output_size = (int(frame_size[0] * scale), int(frame_size[1] * scale))
+            batch_size = realesrgan_options.get("batch_size", 1) if use_realesrgan else 1
+            num_workers = num_processes if num_processes > 1 or use_realesrgan else num_threads
+            queue_size, num_workers, worker_budget = plan_memory_budget(memory_budget, frame_size, output_size, num_workers, batch_size, max(DEFAULT_QUEUE_SIZE, 2 * num_workers), use_realesrgan)
+            if num_processes > 1:
+                num_processes = num_workers
+            elif not use_realesrgan:
+                num_threads = num_workers
+            if use_realesrgan:
+                realesrgan_options = dict(realesrgan_options, memory_budget=worker_budget)
+            print(f"Memory budget {memory_budget:g} MB: {num_workers} worker(s), queues of {queue_size} frame(s)" + (f", {worker_budget:.0f} MB per RealESRGAN pass" if use_realesrgan else ""))
+
+        if resumable:
+            # Checkpointed segments in a per-job directory; run_resumable_job cleans up after itself
+            job_succeeded = run_resumable_job(input_video_path, output_video_path, scale_factor, sharpen_intensity, denoise_strength, outscale_value, realesrgan_options, num_processes=num_processes, jobs_dir=jobs_dir, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, resize_first=resize_first, denoise_mode=denoise_mode, decoder_options=decoder_options)
+            record_job_metrics(input_video_path, output_video_path, job_succeeded, start_time)
+            return job_succeeded
+
+        # Temporary files live in a per-job directory so concurrent runs do not collide
+        job_params = {"scale_factor": scale_factor, "sharpen_intensity": sharpen_intensity, "denoise_strength": denoise_strength, "realesrgan_options": repr(realesrgan_options), "encoder_options": repr(encoder_options), "resize_first": resize_first, "denoise_mode": denoise_mode}
+        job_dir = get_job_dir(input_video_path, output_video_path, job_params, jobs_dir)
+        temp_video_path = os.path.join(job_dir, "temp_video" + INTERMEDIATE_VIDEO_EXT)  # Temporary video file
+        temp_compiledvideo_path = os.path.join(job_dir, "temp2" + INTERMEDIATE_VIDEO_EXT)
+        temp_segments_path = os.path.join(job_dir, "segments")
+
+        if use_realesrgan:
+            if num_processes > 1:
+                # Split the video into segments and upscale each one in its own process
+                run_stage(upscale_and_enhance_video_parallel(input_video_path, temp_compiledvideo_path, scale_factor, sharpen_intensity, denoise_strength, num_processes, outscale_value, realesrgan_options, temp_segments_path=temp_segments_path, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, decoder_options=decoder_options))
+            elif use_streaming or realesrgan_options["model_name"] == AUTO_MODEL or realesrgan_options.get("crop_borders") or realesrgan_options.get("roi"):
+                # Decode, upscale and encode in memory without temp images.
+                # Per-shot model selection and border cropping need the frames in order, so they always stream.
+                run_stage(upscale_with_realesrgan_streaming(input_video_path, temp_compiledvideo_path, outscale_value, realesrgan_options, queue_size=queue_size or DEFAULT_QUEUE_SIZE, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, decoder_options=decoder_options))
+            elif spill_format == "raw" and has_raw_spill_space(input_video_path, float(outscale_value), job_dir):
+                # Hand the frames to RealESRGAN as memory-mapped raw frames instead of PNG files, one segment at a time
+                run_stage(upscale_with_realesrgan_raw(input_video_path, temp_compiledvideo_path, job_dir, outscale_value, realesrgan_options, result_cache=result_cache, encoder_options=encoder_options, decoder_options=decoder_options))
+            else:
+                temp_image_folder = os.path.join(job_dir, "images")
+                os.makedirs(temp_image_folder, exist_ok=True)
+                run_stage(create_images_from_video(input_video_path, temp_image_folder, decoder_options))
+
+                # Use a temporary path for the RealESRGAN upscaled video
+                temp_upscaled_images_path = os.path.join(job_dir, "upscaled_images")
+                os.makedirs(temp_upscaled_images_path, exist_ok=True)
+                run_stage(upscale_with_realesrgan(temp_image_folder, temp_upscaled_images_path, outscale_value, realesrgan_options, result_cache=result_cache))
+
+                # Compile the upscaled images back into a video using OpenCV
+                run_stage(compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path, get_video_fps(input_video_path), encoder_options))
+
+            run_stage(add_audio_to_video(input_video_path, temp_compiledvideo_path, output_video_path))
+        else:
+            
+            if num_processes > 1 and use_shared_memory and reuse_threshold is None:
+                # Stream frames to the worker processes through shared memory. Duplicate-frame reuse
+                # would keep references to slots that get overwritten, so it uses segments instead.
+                run_stage(upscale_and_enhance_video_shared_memory(input_video_path, temp_video_path, scale_factor, sharpen_intensity, denoise_strength, num_processes, queue_size=queue_size, result_cache=result_cache, encoder_options=encoder_options, resize_first=resize_first, denoise_mode=denoise_mode, decoder_options=decoder_options))
+            elif num_processes > 1:
+                run_stage(upscale_and_enhance_video_parallel(input_video_path, temp_video_path, scale_factor, sharpen_intensity, denoise_strength, num_processes, temp_segments_path=temp_segments_path, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, resize_first=resize_first, denoise_mode=denoise_mode, decoder_options=decoder_options))
+            elif num_threads > 1:
+                run_stage(upscale_and_enhance_video_multithreaded(input_video_path, temp_video_path, scale_factor, sharpen_intensity, denoise_strength, num_threads, queue_size=queue_size, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, resize_first=resize_first, denoise_mode=denoise_mode, decoder_options=decoder_options))
+            else:
+                run_stage(upscale_and_enhance_video(input_video_path, temp_video_path, None, scale_factor, sharpen_intensity, denoise_strength, reuse_threshold=reuse_threshold, result_cache=result_cache, encoder_options=encoder_options, resize_first=resize_first, denoise_mode=denoise_mode, decoder_options=decoder_options))
+
+            # Add audio to the upscaled video and save it to the final output path
+            run_stage(add_audio_to_video(input_video_path, temp_video_path, output_video_path))
+
+        # Every stage reports its own errors and returns False, which run_stage turns into StageFailed
+        job_succeeded = True
+
+    except StageFailed:
+        pass
+    except ValueError as ve:
+        print("ValueError:", str(ve))
+    except JobCancelled as e:
+        print(str(e))
+    except Exception as e:
+        METRICS.inc("bytecrush_errors_total", stage="job")
+        print("An error occurred:", str(e))
+
+    record_job_metrics(input_video_path, output_video_path, job_succeeded, start_time)
+
+    # Clean up: Remove the temporary files, but keep them for inspection if the job failed
+    if job_dir is not None:
+        if job_succeeded or is_cancelled():
+            shutil.rmtree(job_dir, ignore_errors=True)
+            print("Temporary files in", job_dir, "have been deleted.")
+        else:
+            print("The job did not complete. Temporary files are kept in", job_dir)
+
+    return job_succeeded
+
 
 def upscale_button_click():
     input_video_path = input_path_var.get()
-    create_images_from_video(input_video_path, output_image_folder)
-    temp_video_path = "temp_video.mp4"  # Temporary video file
-    temp_compiledvideo_path="temp2.mp4"
     output_video_path = output_path_var.get()  # Use the specified output path
     scale_factor_str = scale_factor_entry.get()  # Get the scale factor as a string
     sharpen_intensity = sharpen_intensity_scale.get()
@@ -200,17 +2128,38 @@ def upscale_button_click():
     # Check if the "Use Multithreading" checkbox is selected
     use_multithreading = multithreading_checkbox.get()
 
-    # Determine the number of threads based on the user's choice
+    # Determine the number of threads and processes based on the user's choice
     num_threads = multiprocessing.cpu_count() if use_multithreading else 1
+    num_processes = multiprocessing.cpu_count() if multiprocessing_checkbox.get() else 1
+
+    # Reuse the output of duplicate frames if the "Reuse Duplicate Frames" checkbox is selected
+    reuse_threshold = DEFAULT_REUSE_THRESHOLD if reuse_checkbox.get() else None
+
+    # Reuse frames processed by earlier runs if the "Cache Results on Disk" checkbox is selected
+    result_cache = ResultCache() if result_cache_checkbox.get() else None
 
     # Define RealESRGAN options
     realesrgan_options = None
     if use_realesrgan:
         realesrgan_options = {
-            "model_name": "realesr-general-x4v3",  # You can change the model name as needed
+            "model_name": DEFAULT_REALESRGAN_MODEL,  # You can change the model name as needed
             "suffix": "out",
             "ext": "auto"
         }
+        # Let the shot policy pick the model if the "Pick Model per Shot" checkbox is selected
+        if shot_model_checkbox.get():
+            realesrgan_options["model_name"] = AUTO_MODEL
+        # Skip letterbox/pillarbox bars if the "Crop Letterbox Bars" checkbox is selected
+        if crop_borders_checkbox.get():
+            realesrgan_options["crop_borders"] = True
+        # Torch CPU threads; left empty, torch picks its own number
+        torch_threads_str = torch_threads_entry.get().strip()
+        if torch_threads_str:
+            try:
+                realesrgan_options["num_threads"] = int(torch_threads_str)
+            except ValueError as ve:
+                print("ValueError:", str(ve))
+                return
 
     # Define scale_factor outside the if-else block with a default value of 1
     scale_factor = 1
@@ -219,39 +2168,102 @@ def upscale_button_click():
         if not use_realesrgan:
             # If RealESRGAN is not enabled, parse the scale factor
             scale_factor = float(scale_factor_str)  # Convert the string to a float
-
-        # Get the selected outscale value from the dropdown menu
-        outscale_value = "2"
-
-        if use_realesrgan:
-            # Use a temporary path for the RealESRGAN upscaled video
-            temp_upscaled_images_path = "temp_upscaled_images"
-            os.makedirs(temp_upscaled_images_path, exist_ok=True)
-            upscale_with_realesrgan(output_image_folder, temp_upscaled_images_path, outscale_value, realesrgan_options)
-
-            # Compile the upscaled images back into a video using OpenCV
-            compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path)
-            add_audio_to_video(input_video_path, temp_compiledvideo_path, output_video_path)
-
-        if os.path.exists(temp_compiledvideo_path):
-            os.remove(temp_compiledvideo_path)
-            print("Temporary compiled video deleted:", temp_compiledvideo_path)
-        else:
-            
-            upscale_and_enhance_video(input_video_path, output_video_path, temp_video_path, scale_factor, sharpen_intensity, denoise_strength)
-
-        # Add audio to the upscaled video and save it to the final output path
-            add_audio_to_video(input_video_path, temp_video_path, output_video_path)
-        
-            
-
     except ValueError as ve:
         print("ValueError:", str(ve))
-    except Exception as e:
-        print("An error occurred:", str(e))
-
-          # Clean up: Remove the temporary images
-    clean_temp_images(output_image_folder)
+        return
+
+    # Get the selected outscale value from the dropdown menu
+    outscale_value = "2"
+
+    options = {"use_streaming": streaming_checkbox.get(), "num_threads": num_threads, "num_processes": num_processes, "resumable": resumable_checkbox.get(), "reuse_threshold": reuse_threshold, "result_cache": result_cache, "denoise_mode": denoise_mode_var.get()}
+    start_gui_job((input_video_path, output_video_path, scale_factor, sharpen_intensity, denoise_strength, realesrgan_options, outscale_value), options)
+
+
+# How often the GUI checks the running job for progress, in milliseconds
+GUI_POLL_INTERVAL = 100
+
+# The job started from the GUI, if it is still running
+gui_job = None
+
+
+class GuiJobLog(JobLog):
+    # Log of the GUI job: queues its output lines and progress for the Tk thread, which is the only
+    # thread allowed to touch the widgets
+    def __init__(self):
+        super().__init__()
+        self.events = queue.Queue()
+
+    def progress_changed(self):
+        self.events.put(("progress", self.progress))
+
+    def add_line(self, line):
+        self.events.put(("line", line))
+
+
+def start_gui_job(args, options):
+    # Run process_video on a worker thread so the window keeps responding
+    global gui_job
+    if gui_job is not None:
+        return
+
+    context = JobContext(threading.Event(), GuiJobLog())
+
+    def run():
+        set_job_context(context)
+        try:
+            succeeded = process_video(*args, **options)
+        except Exception as e:
+            print("An error occurred:", str(e))
+            succeeded = False
+        status = "Cancelled" if context.cancel_event.is_set() else "Done" if succeeded else "Failed"
+        context.log.events.put(("done", status))
+
+    gui_job = context
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    upscale_button.config(state="disabled")
+    cancel_button.config(state="normal")
+    progress_var.set(0)
+    status_var.set("Starting...")
+    root.after(GUI_POLL_INTERVAL, poll_gui_job)
+
+
+def poll_gui_job():
+    # Apply the progress queued by the job's threads; runs on the Tk thread until the job ends
+    global gui_job
+    events = gui_job.log.events
+    while True:
+        try:
+            event, value = events.get_nowait()
+        except queue.Empty:
+            break
+        if event == "progress":
+            if value["total"]:
+                progress_var.set(100 * value["n"] / value["total"])
+                status_var.set(f"{value['stage']}: {value['n']}/{value['total']}")
+            else:
+                status_var.set(f"{value['stage']}: {value['n']}")
+        elif event == "line":
+            status_var.set(value)
+        elif event == "done":
+            status_var.set(value)
+            if value == "Done":
+                progress_var.set(100)
+            upscale_button.config(state="normal")
+            cancel_button.config(state="disabled")
+            gui_job = None
+            return
+    root.after(GUI_POLL_INTERVAL, poll_gui_job)
+
+
+def cancel_button_click():
+    # The job stops at its next frame; process_video then removes its temp files
+    if gui_job is not None:
+        gui_job.cancel_event.set()
+        status_var.set("Cancelling...")
+        cancel_button.config(state="disabled")
 
 # Function to clean up temporary images in the given folder
 def clean_temp_images(folder_path):
@@ -264,7 +2276,7 @@ def clean_temp_images(folder_path):
     except Exception as e:
         print("An error occurred while cleaning up temporary images:", str(e))
 
-def compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path):
+def compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path, fps=30.0, encoder_options=None):
     try:
         # Get a list of image file names in the directory
         image_files = sorted([os.path.join(temp_upscaled_images_path, img) for img in os.listdir(temp_upscaled_images_path) if img.endswith(('.jpg', '.jpeg', '.png'))])
@@ -276,17 +2288,20 @@ def compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path):
         first_image = cv2.imread(image_files[0])
         height, width, layers = first_image.shape
 
-        # Define the codec and create a VideoWriter object
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(temp_compiledvideo_path, fourcc, 30.0, (width, height))
+        # Create the encoder
+        out = open_encoder(temp_compiledvideo_path, fps, (width, height), encoder_options)
 
         # Create a tqdm progress bar
         progress_bar = tqdm(total=len(image_files), desc="Compiling Video", unit="frame")
 
         # Write the images to the video
         for image_file in image_files:
+            stage_start = time.perf_counter()
             frame = cv2.imread(image_file)
+            record_stage_time("load", stage_start)
+            stage_start = time.perf_counter()
             out.write(frame)
+            record_stage_time("encode", stage_start)
             progress_bar.update(1)
 
         # Close the progress bar
@@ -300,110 +2315,725 @@ def compile_images_to_video(temp_upscaled_images_path, temp_compiledvideo_path):
             os.remove(image_file)
 
         print("Images compiled into a video. Output saved as", temp_compiledvideo_path)
+        return True
 
     except Exception as e:
         print("An error occurred during image compilation:", str(e))
+        return False
+
+
+def compile_raw_frames_to_video(temp_frames_path, temp_compiledvideo_path, fps=30.0, encoder_options=None):
+    try:
+        if not is_raw_frames(temp_frames_path):
+            raise Exception("No upscaled frames found in " + temp_frames_path)
+
+        # The frames are paged in from the file as the encoder reaches them
+        frames, _ = open_raw_frames(temp_frames_path)
+        if len(frames) == 0:
+            raise Exception("No upscaled frames found in " + temp_frames_path)
+
+        height, width = frames.shape[1:3]
+        out = open_encoder(temp_compiledvideo_path, fps, (width, height), encoder_options)
+        progress_bar = tqdm(total=len(frames), desc="Compiling Video", unit="frame")
+
+        for frame in frames:
+            stage_start = time.perf_counter()
+            frame = np.ascontiguousarray(frame)
+            record_stage_time("load", stage_start)
+            stage_start = time.perf_counter()
+            out.write(frame)
+            record_stage_time("encode", stage_start)
+            progress_bar.update(1)
+
+        progress_bar.close()
+        out.release()
+
+        # Clean up: Remove the temporary frames
+        del frames
+        os.remove(temp_frames_path)
+
+        print("Raw frames compiled into a video. Output saved as", temp_compiledvideo_path)
+        return True
+
+    except Exception as e:
+        print("An error occurred during raw frame compilation:", str(e))
+        return False
 
      
 
 # New function for multithreaded video processing
-def upscale_and_enhance_video_multithreaded(input_path, output_path, scale_factor, sharpen_intensity, denoise_strength, num_threads):
+def upscale_and_enhance_video_multithreaded(input_path, output_path, scale_factor, sharpen_intensity, denoise_strength, num_threads, queue_size=None, reuse_threshold=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
     try:
-        # Open the input video file
-        cap = cv2.VideoCapture(input_path)
-
         # Get the original video's frame width and height
-        frame_width = int(cap.get(3))
-        frame_height = int(cap.get(4))
+        frame_width, frame_height = get_video_frame_size(input_path)
 
         # Calculate the new frame dimensions after upscaling
         new_width = int(frame_width * scale_factor)
         new_height = int(frame_height * scale_factor)
 
-        # Define the codec and create a VideoWriter object to save the output video
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, 30.0, (new_width, new_height))
+        # Keep every worker busy without letting the queues grow with the video length
+        if queue_size is None:
+            queue_size = max(DEFAULT_QUEUE_SIZE, 2 * num_threads)
 
-        # Calculate the total number of frames in the video
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # One filter chain shared by the worker threads; its scratch buffers are per thread.
+        # The outputs wait in the queues, so each frame gets a freshly allocated output.
+        filter_chain = FilterChain((new_width, new_height), sharpen_intensity, resize_first, denoise_strength, denoise_mode)
+        process_frame = filter_chain.apply
 
-        # Create a tqdm progress bar
-        progress_bar = tqdm(total=total_frames, desc="Processing Frames", unit="frame")
+        # Frames processed by an earlier run with the same settings are read back from the cache
+        bound_cache = None
+        if result_cache is not None:
+            bound_cache = result_cache.bind(**get_classic_cache_params(scale_factor, sharpen_intensity, denoise_strength, resize_first, denoise_mode))
+            process_frame = bound_cache.wrap(process_frame)
 
-        # Create queues for passing frames between threads
-        input_queue = queue.Queue()
-        output_queue = queue.Queue()
+        # Skip the filters for frames that repeat a recent one
+        frame_cache = None
+        if reuse_threshold is not None:
+            frame_cache = FrameReuseCache(reuse_threshold)
+            process_frame = frame_cache.wrap(process_frame)
 
-        # Define a function for frame processing in a worker thread
-        def process_frame():
-            while True:
-                frame = input_queue.get()
-                if frame is None:
+        # Frames are tagged with their position, processed by num_threads workers
+        # and written back in order while the workers are still running
+        stream_video(input_path, output_path, process_frame, queue_size=queue_size, num_workers=num_threads, encoder_options=encoder_options, decoder_options=decoder_options)
+
+        if frame_cache is not None:
+            frame_cache.report()
+        if bound_cache is not None:
+            bound_cache.report()
+
+        print("Video upscaling and enhancement complete. Output saved as", output_path)
+        return True
+
+    except Exception as e:
+        if not isinstance(e, JobCancelled):
+            print("An error occurred:", str(e))
+        return False
+
+
+def get_ffmpeg_exe():
+    # moviepy ships an ffmpeg binary through imageio-ffmpeg; fall back to the one on PATH
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe as imageio_get_ffmpeg_exe
+        return imageio_get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def split_frame_range(total_frames, num_segments):
+    # Split [0, total_frames) into num_segments contiguous (start, end) ranges of near-equal length
+    num_segments = max(1, min(num_segments, total_frames))
+    bounds = [total_frames * i // num_segments for i in range(num_segments + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(num_segments) if bounds[i] < bounds[i + 1]]
+
+
+def process_video_segment(input_path, segment_path, start_frame, end_frame, scale_factor, sharpen_intensity, denoise_strength, outscale_value=2, realesrgan_options=None, reuse_threshold=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
+    # Runs in a worker process: seek to start_frame, process up to end_frame and write a standalone segment.
+    # Each process uses its own decoder and encoder, so nothing is shared between workers.
+    cv2.setNumThreads(1)
+
+    # Recorded locally and sent back to the parent with the other stats
+    metrics = PipelineMetrics()
+
+    reader = FrameReader(input_path, start_frame, end_frame, decoder_options=decoder_options, metrics=metrics)
+    fps = reader.fps
+
+    batch_size = 1
+    shot_enhancer = None
+    if realesrgan_options is not None and realesrgan_options["model_name"] == AUTO_MODEL:
+        # Shots are detected within the segment; the enhancer has its own per-model caches
+        shot_enhancer = ShotAdaptiveEnhancer(outscale_value, realesrgan_options, reuse_threshold, result_cache)
+        batch_size = shot_enhancer.batch_size
+        process_frame = shot_enhancer.enhance_batch if batch_size > 1 else shot_enhancer.enhance_frame
+        result_cache = reuse_threshold = None
+    elif realesrgan_options is not None:
+        process_frame, batch_size = get_realesrgan_enhancer(outscale_value, realesrgan_options)
+    else:
+        new_width = int(reader.frame_size[0] * scale_factor)
+        new_height = int(reader.frame_size[1] * scale_factor)
+        process_frame = FilterChain((new_width, new_height), sharpen_intensity, resize_first, denoise_strength, denoise_mode).apply
+
+    # Frames processed by an earlier run with the same settings are read back from the cache
+    bound_cache = None
+    if result_cache is not None:
+        if realesrgan_options is not None:
+            cache_params = get_realesrgan_cache_params(outscale_value, realesrgan_options)
+        else:
+            cache_params = get_classic_cache_params(scale_factor, sharpen_intensity, denoise_strength, resize_first, denoise_mode)
+        bound_cache = result_cache.bind(**cache_params)
+        process_frame = bound_cache.wrap_batch(process_frame) if batch_size > 1 else bound_cache.wrap(process_frame)
+
+    # Skip the enhancement for frames that repeat a recent one
+    frame_cache = None
+    if reuse_threshold is not None:
+        frame_cache = FrameReuseCache(reuse_threshold)
+        process_frame = frame_cache.wrap_batch(process_frame) if batch_size > 1 else frame_cache.wrap(process_frame)
+
+    stage = "filter" if realesrgan_options is None else "inference"
+    stage_seconds = collections.Counter()
+    start_time = time.perf_counter()
+
+    out = None
+    frames_written = 0
+    try:
+        end_of_segment = False
+        while not end_of_segment:
+            # Read up to batch_size frames; the reader stops at the end of the segment
+            batch = []
+            while len(batch) < batch_size:
+                ret, frame = reader.read()
+                if not ret:
+                    end_of_segment = True
                     break
+                batch.append(frame)
+            if not batch:
+                break
 
-                # Apply sharpening with user-defined intensity
-                if sharpen_intensity > 0:
-                    kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], dtype=np.float32)
-                    frame = cv2.filter2D(frame, -1, kernel)
+            stage_start = time.perf_counter()
+            results = process_frame(batch) if batch_size > 1 else [process_frame(batch[0])]
+            stage_seconds[stage] += record_stage_time(stage, stage_start, len(batch), metrics=metrics)
+            for frame in results:
+                stage_start = time.perf_counter()
+                if out is None:
+                    out = open_encoder(segment_path, fps, (frame.shape[1], frame.shape[0]), encoder_options)
+                out.write(frame)
+                stage_seconds["encode"] += record_stage_time("encode", stage_start, metrics=metrics)
+                frames_written += 1
+    finally:
+        reader.release()
+        if out is not None:
+            out.release()
+
+    stage_seconds["decode"] = reader.decode_seconds
+
+    record_stage_utilization(stage_seconds, time.perf_counter() - start_time, metrics=metrics)
+
+    # Counters go back to the parent so they can be reported for the whole video
+    stats = {"frames": frames_written, "reuse_hits": 0, "reuse_misses": 0, "cache_hits": 0, "cache_misses": 0, "metrics": metrics.snapshot()}
+    if frame_cache is not None:
+        stats["reuse_hits"] = frame_cache.hits
+        stats["reuse_misses"] = frame_cache.misses
+    if bound_cache is not None:
+        stats["cache_hits"] = bound_cache.hits
+        stats["cache_misses"] = bound_cache.misses
+    if shot_enhancer is not None:
+        stats.update(shot_enhancer.stats())
+    return stats
+
+
+def create_segment_executor(num_processes):
+    # Process pool for process_video_segment. The workers get a cancel event of their own in their
+    # job context, which is set when the job is cancelled (as_completed_or_cancelled) or a segment fails.
+    cancel_event = multiprocessing.Event()
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_processes, initializer=set_job_context, initargs=(JobContext(cancel_event), ))
+    return executor, cancel_event
+
+
+def stop_segments(executor, cancel_event):
+    # After a segment failed: drop the segments that have not started and stop the running ones at
+    # their next frame, so the error is reported without processing the rest of the video first
+    cancel_event.set()
+    executor.shutdown(cancel_futures=True)
+
+
+def as_completed_or_cancelled(futures, cancel_event):
+    # concurrent.futures.as_completed that passes a cancellation of the job on to the worker processes
+    pending = set(futures)
+    while pending:
+        done, pending = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+        if is_cancelled():
+            cancel_event.set()
+        yield from done
+
+
+def concat_video_segments(segment_paths, output_path):
+    # Join segments without re-encoding using ffmpeg's concat demuxer.
+    # ffmpeg joins whatever it can read, so a segment without frames (e.g. one whose encoder could
+    # not write its codec) would silently drop out of the video instead of failing the job.
+    if not segment_paths:
+        raise Exception("There are no segments to join")
+    for segment_path in segment_paths:
+        cap = cv2.VideoCapture(segment_path)
+        has_frames = cap.grab()
+        cap.release()
+        if not has_frames:
+            raise Exception(f"Segment {segment_path} has no frames")
 
-            
+    list_path = output_path + ".segments.txt"
+    with open(list_path, "w") as list_file:
+        for segment_path in segment_paths:
+            escaped_path = os.path.abspath(segment_path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
 
-              
-                # Resize the frame to the new dimensions
-                resized_frame = cv2.resize(frame, (new_width, new_height))
+    try:
+        cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path]
+        subprocess.run(cmd, check=True)
+    finally:
+        os.remove(list_path)
 
-                # Put the processed frame into the output queue
-                output_queue.put(resized_frame)
 
-                # Update the progress bar
-                progress_bar.update(1)
+def upscale_and_enhance_video_parallel(input_path, output_path, scale_factor, sharpen_intensity, denoise_strength, num_processes, outscale_value=2, realesrgan_options=None, num_segments=None, temp_segments_path="temp_segments", reuse_threshold=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
+    # Split the video into time ranges and process each one in its own worker process.
+    # Unlike the threaded pipeline, encoding is parallel too, so this scales with cores on CPU-only hosts.
+    try:
+        cap = cv2.VideoCapture(input_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
 
-        # Create worker threads for frame processing
-        threads = []
-        for _ in range(num_threads):
-            thread = threading.Thread(target=process_frame)
-            thread.daemon = True
-            thread.start()
-            threads.append(thread)
+        if total_frames <= 0:
+            raise Exception(f"Could not read the frame count of {input_path}")
+
+        if num_segments is None:
+            num_segments = num_processes
+        segments = split_frame_range(total_frames, num_segments)
+
+        os.makedirs(temp_segments_path, exist_ok=True)
+        segment_paths = [os.path.join(temp_segments_path, f"segment_{i:04d}{INTERMEDIATE_VIDEO_EXT}") for i in range(len(segments))]
+
+        progress_bar = tqdm(total=total_frames, desc="Processing Segments", unit="frame")
+        totals = collections.Counter()
+        start_time = time.perf_counter()
+        try:
+            executor, cancel_event = create_segment_executor(num_processes)
+            with executor:
+                futures = [
+                    executor.submit(process_video_segment, input_path, segment_path, start_frame, end_frame, scale_factor, sharpen_intensity, denoise_strength, outscale_value, realesrgan_options, reuse_threshold, result_cache, encoder_options, resize_first, denoise_mode, decoder_options)
+                    for segment_path, (start_frame, end_frame) in zip(segment_paths, segments)
+                ]
+                try:
+                    for future in as_completed_or_cancelled(futures, cancel_event):
+                        stats = future.result()
+                        METRICS.merge(stats.pop("metrics"))
+                        totals.update(stats)
+                        progress_bar.update(stats["frames"])
+                except BaseException:
+                    stop_segments(executor, cancel_event)
+                    raise
+        finally:
+            progress_bar.close()
+
+        print_throughput(totals["frames"], time.perf_counter() - start_time)
+        if reuse_threshold is not None:
+            print_frame_reuse(totals["reuse_hits"], totals["reuse_misses"])
+        if result_cache is not None:
+            print_result_cache(totals["cache_hits"], totals["cache_misses"])
+
+        # Segments that ended up empty (e.g. a frame count overestimated by the container) are skipped
+        segment_paths = [path for path in segment_paths if os.path.exists(path)]
+        concat_video_segments(segment_paths, output_path)
 
-        # Loop through the frames of the input video and put them into the input queue
-        while True:
-            ret, frame = cap.read()
+        print("Video upscaling and enhancement complete. Output saved as", output_path)
+        return True
 
-            # Break the loop if we have reached the end of the video
-            if not ret:
-                break
+    except Exception as e:
+        if not isinstance(e, JobCancelled):
+            print("An error occurred:", str(e))
+        return False
+
+    finally:
+        clean_temp_images(temp_segments_path)
+
+
+class SharedFrameRing:
+    # Preallocated frame slots in one multiprocessing.shared_memory block.
+    # Every process maps the same memory, so stages hand each other slot indices instead of frames
+    # and a frame written into a slot is never pickled or copied. Pickling the ring (to pass it to
+    # a worker process) only sends its name and shape.
+
+    def __init__(self, slot_count, frame_shape, dtype=np.uint8, name=None):
+        self.slot_count = slot_count
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        # Only the creating process unlinks the block; forked workers inherit this object as is
+        self.owner_pid = os.getpid() if name is None else None
+        if name is None:
+            size = slot_count * int(np.prod(self.frame_shape)) * self.dtype.itemsize
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slot_count,) + self.frame_shape, dtype=self.dtype, buffer=self.shm.buf)
 
-            input_queue.put(frame)
+    def __getstate__(self):
+        return {"slot_count": self.slot_count, "frame_shape": self.frame_shape, "dtype": self.dtype.str, "name": self.shm.name}
 
-        # Signal worker threads to finish
-        for _ in range(num_threads):
-            input_queue.put(None)
+    def __setstate__(self, state):
+        self.__init__(state["slot_count"], state["frame_shape"], state["dtype"], state["name"])
 
-        # Wait for all worker threads to finish processing
-        for thread in threads:
-            thread.join()
+    def slot(self, index):
+        return self.frames[index]
 
-        # Write frames from the output queue to the output video
-        while not output_queue.empty():
-            resized_frame = output_queue.get()
-            out.write(resized_frame)
+    def close(self):
+        # The array has to go before the mapping can be closed
+        self.frames = None
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
 
-        # Close the progress bar
-        progress_bar.close()
 
-        # Release video objects
-        cap.release()
+def get_slot(slots, stop_event):
+    # Like get_until_stopped for a multiprocessing queue
+    while not stop_event.is_set():
+        try:
+            return slots.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def shared_memory_worker(tasks, results, input_ring, output_ring, free_input_slots, free_output_slots, filter_args, result_cache=None, cache_params=None):
+    # Runs in a worker process: filter each decoded frame from its input slot straight into an output slot
+    cv2.setNumThreads(1)
+    try:
+        filter_chain = FilterChain(*filter_args)
+        bound_cache = result_cache.bind(**cache_params) if result_cache is not None else None
+        while True:
+            task = tasks.get()
+            if task is END_OF_STREAM:
+                break
+            frame_index, input_slot = task
+            output_slot = free_output_slots.get()
+            frame = input_ring.slot(input_slot)
+            output = output_ring.slot(output_slot)
+
+            filter_start = time.perf_counter()
+            cached = bound_cache.get(frame) if bound_cache is not None else None
+            if cached is not None:
+                np.copyto(output, cached)
+            else:
+                filter_chain.apply(frame, out=output)
+                if bound_cache is not None:
+                    bound_cache.put(frame, output)
+            filter_seconds = time.perf_counter() - filter_start
+
+            free_input_slots.put(input_slot)
+            results.put(("frame", frame_index, output_slot, filter_seconds))
+        stats = {"cache_hits": bound_cache.hits, "cache_misses": bound_cache.misses} if bound_cache is not None else {}
+        results.put(("done", stats))
+    except Exception as e:
+        results.put(("error", str(e)))
+    finally:
+        input_ring.close()
+        output_ring.close()
+
+
+def upscale_and_enhance_video_shared_memory(input_path, output_path, scale_factor, sharpen_intensity, denoise_strength, num_processes, queue_size=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
+    # Decode in this process, filter in num_processes worker processes and encode here again.
+    # Frames live in two shared-memory rings, one for decoded and one for filtered frames, and only
+    # slot indices go through the queues: the decoder reads straight into a free input slot, a worker
+    # writes the filtered frame straight into an output slot and the encoder reads from that slot.
+    input_ring = output_ring = None
+    workers = []
+    frame_reader = None
+    out = None
+    try:
+        # Decoded on the read_frames thread straight into the input slots, so the reader does not prefetch
+        frame_reader = FrameReader(input_path, prefetch=0, decoder_options=decoder_options)
+        frame_width, frame_height = frame_reader.frame_size
+        new_width = int(frame_width * scale_factor)
+        new_height = int(frame_height * scale_factor)
+        fps = frame_reader.fps
+        total_frames = frame_reader.frame_count
+
+        if queue_size is None:
+            queue_size = max(DEFAULT_QUEUE_SIZE, 2 * num_processes)
+        # Every frame in flight holds at most one slot of each ring, so workers never wait for an output slot
+        # while the frame the encoder needs next is still queued
+        slot_count = queue_size + num_processes
+        input_ring = SharedFrameRing(slot_count, (frame_height, frame_width, 3))
+        output_ring = SharedFrameRing(slot_count, (new_height, new_width, 3))
+
+        context = multiprocessing.get_context()
+        tasks = context.Queue()
+        results = context.Queue()
+        free_input_slots = context.Queue()
+        free_output_slots = context.Queue()
+        for slot in range(slot_count):
+            free_input_slots.put(slot)
+            free_output_slots.put(slot)
+
+        filter_args = ((new_width, new_height), sharpen_intensity, resize_first, denoise_strength, denoise_mode)
+        cache_params = get_classic_cache_params(scale_factor, sharpen_intensity, denoise_strength, resize_first, denoise_mode)
+        for _ in range(num_processes):
+            worker = context.Process(target=shared_memory_worker, args=(tasks, results, input_ring, output_ring, free_input_slots, free_output_slots, filter_args, result_cache, cache_params))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        frames_in_flight = threading.Semaphore(slot_count)
+        stop_event = threading.Event()
+        errors = []
+
+        def read_frames():
+            frame_index = 0
+            try:
+                while not stop_event.is_set():
+                    if not frames_in_flight.acquire(timeout=0.1):
+                        continue
+                    input_slot = get_slot(free_input_slots, stop_event)
+                    if input_slot is None:
+                        break
+                    slot = input_ring.slot(input_slot)
+                    ret, frame = frame_reader.read(slot)
+                    if not ret:
+                        break
+                    if frame.shape != slot.shape:
+                        raise Exception(f"Frame {frame_index} does not match the video size {frame_width}x{frame_height}")
+                    tasks.put((frame_index, input_slot))
+                    frame_index += 1
+            except Exception as e:
+                if not isinstance(e, JobCancelled):
+                    METRICS.inc("bytecrush_errors_total", stage="decode")
+                errors.append(e)
+            finally:
+                for _ in workers:
+                    tasks.put(END_OF_STREAM)
+
+        reader = threading.Thread(target=in_job_context(read_frames))
+        reader.daemon = True
+        reader.start()
+
+        progress_bar = tqdm(total=total_frames, desc="Processing Frames", unit="frame")
+        start_time = time.perf_counter()
+        totals = collections.Counter()
+        pending_slots = {}
+        next_index = 0
+        finished_workers = 0
+        try:
+            out = open_encoder(output_path, fps, (new_width, new_height), encoder_options)
+            while finished_workers < len(workers):
+                try:
+                    message = results.get(timeout=1.0)
+                except queue.Empty:
+                    if any(worker.exitcode not in (None, 0) for worker in workers):
+                        raise Exception("A worker process exited unexpectedly")
+                    continue
+
+                if message[0] == "error":
+                    METRICS.inc("bytecrush_errors_total", stage="filter")
+                    raise Exception(message[1])
+                if message[0] == "done":
+                    totals.update(message[1])
+                    finished_workers += 1
+                    continue
+
+                _, frame_index, output_slot, filter_seconds = message
+                METRICS.observe_stage("filter", filter_seconds)
+                pending_slots[frame_index] = output_slot
+                METRICS.set_max("bytecrush_queue_depth_max", len(pending_slots), queue="reorder")
+
+                # Encode every frame that is now in sequence straight from its slot
+                while next_index in pending_slots:
+                    output_slot = pending_slots.pop(next_index)
+                    encode_start = time.perf_counter()
+                    out.write(output_ring.slot(output_slot))
+                    record_stage_time("encode", encode_start)
+                    free_output_slots.put(output_slot)
+                    frames_in_flight.release()
+                    next_index += 1
+                    progress_bar.update(1)
+        finally:
+            stop_event.set()
+            reader.join()
+            progress_bar.close()
+
+        if errors:
+            raise errors[0]
+
         out.release()
+        out = None
+        print_throughput(next_index, time.perf_counter() - start_time)
+        if result_cache is not None:
+            print_result_cache(totals["cache_hits"], totals["cache_misses"])
 
         print("Video upscaling and enhancement complete. Output saved as", output_path)
+        return True
 
     except Exception as e:
-        print("An error occurred:", str(e))
+        if not isinstance(e, JobCancelled):
+            print("An error occurred:", str(e))
+        # Do not leave a truncated video behind for the next step to pick up
+        if out is not None:
+            try:
+                out.release()
+            except Exception:
+                pass
+            out = None
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        if frame_reader is not None:
+            frame_reader.release()
+        if out is not None:
+            out.release()
+        for ring in (input_ring, output_ring):
+            if ring is not None:
+                ring.close()
+
+
+def get_job_id(input_path, output_path, params):
+    # Same input file, output and settings -> same job, so a rerun finds the previous working directory
+    stat = os.stat(input_path)
+    identity = [os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns, os.path.abspath(output_path), sorted(params.items())]
+    return hashlib.blake2b(repr(identity).encode(), digest_size=8).hexdigest()
+
+
+def get_job_dir(input_path, output_path, params, jobs_dir=DEFAULT_JOBS_DIR):
+    job_dir = os.path.join(jobs_dir, get_job_id(input_path, output_path, params))
+    os.makedirs(job_dir, exist_ok=True)
+    return job_dir
+
+
+def load_job_manifest(job_dir):
+    manifest_path = os.path.join(job_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print("Ignoring unreadable job manifest:", str(e))
+        return None
+
+
+def save_job_manifest(job_dir, manifest):
+    # Write to a temp file first so a crash never leaves a half-written manifest behind
+    manifest_path = os.path.join(job_dir, "manifest.json")
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+
+def create_job_manifest(input_path, output_path, params, total_frames, segment_frames):
+    segments = []
+    for index, (start_frame, end_frame) in enumerate(split_frame_range(total_frames, math.ceil(total_frames / segment_frames))):
+        segments.append({"index": index, "start": start_frame, "end": end_frame, "path": f"segment_{index:05d}{INTERMEDIATE_VIDEO_EXT}", "done": False})
+
+    # The frame count reported by the container can be short; the last segment runs to the end of the stream
+    if segments:
+        segments[-1]["end"] = None
+
+    return {"input_path": os.path.abspath(input_path), "output_path": os.path.abspath(output_path), "params": params, "total_frames": total_frames, "segments": segments}
+
+
+def run_resumable_job(input_path, output_path, scale_factor, sharpen_intensity, denoise_strength, outscale_value=2, realesrgan_options=None, num_processes=1, segment_frames=DEFAULT_SEGMENT_FRAMES, jobs_dir=DEFAULT_JOBS_DIR, reuse_threshold=None, result_cache=None, encoder_options=None, resize_first=False, denoise_mode=DEFAULT_DENOISE_MODE, decoder_options=None):
+    # Process the video in checkpointed segments inside a per-job working directory.
+    # Every finished segment is recorded in manifest.json; rerunning the same job skips them and
+    # picks up at the first unfinished segment. The working directory is removed only on success.
+    params = {"scale_factor": scale_factor, "sharpen_intensity": sharpen_intensity, "denoise_strength": denoise_strength, "outscale": float(outscale_value), "realesrgan_options": realesrgan_options, "segment_frames": segment_frames, "encoder_options": encoder_options, "resize_first": resize_first, "denoise_mode": denoise_mode}
+    job_dir = get_job_dir(input_path, output_path, {k: repr(v) for k, v in params.items()}, jobs_dir)
+
+    try:
+        manifest = load_job_manifest(job_dir)
+        if manifest is None:
+            cap = cv2.VideoCapture(input_path)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+            if total_frames <= 0:
+                raise Exception(f"Could not read the frame count of {input_path}")
+
+            manifest = create_job_manifest(input_path, output_path, params, total_frames, segment_frames)
+            save_job_manifest(job_dir, manifest)
+
+        # A segment only counts as done if its file survived
+        for segment in manifest["segments"]:
+            if segment["done"] and not os.path.exists(os.path.join(job_dir, segment["path"])):
+                segment["done"] = False
+        pending = [segment for segment in manifest["segments"] if not segment["done"]]
+        if len(pending) < len(manifest["segments"]):
+            print(f"Resuming job in {job_dir}: {len(manifest['segments']) - len(pending)} of {len(manifest['segments'])} segments already done")
+
+        def segment_args(segment):
+            end_frame = segment["end"] if segment["end"] is not None else sys.maxsize
+            return (input_path, os.path.join(job_dir, segment["path"]), segment["start"], end_frame, scale_factor, sharpen_intensity, denoise_strength, outscale_value, realesrgan_options, reuse_threshold, result_cache, encoder_options, resize_first, denoise_mode, decoder_options)
+
+        # Frames processed by this run, for the throughput report
+        totals = collections.Counter()
+
+        def mark_done(segment, stats):
+            METRICS.merge(stats.pop("metrics"))
+            segment["done"] = True
+            segment["frames"] = stats["frames"]
+            save_job_manifest(job_dir, manifest)
+            progress_bar.update(stats["frames"])
+            totals.update(stats)
+
+        progress_bar = tqdm(total=manifest["total_frames"], desc="Processing Segments", unit="frame")
+        progress_bar.update(sum(segment.get("frames", 0) for segment in manifest["segments"] if segment["done"]))
+        process_start = time.perf_counter()
+        try:
+            if num_processes > 1:
+                executor, cancel_event = create_segment_executor(num_processes)
+                with executor:
+                    futures = {executor.submit(process_video_segment, *segment_args(segment)): segment for segment in pending}
+                    try:
+                        for future in as_completed_or_cancelled(futures, cancel_event):
+                            mark_done(futures[future], future.result())
+                    except BaseException:
+                        # The segments finished so far stay checkpointed for the next run
+                        stop_segments(executor, cancel_event)
+                        raise
+            else:
+                # In-process, so the Real-ESRGAN model stays warm across segments
+                for segment in pending:
+                    mark_done(segment, process_video_segment(*segment_args(segment)))
+        finally:
+            progress_bar.close()
+        print_throughput(totals["frames"], time.perf_counter() - process_start)
+
+        # Join the segments without re-encoding, then add the audio
+        segment_paths = [os.path.join(job_dir, segment["path"]) for segment in manifest["segments"] if segment.get("frames")]
+        temp_video_path = os.path.join(job_dir, "temp_video" + INTERMEDIATE_VIDEO_EXT)
+        concat_video_segments(segment_paths, temp_video_path)
+        # add_audio_to_video reports its own errors
+        if not add_audio_to_video(input_path, temp_video_path, output_path):
+            raise Exception("The output video was not written")
+
+        shutil.rmtree(job_dir, ignore_errors=True)
+        print("Resumable job complete. Output saved as", output_path)
+        return True
+
+    except Exception as e:
+        print(str(e) if isinstance(e, JobCancelled) else "An error occurred: " + str(e))
+        print("Progress is kept in", job_dir, "- run the same job again to resume.")
+        return False
+
+
+def mux_audio(input_video_path, temp_video_path, output_video_path):
+    # Copy the processed video stream as is and take the audio track from the input.
+    # The audio is stream-copied too when the output container accepts it, otherwise it is
+    # transcoded to AAC. Inputs without audio just get their video copied.
+    base_cmd = [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", temp_video_path, "-i", input_video_path, "-map", "0:v:0", "-map", "1:a?", "-c:v", "copy"]
+    if output_video_path.lower().endswith((".mp4", ".m4v", ".mov")):
+        base_cmd += ["-movflags", "+faststart"]
+
+    # Recorded once per video, not per frame
+    mux_start = time.perf_counter()
+    try:
+        subprocess.run(base_cmd + ["-c:a", "copy", output_video_path], check=True, capture_output=True)
+    except subprocess.CalledProcessError:
+        subprocess.run(base_cmd + ["-c:a", "aac", output_video_path], check=True, capture_output=True)
+    record_stage_time("mux", mux_start)
 
 
-def add_audio_to_video(input_video_path, temp_video_path, output_video_path):
+def add_audio_to_video(input_video_path, temp_video_path, output_video_path, reencode=False):
     try:
+        if not reencode:
+            # Mux without touching the video frames, so the upscaled video is only encoded once
+            mux_audio(input_video_path, temp_video_path, output_video_path)
+
+            print("Audio added to the video. Output saved as", output_video_path)
+            return True
+
+        # moviepy is slow to import, so it is only loaded for this fallback
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+
         # Load the processed video without audio using moviepy
         video_clip = VideoFileClip(temp_video_path)
 
@@ -413,163 +3043,910 @@ def add_audio_to_video(input_video_path, temp_video_path, output_video_path):
         # Set the audio of the video clip to the loaded audio clip
         video_clip = video_clip.set_audio(audio_clip)
 
-        # Write the final video with audio
+        # Write the final video with audio, re-encoding every frame with libx264
         video_clip.write_videofile(output_video_path, codec='libx264')
 
         print("Audio added to the video. Output saved as", output_video_path)
+        return True
 
+    except subprocess.CalledProcessError as e:
+        print("An error occurred while muxing audio:", (e.stderr or b"").decode(errors="replace").strip())
     except Exception as e:
         print("An error occurred:", str(e))
+    return False
 
-def update_preview():
-    try:
-        cap = cv2.VideoCapture(input_path_var.get())
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            # Apply the selected effects to the frame (same as in upscale_and_enhance_video)
-            frame = cv2.resize(frame, (400, 300))
-            if sharpen_intensity_scale.get() > 0:
-                kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]], dtype=np.float32)
-                frame = cv2.filter2D(frame, -1, kernel)
-            if denoise_strength_scale.get() > 0:
-                frame = cv2.fastNlMeansDenoisingColored(frame, None, denoise_strength_scale.get(), 10, 7, 21)
-           
-            # Convert the frame to RGB for displaying in Tkinter
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            photo = ImageTk.PhotoImage(image=Image.fromarray(frame_rgb))
-            preview_label.config(image=photo)
-            preview_label.photo = photo
-            preview_label.update()
-    except Exception as e:
-        print("An error occurred during preview:", str(e))
 
-def start_preview():
-    # Start a thread for the video preview
-    preview_thread = threading.Thread(target=update_preview)
-    preview_thread.daemon = True
-    preview_thread.start()
+# Size of the preview frames and the most frames a preview proxy keeps
+PREVIEW_SIZE = (400, 300)
+PREVIEW_MAX_FRAMES = 300
+# How often the Tk main loop picks up a new preview frame (ms)
+PREVIEW_POLL_INTERVAL = 15
+# Number of preview proxies kept in memory
+PREVIEW_PROXY_CACHE_SIZE = 4
 
-# Create the main GUI window
-root = tk.Tk()
-root.title("Bytecrush - Video Upscaler and Enhancer")
-# fixed issue with platform dependency
-if platform.system() == 'Windows':
-    # Your Windows-specific code here
-    root.iconbitmap('favicon.ico')
+preview_proxies = collections.OrderedDict()
+preview_proxies_lock = threading.Lock()
+preview_player = None
 
-style = ttk.Style()
 
-# Set the theme to "clam" or any other built-in theme
-style.theme_use("clam")  # You can change "clam" to other available themes
+def get_preview_proxy(input_path, size=PREVIEW_SIZE, max_frames=PREVIEW_MAX_FRAMES):
+    # A downscaled copy of at most max_frames evenly spaced frames of the video and its frame rate.
+    # It is decoded once per file and kept in memory, so previewing again only runs the filters.
+    key = (os.path.abspath(input_path), os.path.getmtime(input_path), size, max_frames)
+    with preview_proxies_lock:
+        if key in preview_proxies:
+            preview_proxies.move_to_end(key)
+            return preview_proxies[key]
 
+    # The reader grabs or seeks over the frames that are not sampled
+    stride = max(1, math.ceil(get_video_frame_count(input_path) / max_frames))
+    reader = FrameReader(input_path, stride=stride, prefetch=0)
 
+    try:
+        frames = [cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in reader]
+    finally:
+        reader.release()
+
+    proxy = (frames, reader.fps / stride)
+    with preview_proxies_lock:
+        preview_proxies[key] = proxy
+        while len(preview_proxies) > PREVIEW_PROXY_CACHE_SIZE:
+            preview_proxies.popitem(last=False)
+    return proxy
+
+
+class PreviewPlayer:
+    # Plays the preview proxy of a video in real time with the current filter settings.
+    # A render thread filters only the frame that is due at the current time, dropping the frames
+    # it cannot keep up with, and hands it over through a one-slot queue. The Tk main loop polls
+    # that queue with after() and is the only thread that touches widgets and Tk variables.
+
+    def __init__(self, root, label, input_path, get_filter_settings):
+        self.root = root
+        self.label = label
+        self.input_path = input_path
+        self.get_filter_settings = get_filter_settings
+        self.filter_settings = get_filter_settings()
+        self.rendered_frames = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        self.finished = False
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        threading.Thread(target=self.render, daemon=True).start()
+        self.root.after(PREVIEW_POLL_INTERVAL, self.poll)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def render(self):
+        try:
+            frames, fps = get_preview_proxy(self.input_path)
+            filter_chain = None
+            filter_chain_settings = None
+            last_index = -1
+            start_time = time.perf_counter()
+            while not self.stop_event.is_set():
+                frame_index = int((time.perf_counter() - start_time) * fps)
+                if frame_index >= len(frames):
+                    break
+                if frame_index == last_index:
+                    # Ahead of schedule: wait for the next frame to be due
+                    time.sleep(max(0, (frame_index + 1) / fps - (time.perf_counter() - start_time)))
+                    continue
+
+                # The filter chain is only rebuilt when a slider or the denoise mode changes
+                filter_settings = self.filter_settings
+                if filter_chain is None or filter_settings != filter_chain_settings:
+                    sharpen_intensity, denoise_strength, denoise_mode = filter_settings
+                    filter_chain = FilterChain(PREVIEW_SIZE, sharpen_intensity, True, denoise_strength, denoise_mode)
+                    filter_chain_settings = filter_settings
+                frame_rgb = cv2.cvtColor(filter_chain.apply(frames[frame_index]), cv2.COLOR_BGR2RGB)
+
+                # Replace a frame the main loop has not picked up yet
+                try:
+                    self.rendered_frames.get_nowait()
+                except queue.Empty:
+                    pass
+                self.rendered_frames.put(frame_rgb)
+
+                self.frames_dropped += frame_index - last_index - 1
+                self.frames_shown += 1
+                last_index = frame_index
+        except Exception as e:
+            print("An error occurred during preview:", str(e))
+        finally:
+            self.finished = True
+
+    def poll(self):
+        # Runs on the Tk main loop
+        if self.stop_event.is_set():
+            return
+        self.filter_settings = self.get_filter_settings()
+        try:
+            frame_rgb = self.rendered_frames.get_nowait()
+        except queue.Empty:
+            frame_rgb = None
+        if frame_rgb is not None:
+            from PIL import Image, ImageTk
+            photo = ImageTk.PhotoImage(image=Image.fromarray(frame_rgb))
+            self.label.config(image=photo)
+            self.label.photo = photo
+        if not self.finished or not self.rendered_frames.empty():
+            self.root.after(PREVIEW_POLL_INTERVAL, self.poll)
 
-        
-
-try:
-    # Set dark mode theme
-    root.tk_setPalette(background='#FFFFFF', foreground='#1e1e1e')
 
-    # Set larger window size
-    root.geometry("800x600")
+def get_preview_filter_settings():
+    return (sharpen_intensity_scale.get(), denoise_strength_scale.get(), denoise_mode_var.get())
 
-    # Load the background image
-    bg_image = PhotoImage(file="background.png")  # Replace "background.png" with your image file
 
-    # Create a Label widget to display the background image
-    background_label = tk.Label(root, image=bg_image)
-    background_label.place(relwidth=1, relheight=1)
+def start_preview():
+    # Restart the preview; the proxy of a video that was previewed before is reused
+    global preview_player
+    if preview_player is not None:
+        preview_player.stop()
+    preview_player = PreviewPlayer(root, preview_label, input_path_var.get(), get_preview_filter_settings)
+    preview_player.start()
+
+# Video files picked up when a directory is given to the headless runner
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.avi', '.webm', '.m4v')
+
+
+def find_input_videos(path):
+    # A directory expands to the video files directly inside it
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(VIDEO_EXTENSIONS))
+    return [path]
+
+
+def load_job_list(manifest_path):
+    # A job list is either a JSON list of objects with "input", optional "output" and per-job option
+    # overrides, or a text file with one input path per line
+    with open(manifest_path) as f:
+        text = f.read()
+    if manifest_path.lower().endswith(".json"):
+        jobs = json.loads(text)
+    else:
+        jobs = [{"input": line.strip()} for line in text.splitlines() if line.strip() and not line.startswith("#")]
+
+    # Relative paths are relative to the manifest
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for job in jobs:
+        for key in ("input", "output"):
+            if job.get(key):
+                job[key] = os.path.join(base_dir, job[key])
+    return jobs
+
+
+def get_default_output_path(input_path, output_dir, suffix):
+    name, _ = os.path.splitext(os.path.basename(input_path))
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(input_path)), f"{name}_{suffix}.mp4")
+
+
+def build_job_options(args, overrides):
+    # Per-job overrides from a JSON manifest take precedence over the command line
+    options = {
+        "scale_factor": args.scale,
+        "sharpen_intensity": args.sharpen,
+        "denoise_strength": args.denoise,
+        "outscale_value": args.outscale,
+        "use_streaming": not args.no_stream,
+        "num_threads": args.threads,
+        "num_processes": args.processes,
+        "resumable": args.resumable,
+        "reuse_threshold": args.reuse_threshold,
+        "jobs_dir": args.jobs_dir,
+        "resize_first": args.sharpen_after_resize,
+        "denoise_mode": args.denoise_mode,
+        "use_shared_memory": args.shared_memory,
+        "spill_format": args.spill_format,
+        "decoder_options": {"threads": args.decoder_threads, "hw_accel": args.hw_decode},
+        # The budget is shared by the jobs that run at the same time
+        "memory_budget": args.memory_budget / args.concurrency if args.memory_budget else None,
+        "encoder_options": get_encoder_options(args.encoder, codec=args.codec, preset=args.encoder_preset, crf=args.crf, threads=args.encoder_threads),
+    }
+    model_name = overrides.pop("model_name", args.model)
+    use_realesrgan = overrides.pop("realesrgan", args.realesrgan)
+    crop_borders = overrides.pop("crop_borders", args.crop_borders)
+    roi = overrides.pop("roi", args.roi)
+    torch_threads = overrides.pop("torch_threads", args.torch_threads)
+    options.update(overrides)
+
+    options["realesrgan_options"] = None
+    if use_realesrgan:
+        options["realesrgan_options"] = {"model_name": model_name}
+        if args.batch_size > 1:
+            options["realesrgan_options"]["batch_size"] = args.batch_size
+        if torch_threads:
+            options["realesrgan_options"]["num_threads"] = torch_threads
+        if model_name == AUTO_MODEL:
+            options["realesrgan_options"]["target_fps"] = args.target_fps
+            options["realesrgan_options"]["max_model_cost"] = args.max_model_cost
+        if crop_borders:
+            options["realesrgan_options"]["crop_borders"] = True
+        if roi:
+            options["realesrgan_options"]["roi"] = list(roi)
+    return options
+
+
+def run_jobs(args):
+    # Collect every input, then run the jobs over a pool of at most args.concurrency workers
+    jobs = []
+    for path in args.inputs:
+        jobs.extend({"input": input_path} for input_path in find_input_videos(path))
+    if args.manifest:
+        jobs.extend(load_job_list(args.manifest))
+
+    if not jobs:
+        print("No input videos found.")
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    # One cache instance is shared by every job in the queue
+    result_cache = ResultCache(args.cache_dir) if args.cache else None
+
+    def run_job(job):
+        job = dict(job)
+        input_path = job.pop("input")
+        output_path = job.pop("output", None) or get_default_output_path(input_path, args.output_dir, args.suffix)
+        options = build_job_options(args, job)
+        print("Starting job:", input_path, "->", output_path)
+        return process_video(input_path, output_path, result_cache=result_cache, **options)
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(run_job, job): job["input"] for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                print("An error occurred:", str(e))
+                succeeded = False
+            if not succeeded:
+                failed.append(futures[future])
+
+    print(f"{len(jobs) - len(failed)} of {len(jobs)} jobs completed.")
+    for input_path in failed:
+        print("Failed:", input_path)
+    return 1 if failed else 0
+
+
+# Job server defaults: where job state and logs are kept, and the local port the API listens on
+DEFAULT_SERVER_DIR = os.path.join(os.path.expanduser("~"), ".cache", "bytecrush", "server")
+DEFAULT_SERVER_PORT = 8765
+# How often a followed job log checks for new lines, in seconds
+LOG_POLL_INTERVAL = 0.25
+
+# A job that has not finished yet
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+class JobOutputRouter:
+    # Stand-in for sys.stdout/sys.stderr that sends what a job's threads print to the job's log
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        context = get_job_context()
+        if context is not None and context.log is not None:
+            context.log.write(text)
+            return len(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ServerJob(JobLog):
+    # One job of the job server. Its state is saved to <state_dir>/<id>.json and every line it
+    # prints to <state_dir>/<id>.log, so the jobs outlive the server process.
+    def __init__(self, state_dir, spec, job_id=None):
+        super().__init__()
+        self.state_dir = state_dir
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.lines = []
+        # The first error the job printed in this run; the ones after it tend to follow from it
+        self.first_error = None
+
+    @property
+    def state_path(self):
+        return os.path.join(self.state_dir, f"{self.id}.json")
+
+    @property
+    def log_path(self):
+        return os.path.join(self.state_dir, f"{self.id}.log")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "log_lines": len(self.lines),
+            **self.spec,
+        }
 
-    # Buttons and forms on the left
-    form_frame = tk.Frame(root)
-    form_frame.pack(side="left", padx=20, pady=10)
+    def save(self):
+        # Write to a temp file first so a crash never leaves half-written job state behind
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    @classmethod
+    def load(cls, state_dir, job_id):
+        with open(os.path.join(state_dir, f"{job_id}.json")) as f:
+            state = json.load(f)
+        spec = {key: value for key, value in state.items() if key not in ("id", "status", "progress", "error", "created", "started", "finished", "log_lines")}
+        job = cls(state_dir, spec, job_id)
+        for key in ("status", "progress", "error", "created", "started", "finished"):
+            setattr(job, key, state[key])
+        if os.path.exists(job.log_path):
+            with open(job.log_path) as f:
+                job.lines = f.read().splitlines()
+        return job
+
+    def add_line(self, line):
+        self.lines.append(line)
+        if self.first_error is None and line.startswith(("An error occurred", "ValueError:")):
+            self.first_error = line
+        with open(self.log_path, "a") as f:
+            f.write(line + "\n")
+
+
+class JobServer:
+    # Runs submitted jobs in this process over a pool of at most args.concurrency workers, so the
+    # jobs share one result cache and the RealESRGAN models loaded by the first of them.
+    # Jobs are controlled through a small JSON API:
+    #   GET /jobs                  list the jobs
+    #   POST /jobs                 submit a job: {"input": ..., "output": ..., <manifest options>}
+    #   GET /jobs/<id>             status and progress of a job
+    #   POST /jobs/<id>/cancel     cancel a job (DELETE /jobs/<id> does the same)
+    #   GET /jobs/<id>/log         the job's output, followed until the job ends (?follow=0 to not wait)
+    #   GET /metrics               Prometheus metrics
+    def __init__(self, args):
+        self.args = args
+        self.state_dir = args.state_dir
+        os.makedirs(self.state_dir, exist_ok=True)
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        self.jobs = {}
+        self.stopping = False
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency)
+        self.result_cache = ResultCache(args.cache_dir) if args.cache else None
+        # A job may override the same options as a manifest entry
+        self.option_keys = (set(build_job_options(args, {})) - {"realesrgan_options"}) | {"model_name", "realesrgan", "crop_borders", "roi", "torch_threads"}
+
+    def load_jobs(self):
+        # Jobs that had not finished when the server stopped are queued again
+        names = sorted(name for name in os.listdir(self.state_dir) if name.endswith(".json"))
+        jobs = []
+        for name in names:
+            try:
+                jobs.append(ServerJob.load(self.state_dir, name[:-len(".json")]))
+            except Exception as e:
+                print("An error occurred while loading job", name, ":", str(e))
+        for job in sorted(jobs, key=lambda job: job.created):
+            self.jobs[job.id] = job
+            if job.status in ACTIVE_JOB_STATUSES or job.status == "interrupted":
+                job.status = "queued"
+                job.save()
+                self.executor.submit(self.run_job, job)
+
+    def submit(self, spec):
+        if not isinstance(spec, dict) or not isinstance(spec.get("input"), str):
+            raise ValueError("A job needs an input video")
+        if not os.path.isfile(spec["input"]):
+            raise ValueError(f"Input video not found: {spec['input']}")
+        unknown = set(spec) - {"input", "output"} - self.option_keys
+        if unknown:
+            raise ValueError("Unknown job options: " + ", ".join(sorted(unknown)))
+
+        spec = dict(spec)
+        spec["input"] = os.path.abspath(spec["input"])
+        spec["output"] = os.path.abspath(spec.get("output") or get_default_output_path(spec["input"], self.args.output_dir, self.args.suffix))
+        job = ServerJob(self.state_dir, spec)
+        job.save()
+        self.jobs[job.id] = job
+        self.executor.submit(self.run_job, job)
+        return job
+
+    def cancel(self, job):
+        with job.lock:
+            if job.status not in ACTIVE_JOB_STATUSES:
+                return False
+            job.cancel_event.set()
+            # A running job notices the event between frames and finishes as cancelled itself
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.time()
+        job.save()
+        return True
+
+    def run_job(self, job):
+        with job.lock:
+            if job.status != "queued":
+                return
+            job.status = "running"
+            job.started = time.time()
+        job.save()
+
+        # Everything the job's threads print goes to the job's log
+        set_job_context(JobContext(job.cancel_event, job))
+        try:
+            overrides = dict(job.spec)
+            input_path = overrides.pop("input")
+            output_path = overrides.pop("output")
+            options = build_job_options(self.args, overrides)
+            print("Starting job:", input_path, "->", output_path)
+            succeeded = process_video(input_path, output_path, result_cache=self.result_cache, **options)
+        except Exception as e:
+            print("An error occurred:", str(e))
+            succeeded = False
+        finally:
+            set_job_context(None)
+
+        with job.lock:
+            if job.cancel_event.is_set():
+                job.status = "interrupted" if self.stopping else "cancelled"
+            elif succeeded:
+                job.status = "succeeded"
+            else:
+                job.status = "failed"
+                job.error = job.first_error or (job.lines[-1] if job.lines else None)
+            job.finished = time.time()
+        job.save()
+        print(f"Job {job.id} {job.status}: {job.spec['input']}")
+
+    def stop(self):
+        # Running jobs are interrupted and queued again the next time the server starts
+        self.stopping = True
+        for job in list(self.jobs.values()):
+            if job.status == "running":
+                job.cancel_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def serve(self):
+        self.load_jobs()
+        if self.args.socket:
+            server = await asyncio.start_unix_server(self.handle_connection, path=self.args.socket)
+            address = self.args.socket
+        else:
+            server = await asyncio.start_server(self.handle_connection, self.args.host, self.args.port)
+            address = f"http://{self.args.host}:{self.args.port}"
+        print("Job server listening on", address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop()
+
+    async def handle_connection(self, reader, writer):
+        # One request per connection: read the request line, the headers and the body
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0], request_line[1]
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length") or 0))
+            await self.handle_request(writer, method, target, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print("An error occurred in the job server:", str(e))
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, method, target, body):
+        path, _, query = target.partition("?")
+        query = urllib.parse.parse_qs(query)
+        parts = [part for part in path.split("/") if part]
+
+        if parts == ["metrics"] and method == "GET":
+            await self.send_response(writer, 200, METRICS.render_prometheus().encode(), "text/plain; version=0.0.4")
+            return
+        if not parts or parts[0] != "jobs" or len(parts) > 3:
+            await self.send_json(writer, 404, {"error": "Not found"})
+            return
+
+        if len(parts) == 1:
+            if method == "GET":
+                await self.send_json(writer, 200, [job.to_dict() for job in self.jobs.values()])
+            elif method == "POST":
+                try:
+                    job = self.submit(json.loads(body or b"null"))
+                except ValueError as e:
+                    await self.send_json(writer, 400, {"error": str(e)})
+                    return
+                await self.send_json(writer, 201, job.to_dict())
+            else:
+                await self.send_json(writer, 405, {"error": "Method not allowed"})
+            return
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            await self.send_json(writer, 404, {"error": f"No job {parts[1]}"})
+            return
+        action = parts[2] if len(parts) == 3 else None
+        if action not in (None, "cancel", "log"):
+            await self.send_json(writer, 404, {"error": "Not found"})
+        elif action is None and method == "GET":
+            await self.send_json(writer, 200, job.to_dict())
+        elif (action is None and method == "DELETE") or (action == "cancel" and method == "POST"):
+            if not self.cancel(job):
+                await self.send_json(writer, 409, {"error": f"Job {job.id} is already {job.status}"})
+                return
+            await self.send_json(writer, 202, job.to_dict())
+        elif action == "log" and method == "GET":
+            await self.stream_log(writer, job, query.get("follow", ["1"])[0] != "0")
+        else:
+            await self.send_json(writer, 405, {"error": "Method not allowed"})
 
- 
+    async def send_response(self, writer, status, body, content_type):
+        status = http.HTTPStatus(status)
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
 
-    # Create a Label widget for the video preview
-    preview_label = tk.Label(form_frame)
-    preview_label.pack(side="right", padx=20, pady=10)
+    async def send_json(self, writer, status, data):
+        await self.send_response(writer, status, json.dumps(data).encode(), "application/json")
 
+    async def stream_log(self, writer, job, follow):
+        # Send the lines logged so far, then keep sending new ones until the job ends
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            finished = job.status not in ACTIVE_JOB_STATUSES
+            lines = job.lines[sent:]
+            sent += len(lines)
+            if lines:
+                writer.write("".join(line + "\n" for line in lines).encode())
+                await writer.drain()
+            if finished or not follow:
+                return
+            await asyncio.sleep(LOG_POLL_INTERVAL)
+
+
+def serve_jobs(args):
+    server = JobServer(args)
+    if args.realesrgan and args.model != AUTO_MODEL:
+        warm_realesrgan_model(args.model)
+
+    # Route what each job prints to that job's log; the rest still goes to the console
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = JobOutputRouter(stdout), JobOutputRouter(stderr)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    return 0
 
-   
-    # Input video path File Dialog button
-    input_path_label = tk.Label(form_frame, text="Select Input Video:", fg='#1e1e1e', bg='white')
-    input_path_label.pack()
-    input_path_var = tk.StringVar()
-    input_path_entry = tk.Entry(form_frame, textvariable=input_path_var, state='readonly')
-    input_path_entry.pack()
 
-    def browse_input_path():
-        file_path = filedialog.askopenfilename(title="Select Input Video File", filetypes=[("Video Files", "*.mp4")])
-        if file_path:
-            input_path_var.set(file_path)
+def parse_roi(value):
+    try:
+        roi = [int(part) for part in value.split(",")]
+    except ValueError:
+        roi = []
+    if len(roi) != 4 or roi[2] <= 0 or roi[3] <= 0:
+        raise argparse.ArgumentTypeError(f"expected X,Y,WIDTH,HEIGHT in pixels, got {value!r}")
+    return roi
+
+
+def add_job_arguments(parser):
+    # Options shared by the run and serve commands
+    parser.add_argument("-o", "--output-dir", help="Output directory (default: next to each input)")
+    parser.add_argument("--suffix", default="upscaled", help="Suffix for generated output file names")
+    parser.add_argument("-j", "--concurrency", type=int, default=1, help="Number of videos processed at the same time")
+    parser.add_argument("-s", "--scale", type=float, default=2.0, help="Scale factor when RealESRGAN is disabled")
+    parser.add_argument("--sharpen", type=float, default=0, help=f"Sharpening intensity ({FULL_SHARPEN_INTENSITY:g} = classic 3x3 sharpen kernel)")
+    parser.add_argument("--sharpen-after-resize", action="store_true", help="Sharpen at the output resolution (cleaner for large scale factors, slower)")
+    parser.add_argument("--denoise", type=float, default=0, help="Denoise strength")
+    parser.add_argument("--denoise-mode", choices=sorted(DENOISE_MODES), default=DEFAULT_DENOISE_MODE, help="Denoise speed/quality trade-off")
+    parser.add_argument("--realesrgan", action="store_true", help="Upscale with RealESRGAN")
+    parser.add_argument("-n", "--model", default=DEFAULT_REALESRGAN_MODEL, help=f"RealESRGAN model name, or '{AUTO_MODEL}' to pick a model per shot")
+    parser.add_argument("--target-fps", type=float, help=f"With --model {AUTO_MODEL}: frame rate the per-shot models must keep up")
+    parser.add_argument("--max-model-cost", type=float, default=DEFAULT_SHOT_MAX_COST, help=f"With --model {AUTO_MODEL} and no target frame rate: most expensive model allowed, relative to realesr-general-x4v3")
+    parser.add_argument("--outscale", type=float, default=2, help="RealESRGAN output scale")
+    parser.add_argument("-b", "--batch-size", type=int, default=1, help="RealESRGAN frames per forward pass")
+    parser.add_argument("--torch-threads", type=int, help="Threads of the torch CPU backend used by RealESRGAN (default: torch's own choice)")
+    parser.add_argument("--crop-borders", action="store_true", help="With RealESRGAN: only upscale the picture inside letterbox/pillarbox bars and redraw the bars at the output size (the classic filters process whole frames)")
+    parser.add_argument("--roi", type=parse_roi, metavar="X,Y,W,H", help="With RealESRGAN: only upscale this region with the model; the rest of the frame is resized")
+    parser.add_argument("--no-stream", action="store_true", help="Go through temp images instead of streaming frames")
+    parser.add_argument("--spill-format", choices=SPILL_FORMATS, default=DEFAULT_SPILL_FORMAT, help="With --no-stream: temp frame format (raw is faster, png uses less disk)")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="Worker threads per job")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="Worker processes per job (splits the video into segments)")
+    parser.add_argument("--shared-memory", action="store_true", help="With --processes: stream frames to the worker processes through shared memory instead of splitting the video into segments")
+    parser.add_argument("--memory-budget", type=float, help="Memory for all running jobs in MB; sizes queues, worker counts and RealESRGAN tiles to fit")
+    parser.add_argument("--resumable", action="store_true", help="Checkpoint segments so a failed job can be resumed")
+    parser.add_argument("--reuse-threshold", type=float, default=None, help="Reuse the output of frames within this mean pixel difference of a recent frame")
+    parser.add_argument("--cache", action="store_true", help="Cache enhanced frames on disk across runs")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Result cache directory")
+    parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR, help="Directory for per-job temporary files")
+    parser.add_argument("-e", "--encoder", choices=sorted(ENCODER_PRESETS), default=DEFAULT_ENCODER_PRESET, help="Encoder settings preset")
+    parser.add_argument("--codec", help="ffmpeg video codec, e.g. libx264, libx265, libvpx-vp9")
+    parser.add_argument("--encoder-preset", help="ffmpeg encoder speed preset, e.g. ultrafast, veryfast, slow")
+    parser.add_argument("--crf", type=int, help="ffmpeg constant rate factor; lower is higher quality")
+    parser.add_argument("--decoder-threads", type=int, default=0, help="FFmpeg decoder threads (0 = OpenCV default)")
+    parser.add_argument("--hw-decode", action="store_true", help="Decode with hardware acceleration when available")
+    parser.add_argument("--encoder-threads", type=int, help="ffmpeg encoder threads (0 = automatic)")
+    parser.add_argument("--metrics-log", help="Append a JSON line with per-stage metrics to this file after every job")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bytecrush", description="Bytecrush - Video Upscaler and Enhancer")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("gui", help="Open the GUI (default)")
+
+    run_parser = subparsers.add_parser("run", help="Upscale videos without a display")
+    run_parser.add_argument("inputs", nargs="*", help="Input videos or directories of videos")
+    run_parser.add_argument("-m", "--manifest", help="Job list: JSON list of {input, output, ...} or a text file with one input per line")
+    add_job_arguments(run_parser)
+    run_parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port while the jobs run")
+
+    serve_parser = subparsers.add_parser("serve", help="Run a job server with a local HTTP API")
+    add_job_arguments(serve_parser)
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address the API listens on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT, help="Port the API listens on")
+    serve_parser.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    serve_parser.add_argument("--state-dir", default=DEFAULT_SERVER_DIR, help="Directory for job state and logs")
+
+    args = parser.parse_args(argv)
+
+    if args.command in ("run", "serve") and args.metrics_log:
+        set_metrics_log(args.metrics_log)
+
+    if args.command == "serve":
+        return serve_jobs(args)
+
+    if args.command == "run":
+        if args.metrics_port:
+            start_metrics_server(args.metrics_port)
+            print(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+        return run_jobs(args)
+
+    run_gui()
+    return 0
+
+
+def run_gui():
+    # Build the Tk window and run its main loop; nothing is created until this is called
+    global root, preview_label, input_path_var, output_path_var, scale_factor_entry, torch_threads_entry
+    global sharpen_intensity_scale, denoise_strength_scale, denoise_mode_var, realesrgan_checkbox, shot_model_checkbox, crop_borders_checkbox, streaming_checkbox
+    global multithreading_checkbox, multiprocessing_checkbox, resumable_checkbox, reuse_checkbox, result_cache_checkbox
+    global upscale_button, cancel_button, progress_var, status_var
+
+    # The GUI modules are only loaded when the window is opened
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import ttk
+    from tkinter import PhotoImage
+
+    # Create the main GUI window
+    root = tk.Tk()
+    root.title("Bytecrush - Video Upscaler and Enhancer")
+    # fixed issue with platform dependency
+    if platform.system() == 'Windows':
+        # Your Windows-specific code here
+        root.iconbitmap('favicon.ico')
+
+    style = ttk.Style()
+
+    # Set the theme to "clam" or any other built-in theme
+    style.theme_use("clam")  # You can change "clam" to other available themes
 
-    input_browse_button = tk.Button(form_frame, text="Browse", command=browse_input_path)
-    input_browse_button.pack()
 
-    # Output video path File Dialog button
-    output_path_label = tk.Label(form_frame, text="Select Output Video:", fg='#1e1e1e', bg='white')
-    output_path_label.pack()
-    output_path_var = tk.StringVar()
-    output_path_entry = tk.Entry(form_frame, textvariable=output_path_var, state='readonly')
-    output_path_entry.pack()
 
-    def browse_output_path():
-        file_path = filedialog.asksaveasfilename(title="Save Output Video As", filetypes=[("Video Files", "*.mp4")])
-        if file_path:
-            output_path_var.set(file_path)
 
-    output_browse_button = tk.Button(form_frame, text="Browse", command=browse_output_path)
-    output_browse_button.pack()
 
-    # Scale factor label and entry
-    scale_factor_label = tk.Label(form_frame, text="Scale Factor:", fg='#1e1e1e', bg='white')
-    scale_factor_label.pack()
-    scale_factor_entry = tk.Entry(form_frame)
-    scale_factor_entry.pack()
+    try:
+        # Set dark mode theme
+        root.tk_setPalette(background='#FFFFFF', foreground='#1e1e1e')
 
-    # Sharpening intensity slider
-    sharpen_intensity_label = tk.Label(form_frame, text="Sharpening Intensity", fg='#1e1e1e', bg='white')
-    sharpen_intensity_label.pack(anchor="w")
-    sharpen_intensity_scale = ttk.Scale(form_frame, from_=0, to=10, orient="horizontal")
-    sharpen_intensity_scale.set(0)  # Default value
-    sharpen_intensity_scale.pack(fill="x")
+        # Set larger window size
+        root.geometry("800x600")
 
-    # Denoise strength slider
-    denoise_strength_label = tk.Label(form_frame, text="Denoise Strength", fg='#1e1e1e', bg='white')
-    denoise_strength_label.pack(anchor="w")
-    denoise_strength_scale = ttk.Scale(form_frame, from_=0, to=10, orient="horizontal")
-    denoise_strength_scale.set(0)  # Default value
-    denoise_strength_scale.pack(fill="x")
+        # Load the background image
+        bg_image = PhotoImage(file="background.png")  # Replace "background.png" with your image file
 
-   
+        # Create a Label widget to display the background image
+        background_label = tk.Label(root, image=bg_image)
+        background_label.place(relwidth=1, relheight=1)
 
-    # Upscale button
-    upscale_button = tk.Button(form_frame, text="Upscale and Enhance Video", command=upscale_button_click)
-    upscale_button.pack()
+        # Buttons and forms on the left
+        form_frame = tk.Frame(root)
+        form_frame.pack(side="left", padx=20, pady=10)
 
-    #checkbox for esrgan
-    realesrgan_checkbox = tk.BooleanVar()
-    realesrgan_checkbox.set(False)  # Default to disabled
-    realesrgan_checkbox_button = tk.Checkbutton(form_frame, text="Enable RealESRGAN Upscaling", variable=realesrgan_checkbox)
-    realesrgan_checkbox_button.pack()
 
 
-    # Create a "Use Multithreading" checkbox
-    multithreading_checkbox = tk.BooleanVar()
-    multithreading_checkbox.set(False)  # Default to single-threaded
-    multithreading_checkbox_button = tk.Checkbutton(form_frame, text="Use Multithreading", variable=multithreading_checkbox)
-    multithreading_checkbox_button.pack()
+        # Create a Label widget for the video preview
+        preview_label = tk.Label(form_frame)
+        preview_label.pack(side="right", padx=20, pady=10)
 
-    # Create a "Preview" button
-    preview_button = tk.Button(form_frame, text="Preview", command=start_preview)
-    preview_button.pack()
 
-    
-    # Start the GUI main loop
-    root.mainloop()
 
-except Exception as e:
-    print("An error occurred:", str(e))
\ No newline at end of file
+        # Input video path File Dialog button
+        input_path_label = tk.Label(form_frame, text="Select Input Video:", fg='#1e1e1e', bg='white')
+        input_path_label.pack()
+        input_path_var = tk.StringVar()
+        input_path_entry = tk.Entry(form_frame, textvariable=input_path_var, state='readonly')
+        input_path_entry.pack()
+
+        def browse_input_path():
+            file_path = filedialog.askopenfilename(title="Select Input Video File", filetypes=[("Video Files", "*.mp4")])
+            if file_path:
+                input_path_var.set(file_path)
+
+        input_browse_button = tk.Button(form_frame, text="Browse", command=browse_input_path)
+        input_browse_button.pack()
+
+        # Output video path File Dialog button
+        output_path_label = tk.Label(form_frame, text="Select Output Video:", fg='#1e1e1e', bg='white')
+        output_path_label.pack()
+        output_path_var = tk.StringVar()
+        output_path_entry = tk.Entry(form_frame, textvariable=output_path_var, state='readonly')
+        output_path_entry.pack()
+
+        def browse_output_path():
+            file_path = filedialog.asksaveasfilename(title="Save Output Video As", filetypes=[("Video Files", "*.mp4")])
+            if file_path:
+                output_path_var.set(file_path)
+
+        output_browse_button = tk.Button(form_frame, text="Browse", command=browse_output_path)
+        output_browse_button.pack()
+
+        # Scale factor label and entry
+        scale_factor_label = tk.Label(form_frame, text="Scale Factor:", fg='#1e1e1e', bg='white')
+        scale_factor_label.pack()
+        scale_factor_entry = tk.Entry(form_frame)
+        scale_factor_entry.pack()
+
+        # Sharpening intensity slider
+        sharpen_intensity_label = tk.Label(form_frame, text="Sharpening Intensity", fg='#1e1e1e', bg='white')
+        sharpen_intensity_label.pack(anchor="w")
+        sharpen_intensity_scale = ttk.Scale(form_frame, from_=0, to=10, orient="horizontal")
+        sharpen_intensity_scale.set(0)  # Default value
+        sharpen_intensity_scale.pack(fill="x")
+
+        # Denoise strength slider
+        denoise_strength_label = tk.Label(form_frame, text="Denoise Strength", fg='#1e1e1e', bg='white')
+        denoise_strength_label.pack(anchor="w")
+        denoise_strength_scale = ttk.Scale(form_frame, from_=0, to=10, orient="horizontal")
+        denoise_strength_scale.set(0)  # Default value
+        denoise_strength_scale.pack(fill="x")
+
+        # Denoise mode dropdown
+        denoise_mode_var = tk.StringVar(value=DEFAULT_DENOISE_MODE)
+        denoise_mode_menu = ttk.Combobox(form_frame, textvariable=denoise_mode_var, values=list(DENOISE_MODES), state="readonly")
+        denoise_mode_menu.pack(fill="x")
+
+
+
+        # Upscale button
+        upscale_button = tk.Button(form_frame, text="Upscale and Enhance Video", command=upscale_button_click)
+        upscale_button.pack()
+
+        # Cancel button, enabled while a job runs
+        cancel_button = tk.Button(form_frame, text="Cancel", command=cancel_button_click, state="disabled")
+        cancel_button.pack()
+
+        # Progress of the running job
+        progress_var = tk.DoubleVar()
+        progress_bar = ttk.Progressbar(form_frame, variable=progress_var, maximum=100)
+        progress_bar.pack(fill="x")
+        status_var = tk.StringVar(value="Idle")
+        status_label = tk.Label(form_frame, textvariable=status_var, fg='#1e1e1e', bg='white')
+        status_label.pack()
+
+        #checkbox for esrgan
+        realesrgan_checkbox = tk.BooleanVar()
+        realesrgan_checkbox.set(False)  # Default to disabled
+
+        def realesrgan_checkbox_toggled():
+            # Start loading the model as soon as RealESRGAN is enabled
+            if realesrgan_checkbox.get():
+                warm_realesrgan_model(DEFAULT_REALESRGAN_MODEL)
+
+        realesrgan_checkbox_button = tk.Checkbutton(form_frame, text="Enable RealESRGAN Upscaling", variable=realesrgan_checkbox, command=realesrgan_checkbox_toggled)
+        realesrgan_checkbox_button.pack()
+
+        # Create a "Pick Model per Shot" checkbox
+        shot_model_checkbox = tk.BooleanVar()
+        shot_model_checkbox.set(False)  # Default to one model for the whole video
+        shot_model_checkbox_button = tk.Checkbutton(form_frame, text="Pick Model per Shot (RealESRGAN)", variable=shot_model_checkbox)
+        shot_model_checkbox_button.pack()
+
+        # Create a "Crop Letterbox Bars" checkbox
+        crop_borders_checkbox = tk.BooleanVar()
+        crop_borders_checkbox.set(False)  # Default to upscaling the whole frame
+        crop_borders_checkbox_button = tk.Checkbutton(form_frame, text="Crop Letterbox Bars (RealESRGAN)", variable=crop_borders_checkbox)
+        crop_borders_checkbox_button.pack()
+
+        # Torch CPU threads label and entry
+        torch_threads_label = tk.Label(form_frame, text="Torch CPU Threads (RealESRGAN, empty = default):", fg='#1e1e1e', bg='white')
+        torch_threads_label.pack()
+        torch_threads_entry = tk.Entry(form_frame)
+        torch_threads_entry.pack()
+
+
+        # Create a "Stream Frames" checkbox
+        streaming_checkbox = tk.BooleanVar()
+        streaming_checkbox.set(True)  # Default to in-memory streaming
+        streaming_checkbox_button = tk.Checkbutton(form_frame, text="Stream Frames (no temp images)", variable=streaming_checkbox)
+        streaming_checkbox_button.pack()
+
+        # Create a "Use Multithreading" checkbox
+        multithreading_checkbox = tk.BooleanVar()
+        multithreading_checkbox.set(False)  # Default to single-threaded
+        multithreading_checkbox_button = tk.Checkbutton(form_frame, text="Use Multithreading", variable=multithreading_checkbox)
+        multithreading_checkbox_button.pack()
+
+        # Create a "Use Multiprocessing" checkbox
+        multiprocessing_checkbox = tk.BooleanVar()
+        multiprocessing_checkbox.set(False)  # Default to a single process
+        multiprocessing_checkbox_button = tk.Checkbutton(form_frame, text="Use Multiprocessing (split into segments)", variable=multiprocessing_checkbox)
+        multiprocessing_checkbox_button.pack()
+
+        # Create a "Resumable Job" checkbox
+        resumable_checkbox = tk.BooleanVar()
+        resumable_checkbox.set(False)  # Default to a single uncheckpointed pass
+        resumable_checkbox_button = tk.Checkbutton(form_frame, text="Resumable Job (checkpoint segments)", variable=resumable_checkbox)
+        resumable_checkbox_button.pack()
+
+        # Create a "Reuse Duplicate Frames" checkbox
+        reuse_checkbox = tk.BooleanVar()
+        reuse_checkbox.set(False)  # Default to enhancing every frame
+        reuse_checkbox_button = tk.Checkbutton(form_frame, text="Reuse Duplicate Frames", variable=reuse_checkbox)
+        reuse_checkbox_button.pack()
+
+        # Create a "Cache Results on Disk" checkbox
+        result_cache_checkbox = tk.BooleanVar()
+        result_cache_checkbox.set(False)  # Default to no persistent cache
+        result_cache_checkbox_button = tk.Checkbutton(form_frame, text="Cache Results on Disk", variable=result_cache_checkbox)
+        result_cache_checkbox_button.pack()
+
+        # Create a "Preview" button
+        preview_button = tk.Button(form_frame, text="Preview", command=start_preview)
+        preview_button.pack()
+
+
+        # Send what the job thread prints to its log, which reports the progress to the window
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = JobOutputRouter(stdout), JobOutputRouter(stderr)
+
+        # Start the GUI main loop
+        try:
+            root.mainloop()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+    except Exception as e:
+        print("An error occurred:", str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
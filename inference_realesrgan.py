@@ -1,94 +1,81 @@
 import argparse
 import cv2
 import glob
+import math
+import numpy as np
 import os
+import threading
+import torch
+from torch.nn import functional as F
 from basicsr.archs.rrdbnet_arch import RRDBNet
 from basicsr.utils.download_util import load_file_from_url
 
 from realesrgan import RealESRGANer
 from realesrgan.archs.srvgg_arch import SRVGGNetCompact
 
+from rawframes import RAW_FRAMES_EXT, RawFrameWriter, is_raw_frames, open_raw_frames
 
-def main():
-    """Inference demo for Real-ESRGAN.
-    """
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', type=str, default='inputs', help='Input image or folder')
-    parser.add_argument(
-        '-n',
-        '--model_name',
-        type=str,
-        default='RealESRGAN_x4plus',
-        help=('Model names: RealESRGAN_x4plus | RealESRNet_x4plus | RealESRGAN_x4plus_anime_6B | RealESRGAN_x2plus | '
-              'realesr-animevideov3 | realesr-general-x4v3'))
-    parser.add_argument('-o', '--output', type=str, default='results', help='Output folder')
-    parser.add_argument(
-        '-dn',
-        '--denoise_strength',
-        type=float,
-        default=0.5,
-        help=('Denoise strength. 0 for weak denoise (keep noise), 1 for strong denoise ability. '
-              'Only used for the realesr-general-x4v3 model'))
-    parser.add_argument('-s', '--outscale', type=float, default=4, help='The final upsampling scale of the image')
-    parser.add_argument(
-        '--model_path', type=str, default=None, help='[Option] Model path. Usually, you do not need to specify it')
-    parser.add_argument('--suffix', type=str, default='out', help='Suffix of the restored image')
-    parser.add_argument('-t', '--tile', type=int, default=0, help='Tile size, 0 for no tile during testing')
-    parser.add_argument('--tile_pad', type=int, default=10, help='Tile padding')
-    parser.add_argument('--pre_pad', type=int, default=0, help='Pre padding size at each border')
-    parser.add_argument('--face_enhance', action='store_true', help='Use GFPGAN to enhance face')
-    parser.add_argument(
-        '--fp32', action='store_true', help='Use fp32 precision during inference. Default: fp16 (half precision).')
-    parser.add_argument(
-        '--alpha_upsampler',
-        type=str,
-        default='realesrgan',
-        help='The upsampler for the alpha channels. Options: realesrgan | bicubic')
-    parser.add_argument(
-        '--ext',
-        type=str,
-        default='auto',
-        help='Image extension. Options: auto | jpg | png, auto means using the same extension as inputs')
-    parser.add_argument(
-        '-g', '--gpu-id', type=int, default=None, help='gpu device to use (default=None) can be 0,1,2 for multi-gpu')
 
-    args = parser.parse_args()
+def build_model(model_name):
+    """Build the network for a model name.
 
+    Returns the (model, netscale, file_url) triple used to construct a RealESRGANer.
+    """
     # determine models according to model names
-    args.model_name = args.model_name.split('.')[0]
-    if args.model_name == 'RealESRGAN_x4plus':  # x4 RRDBNet model
+    model_name = model_name.split('.')[0]
+    if model_name == 'RealESRGAN_x4plus':  # x4 RRDBNet model
         model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
         netscale = 4
         file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth']
-    elif args.model_name == 'RealESRNet_x4plus':  # x4 RRDBNet model
+    elif model_name == 'RealESRNet_x4plus':  # x4 RRDBNet model
         model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
         netscale = 4
         file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.1/RealESRNet_x4plus.pth']
-    elif args.model_name == 'RealESRGAN_x4plus_anime_6B':  # x4 RRDBNet model with 6 blocks
+    elif model_name == 'RealESRGAN_x4plus_anime_6B':  # x4 RRDBNet model with 6 blocks
         model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=6, num_grow_ch=32, scale=4)
         netscale = 4
         file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.2.4/RealESRGAN_x4plus_anime_6B.pth']
-    elif args.model_name == 'RealESRGAN_x2plus':  # x2 RRDBNet model
+    elif model_name == 'RealESRGAN_x2plus':  # x2 RRDBNet model
         model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=2)
         netscale = 2
         file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.1/RealESRGAN_x2plus.pth']
-    elif args.model_name == 'realesr-animevideov3':  # x4 VGG-style model (XS size)
+    elif model_name == 'realesr-animevideov3':  # x4 VGG-style model (XS size)
         model = SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=64, num_conv=16, upscale=4, act_type='prelu')
         netscale = 4
         file_url = ['https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-animevideov3.pth']
-    elif args.model_name == 'realesr-general-x4v3':  # x4 VGG-style model (S size)
+    elif model_name == 'realesr-general-x4v3':  # x4 VGG-style model (S size)
         model = SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=64, num_conv=32, upscale=4, act_type='prelu')
         netscale = 4
         file_url = [
             'https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-wdn-x4v3.pth',
             'https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-x4v3.pth'
         ]
+    else:
+        raise ValueError(f'Unknown model name: {model_name}')
+
+    return model, netscale, file_url
+
+
+def create_upsampler(model_name,
+                     denoise_strength=0.5,
+                     model_path=None,
+                     tile=0,
+                     tile_pad=10,
+                     pre_pad=0,
+                     fp32=None,
+                     gpu_id=None):
+    """Create a RealESRGANer for a model name, downloading the weights if needed.
+
+    fp32=None picks half precision on CUDA and fp32 on CPU, where half precision is not supported.
+    """
+    if fp32 is None:
+        fp32 = gpu_id is None and not torch.cuda.is_available()
+    model_name = model_name.split('.')[0]
+    model, netscale, file_url = build_model(model_name)
 
     # determine model paths
-    if args.model_path is not None:
-        model_path = args.model_path
-    else:
-        model_path = os.path.join('weights', args.model_name + '.pth')
+    if model_path is None:
+        model_path = os.path.join('weights', model_name + '.pth')
         if not os.path.isfile(model_path):
             ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
             for url in file_url:
@@ -98,69 +85,483 @@ def main():
 
     # use dni to control the denoise strength
     dni_weight = None
-    if args.model_name == 'realesr-general-x4v3' and args.denoise_strength != 1:
+    if model_name == 'realesr-general-x4v3' and denoise_strength != 1:
         wdn_model_path = model_path.replace('realesr-general-x4v3', 'realesr-general-wdn-x4v3')
         model_path = [model_path, wdn_model_path]
-        dni_weight = [args.denoise_strength, 1 - args.denoise_strength]
+        dni_weight = [denoise_strength, 1 - denoise_strength]
 
     # restorer
-    upsampler = RealESRGANer(
+    return RealESRGANer(
         scale=netscale,
         model_path=model_path,
         dni_weight=dni_weight,
         model=model,
-        tile=args.tile,
-        tile_pad=args.tile_pad,
-        pre_pad=args.pre_pad,
-        half=not args.fp32,
-        gpu_id=args.gpu_id)
+        tile=tile,
+        tile_pad=tile_pad,
+        pre_pad=pre_pad,
+        half=not fp32,
+        gpu_id=gpu_id)
 
-    if args.face_enhance:  # Use GFPGAN for face enhancement
-        from gfpgan import GFPGANer
-        face_enhancer = GFPGANer(
-            model_path='https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.3.pth',
-            upscale=args.outscale,
-            arch='clean',
-            channel_multiplier=2,
-            bg_upsampler=upsampler)
-    os.makedirs(args.output, exist_ok=True)
-
-    if os.path.isfile(args.input):
-        paths = [args.input]
+
+def create_face_enhancer(upsampler, outscale):
+    """Wrap an upsampler with GFPGAN face enhancement.
+    """
+    from gfpgan import GFPGANer
+    return GFPGANer(
+        model_path='https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.3.pth',
+        upscale=outscale,
+        arch='clean',
+        channel_multiplier=2,
+        bg_upsampler=upsampler)
+
+
+def enhance_image(upsampler, img, outscale, face_enhancer=None):
+    """Upscale a single image (numpy array) and return the result.
+    """
+    if face_enhancer is not None:
+        _, _, output = face_enhancer.enhance(img, has_aligned=False, only_center_face=False, paste_back=True)
+    else:
+        output, _ = upsampler.enhance(img, outscale=outscale)
+    return output
+
+
+def set_num_threads(num_threads):
+    """Set the number of threads used by the torch CPU backend.
+    """
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+
+def get_auto_tile_size(height, width, netscale, memory_budget, batch_size=1, tile_pad=10, model=None):
+    """Pick the largest tile size that keeps one batched forward pass within memory_budget (MB).
+
+    The estimate is rough: about eight 64-channel fp32 feature maps alive per input pixel, plus the
+    upscaled output. RRDBNet models (conv_up1) also upsample two 64-channel feature maps to the output
+    size, so pass the model to count those. Returns 0 (no tiling) when whole frames fit.
+    """
+    bytes_per_pixel = 4 * (64 * 8 + 3 * netscale * netscale)
+    if hasattr(model, 'conv_up1'):
+        bytes_per_pixel += 4 * 64 * 2 * netscale * netscale
+    budget_pixels = memory_budget * 1024 * 1024 / (bytes_per_pixel * batch_size)
+    if height * width <= budget_pixels:
+        return 0
+    tile = int(math.sqrt(budget_pixels)) - 2 * tile_pad
+    # Multiples of 16 keep tiles valid for the pixel-unshuffle (x2/x1) models
+    return max(32, tile // 16 * 16)
+
+
+def tile_forward(model, batch, netscale, tile, tile_pad):
+    """Run the model tile by tile; each forward pass covers the same tile of every frame in the batch.
+    """
+    batch_size, channel, height, width = batch.shape
+    output = batch.new_zeros((batch_size, channel, height * netscale, width * netscale))
+    tiles_x = math.ceil(width / tile)
+    tiles_y = math.ceil(height / tile)
+
+    for y in range(tiles_y):
+        for x in range(tiles_x):
+            # tile area, and the same area extended by tile_pad on each side
+            x0, x1 = x * tile, min((x + 1) * tile, width)
+            y0, y1 = y * tile, min((y + 1) * tile, height)
+            pad_x0, pad_x1 = max(x0 - tile_pad, 0), min(x1 + tile_pad, width)
+            pad_y0, pad_y1 = max(y0 - tile_pad, 0), min(y1 + tile_pad, height)
+
+            output_tile = model(batch[:, :, pad_y0:pad_y1, pad_x0:pad_x1])
+
+            # remove the padding from the upscaled tile
+            crop_x0 = (x0 - pad_x0) * netscale
+            crop_y0 = (y0 - pad_y0) * netscale
+            output[:, :, y0 * netscale:y1 * netscale, x0 * netscale:x1 * netscale] = output_tile[
+                :, :, crop_y0:crop_y0 + (y1 - y0) * netscale, crop_x0:crop_x0 + (x1 - x0) * netscale]
+
+    return output
+
+
+def enhance_batch(upsampler, imgs, outscale=None, tile=None, tile_pad=None):
+    """Upscale several same-sized 8-bit BGR images with one forward pass per tile.
+
+    tile=None uses the upsampler's own tile size. Returns a list of images in the input order.
+    """
+    netscale = upsampler.scale
+    tile = upsampler.tile_size if tile is None else tile
+    tile_pad = upsampler.tile_pad if tile_pad is None else tile_pad
+
+    # NHWC BGR uint8 -> NCHW RGB float
+    batch = np.stack(imgs).astype(np.float32) / 255.
+    batch = torch.from_numpy(np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2)))
+    batch = batch.to(upsampler.device)
+    if upsampler.half:
+        batch = batch.half()
+
+    # Padded like RealESRGANer.pre_process: pre_pad on the bottom and right, then pixel-unshuffle
+    # models need sizes divisible by their mod scale. Both pads are cropped off the output below.
+    _, _, height, width = batch.shape
+    if upsampler.pre_pad:
+        batch = F.pad(batch, (0, upsampler.pre_pad, 0, upsampler.pre_pad), 'reflect')
+    mod_scale = {2: 2, 1: 4}.get(netscale)
+    if mod_scale is not None:
+        _, _, padded_height, padded_width = batch.shape
+        pad_h = (mod_scale - padded_height % mod_scale) % mod_scale
+        pad_w = (mod_scale - padded_width % mod_scale) % mod_scale
+        if pad_h or pad_w:
+            batch = F.pad(batch, (0, pad_w, 0, pad_h), 'reflect')
+
+    with torch.no_grad():
+        if tile:
+            output = tile_forward(upsampler.model, batch, netscale, tile, tile_pad)
+        else:
+            output = upsampler.model(batch)
+
+    # Converted in place, so the only full-size copy next to the float output is the uint8 one
+    output = output[:, :, :height * netscale, :width * netscale]
+    output = output.float().clamp_(0, 1).mul_(255.0).round_().byte().cpu().numpy()
+    output = output[:, ::-1].transpose(0, 2, 3, 1)
+
+    results = []
+    for img in output:
+        if outscale is not None and outscale != float(netscale):
+            img = cv2.resize(img, (int(width * outscale), int(height * outscale)), interpolation=cv2.INTER_LANCZOS4)
+        results.append(np.ascontiguousarray(img))
+    return results
+
+
+def enhance_images(upsampler,
+                   input,
+                   output,
+                   outscale,
+                   suffix='out',
+                   ext='auto',
+                   face_enhancer=None,
+                   batch_size=1,
+                   memory_budget=None,
+                   result_cache=None,
+                   cancel_event=None):
+    """Upscale an image file or every image in a folder and save the results to the output folder.
+
+    With batch_size > 1, consecutive 3-channel 8-bit images of the same size go through enhance_batch
+    together. memory_budget (MB) picks the tile size automatically; with it, those images go through
+    enhance_batch even when batch_size is 1.
+    result_cache is an optional object with get(img) -> output or None and put(img, output); images it
+    already knows are written without running the model.
+    input can also be a raw frames file (see rawframes.py). Its frames are memory-mapped and the results
+    are written in order to one raw frames file: output itself if it ends with .frames, otherwise a file
+    named after the input in the output folder. An image that fails to upscale is skipped with a message,
+    except in a raw frames file, where the error is raised so the frames that follow do not shift.
+    cancel_event is an optional threading.Event; once it is set, the remaining images are skipped.
+    """
+    raw_writer = None
+    if is_raw_frames(input):
+        frames, first_frame = open_raw_frames(input)
+        if output.endswith(RAW_FRAMES_EXT):
+            raw_path = output
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        else:
+            os.makedirs(output, exist_ok=True)
+            name = os.path.splitext(os.path.basename(input))[0]
+            raw_path = os.path.join(output, f'{name}{RAW_FRAMES_EXT}' if suffix == '' else f'{name}_{suffix}{RAW_FRAMES_EXT}')
+        raw_writer = RawFrameWriter(raw_path, first_frame)
+
+        def read_images():
+            for idx, frame in enumerate(frames):
+                yield f'frame_{first_frame + idx:04d}', RAW_FRAMES_EXT, frame[..., 0] if frame.shape[2] == 1 else frame
     else:
-        paths = sorted(glob.glob(os.path.join(args.input, '*')))
+        os.makedirs(output, exist_ok=True)
+        if os.path.isfile(input):
+            paths = [input]
+        else:
+            paths = sorted(glob.glob(os.path.join(input, '*')))
 
-    for idx, path in enumerate(paths):
-        imgname, extension = os.path.splitext(os.path.basename(path))
-        print('Testing', idx, imgname)
+        def read_images():
+            for path in paths:
+                imgname, extension = os.path.splitext(os.path.basename(path))
+                yield imgname, extension, cv2.imread(path, cv2.IMREAD_UNCHANGED)
 
-        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
-        if len(img.shape) == 3 and img.shape[2] == 4:
-            img_mode = 'RGBA'
+    def save(imgname, extension, img_mode, result):
+        if raw_writer is not None:
+            raw_writer.write(result)
+            return
+        if ext == 'auto':
+            extension = extension[1:]
+        else:
+            extension = ext
+        if img_mode == 'RGBA':  # RGBA images should be saved in png format
+            extension = 'png'
+        if suffix == '':
+            save_path = os.path.join(output, f'{imgname}.{extension}')
         else:
-            img_mode = None
+            save_path = os.path.join(output, f'{imgname}_{suffix}.{extension}')
 
+        cv2.imwrite(save_path, result)
+
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        imgs = [img for _, _, img in pending]
+        tile = None
+        if memory_budget:
+            height, width = imgs[0].shape[:2]
+            tile = get_auto_tile_size(height, width, upsampler.scale, memory_budget, len(imgs), upsampler.tile_pad,
+                                      upsampler.model)
         try:
-            if args.face_enhance:
-                _, _, output = face_enhancer.enhance(img, has_aligned=False, only_center_face=False, paste_back=True)
-            else:
-                output, _ = upsampler.enhance(img, outscale=args.outscale)
+            results = enhance_batch(upsampler, imgs, outscale, tile=tile)
         except RuntimeError as error:
+            # Frames skipped in a raw frames file would shift every later frame, so the run fails instead
+            if raw_writer is not None:
+                raise
             print('Error', error)
-            print('If you encounter CUDA out of memory, try to set --tile with a smaller number.')
+            print('If you run out of memory, try a smaller --batch_size or --memory_budget.')
         else:
-            if args.ext == 'auto':
-                extension = extension[1:]
+            for (imgname, extension, img), result in zip(pending, results):
+                if result_cache is not None:
+                    result_cache.put(img, result)
+                save(imgname, extension, None, result)
+        pending.clear()
+
+    try:
+        for idx, (imgname, extension, img) in enumerate(read_images()):
+            if cancel_event is not None and cancel_event.is_set():
+                pending.clear()
+                break
+            print('Testing', idx, imgname)
+
+            if len(img.shape) == 3 and img.shape[2] == 4:
+                img_mode = 'RGBA'
             else:
-                extension = args.ext
-            if img_mode == 'RGBA':  # RGBA images should be saved in png format
-                extension = 'png'
-            if args.suffix == '':
-                save_path = os.path.join(args.output, f'{imgname}.{extension}')
+                img_mode = None
+
+            if result_cache is not None:
+                result = result_cache.get(img)
+                if result is not None:
+                    # Raw frames are written in order, so earlier frames still waiting in a batch go first
+                    if raw_writer is not None:
+                        flush()
+                    save(imgname, extension, img_mode, result)
+                    continue
+
+            batchable = ((batch_size > 1 or memory_budget) and face_enhancer is None and img.dtype == np.uint8 and img.ndim == 3
+                         and img.shape[2] == 3)
+            if batchable:
+                if pending and pending[0][2].shape != img.shape:
+                    flush()
+                pending.append((imgname, extension, img))
+                if len(pending) >= batch_size:
+                    flush()
+                continue
+
+            flush()
+            try:
+                result = enhance_image(upsampler, img, outscale, face_enhancer=face_enhancer)
+            except RuntimeError as error:
+                if raw_writer is not None:
+                    raise
+                print('Error', error)
+                print('If you encounter CUDA out of memory, try to set --tile with a smaller number.')
             else:
-                save_path = os.path.join(args.output, f'{imgname}_{args.suffix}.{extension}')
-                
-            cv2.imwrite(save_path, output)
+                if result_cache is not None:
+                    result_cache.put(img, result)
+                save(imgname, extension, img_mode, result)
+
+        flush()
+    finally:
+        if raw_writer is not None:
+            raw_writer.close()
+
+
+class UpscalerService:
+    """Keeps Real-ESRGAN models loaded in-process so they can be reused across jobs.
+
+    Each distinct combination of model name and construction options is built once and cached.
+    RealESRGANer keeps per-call state on the instance, so calls on one upsampler are serialized.
+    """
+
+    # Options consumed by create_upsampler; everything else is a per-call output option
+    UPSAMPLER_OPTIONS = ('denoise_strength', 'model_path', 'tile', 'tile_pad', 'pre_pad', 'fp32', 'gpu_id')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._upsamplers = {}
+        self._face_enhancers = {}
+
+    def _key(self, model_name, options):
+        return (model_name.split('.')[0], ) + tuple(sorted(options.items()))
+
+    def get_upsampler(self, model_name, **options):
+        """Return the cached (upsampler, lock) pair for these options, building it on first use.
+        """
+        key = self._key(model_name, options)
+        with self._lock:
+            entry = self._upsamplers.get(key)
+            if entry is None:
+                entry = (create_upsampler(model_name, **options), threading.Lock())
+                self._upsamplers[key] = entry
+        return entry
+
+    def get_face_enhancer(self, model_name, outscale, **options):
+        key = self._key(model_name, options) + (outscale, )
+        upsampler, _ = self.get_upsampler(model_name, **options)
+        with self._lock:
+            face_enhancer = self._face_enhancers.get(key)
+            if face_enhancer is None:
+                face_enhancer = create_face_enhancer(upsampler, outscale)
+                self._face_enhancers[key] = face_enhancer
+        return face_enhancer
+
+    def split_options(self, options):
+        """Split a flat options dict into (upsampler options, output options).
+        """
+        upsampler_options = {k: v for k, v in options.items() if k in self.UPSAMPLER_OPTIONS}
+        output_options = {k: v for k, v in options.items() if k not in self.UPSAMPLER_OPTIONS}
+        return upsampler_options, output_options
+
+    def enhance(self, img, model_name, outscale, face_enhance=False, memory_budget=None, **options):
+        """Upscale a single image with a warm model.
+
+        With memory_budget (MB), 8-bit BGR images go through the tiled batch path as a batch of one.
+        """
+        if memory_budget and not face_enhance and img.dtype == np.uint8 and img.ndim == 3 and img.shape[2] == 3:
+            return self.enhance_batch([img], model_name, outscale, memory_budget=memory_budget, **options)[0]
+        upsampler_options, _ = self.split_options(options)
+        upsampler, lock = self.get_upsampler(model_name, **upsampler_options)
+        face_enhancer = None
+        if face_enhance:
+            face_enhancer = self.get_face_enhancer(model_name, outscale, **upsampler_options)
+        with lock:
+            return enhance_image(upsampler, img, outscale, face_enhancer=face_enhancer)
+
+    def enhance_batch(self, imgs, model_name, outscale, memory_budget=None, **options):
+        """Upscale a list of same-sized frames with a warm model in one batched pass.
+
+        memory_budget (MB) picks the tile size automatically; otherwise the upsampler's tile option is used.
+        """
+        upsampler_options, _ = self.split_options(options)
+        upsampler, lock = self.get_upsampler(model_name, **upsampler_options)
+        tile = None
+        if memory_budget:
+            height, width = imgs[0].shape[:2]
+            tile = get_auto_tile_size(height, width, upsampler.scale, memory_budget, len(imgs), upsampler.tile_pad,
+                                      upsampler.model)
+        with lock:
+            return enhance_batch(upsampler, imgs, outscale, tile=tile)
+
+    def enhance_folder(self, input, output, model_name, outscale, **options):
+        """Upscale an image file or folder with a warm model, same as the command line interface.
+        """
+        upsampler_options, output_options = self.split_options(options)
+        face_enhance = output_options.pop('face_enhance', False)
+        set_num_threads(output_options.pop('num_threads', None))
+        upsampler, lock = self.get_upsampler(model_name, **upsampler_options)
+        face_enhancer = None
+        if face_enhance:
+            face_enhancer = self.get_face_enhancer(model_name, outscale, **upsampler_options)
+        with lock:
+            enhance_images(upsampler, input, output, outscale, face_enhancer=face_enhancer, **output_options)
+
+    def clear(self):
+        """Drop every cached model.
+        """
+        with self._lock:
+            self._upsamplers.clear()
+            self._face_enhancers.clear()
+
+
+_upscaler_service = None
+_upscaler_service_lock = threading.Lock()
+
+
+def get_upscaler_service():
+    """Return the process-wide UpscalerService.
+    """
+    global _upscaler_service
+    with _upscaler_service_lock:
+        if _upscaler_service is None:
+            _upscaler_service = UpscalerService()
+        return _upscaler_service
+
+
+def main():
+    """Inference demo for Real-ESRGAN.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', type=str, default='inputs', help='Input image, folder or raw frames file')
+    parser.add_argument(
+        '-n',
+        '--model_name',
+        type=str,
+        default='RealESRGAN_x4plus',
+        help=('Model names: RealESRGAN_x4plus | RealESRNet_x4plus | RealESRGAN_x4plus_anime_6B | RealESRGAN_x2plus | '
+              'realesr-animevideov3 | realesr-general-x4v3'))
+    parser.add_argument('-o', '--output', type=str, default='results', help='Output folder, or a .frames file for raw frames input')
+    parser.add_argument(
+        '-dn',
+        '--denoise_strength',
+        type=float,
+        default=0.5,
+        help=('Denoise strength. 0 for weak denoise (keep noise), 1 for strong denoise ability. '
+              'Only used for the realesr-general-x4v3 model'))
+    parser.add_argument('-s', '--outscale', type=float, default=4, help='The final upsampling scale of the image')
+    parser.add_argument(
+        '--model_path', type=str, default=None, help='[Option] Model path. Usually, you do not need to specify it')
+    parser.add_argument('--suffix', type=str, default='out', help='Suffix of the restored image')
+    parser.add_argument('-t', '--tile', type=int, default=0, help='Tile size, 0 for no tile during testing')
+    parser.add_argument('--tile_pad', type=int, default=10, help='Tile padding')
+    parser.add_argument('--pre_pad', type=int, default=0, help='Pre padding size at each border')
+    parser.add_argument('--face_enhance', action='store_true', help='Use GFPGAN to enhance face')
+    parser.add_argument(
+        '--fp32',
+        action='store_true',
+        help='Use fp32 precision during inference. Default: fp16 (half precision) on GPU, fp32 on CPU.')
+    parser.add_argument(
+        '-b', '--batch_size', type=int, default=1, help='Number of same-sized images upscaled in one forward pass')
+    parser.add_argument(
+        '--memory_budget',
+        type=int,
+        default=None,
+        help='Memory budget in MB for one batched forward pass. Picks the tile size automatically')
+    parser.add_argument(
+        '--num_threads', type=int, default=None, help='Number of threads used by the torch CPU backend')
+    parser.add_argument(
+        '--alpha_upsampler',
+        type=str,
+        default='realesrgan',
+        help='The upsampler for the alpha channels. Options: realesrgan | bicubic')
+    parser.add_argument(
+        '--ext',
+        type=str,
+        default='auto',
+        help='Image extension. Options: auto | jpg | png, auto means using the same extension as inputs')
+    parser.add_argument(
+        '-g', '--gpu-id', type=int, default=None, help='gpu device to use (default=None) can be 0,1,2 for multi-gpu')
+
+    args = parser.parse_args()
+
+    set_num_threads(args.num_threads)
+
+    upsampler = create_upsampler(
+        args.model_name,
+        denoise_strength=args.denoise_strength,
+        model_path=args.model_path,
+        tile=args.tile,
+        tile_pad=args.tile_pad,
+        pre_pad=args.pre_pad,
+        fp32=args.fp32 or None,
+        gpu_id=args.gpu_id)
+
+    face_enhancer = None
+    if args.face_enhance:  # Use GFPGAN for face enhancement
+        face_enhancer = create_face_enhancer(upsampler, args.outscale)
+
+    enhance_images(
+        upsampler,
+        args.input,
+        args.output,
+        args.outscale,
+        suffix=args.suffix,
+        ext=args.ext,
+        face_enhancer=face_enhancer,
+        batch_size=args.batch_size,
+        memory_budget=args.memory_budget)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,96 @@
+import json
+import numpy as np
+import os
+import struct
+
+# A raw frames file is a fixed-size header followed by the frames as one uncompressed C-order array.
+# The header holds the magic, the length of a JSON description and the description itself:
+# {"shape": [count, height, width, channels], "dtype": "uint8", "first_frame": index}
+RAW_FRAMES_EXT = '.frames'
+RAW_FRAMES_MAGIC = b'BCFRAMES'
+RAW_FRAMES_HEADER_SIZE = 4096
+
+
+def is_raw_frames(path):
+    """Return True if path is a raw frames file.
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(RAW_FRAMES_MAGIC)) == RAW_FRAMES_MAGIC
+
+
+def read_raw_frames_header(path):
+    """Read the description of a raw frames file.
+
+    Returns a dict with shape (a list), dtype (a string) and first_frame.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(RAW_FRAMES_HEADER_SIZE)
+    if header[:len(RAW_FRAMES_MAGIC)] != RAW_FRAMES_MAGIC:
+        raise ValueError(f'{path} is not a raw frames file')
+    length, = struct.unpack_from('<I', header, len(RAW_FRAMES_MAGIC))
+    start = len(RAW_FRAMES_MAGIC) + 4
+    return json.loads(header[start:start + length].decode('utf-8'))
+
+
+def open_raw_frames(path):
+    """Map the frames of a raw frames file read-only.
+
+    Returns (frames, first_frame), where frames is a np.memmap of shape (count, height, width, channels).
+    Pages are read on demand, so the OS page cache does the I/O.
+    """
+    header = read_raw_frames_header(path)
+    shape = tuple(header['shape'])
+    if shape[0] == 0:
+        return np.empty(shape, dtype=header['dtype']), header['first_frame']
+    frames = np.memmap(path, dtype=header['dtype'], mode='r', offset=RAW_FRAMES_HEADER_SIZE, shape=shape)
+    return frames, header['first_frame']
+
+
+class RawFrameWriter:
+    """Append frames of one size and dtype to a raw frames file.
+
+    The header is written on close, once the frame count is known; until then the file starts with
+    zeros and is not recognized as a raw frames file.
+    """
+
+    def __init__(self, path, first_frame=0):
+        self.path = path
+        self.first_frame = first_frame
+        self.frame_shape = None
+        self.dtype = None
+        self.count = 0
+        self._file = open(path, 'wb')
+        self._file.write(bytes(RAW_FRAMES_HEADER_SIZE))
+
+    def write(self, frame):
+        # Grayscale frames are stored with one channel
+        frame_shape = frame.shape if frame.ndim == 3 else frame.shape + (1, )
+        if self.frame_shape is None:
+            self.frame_shape = frame_shape
+            self.dtype = frame.dtype
+        elif frame_shape != self.frame_shape or frame.dtype != self.dtype:
+            raise ValueError(f'Frame {self.count} does not match the {self.frame_shape} {self.dtype} frames in {self.path}')
+        self._file.write(np.ascontiguousarray(frame).data)
+        self.count += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        shape = [self.count] + list(self.frame_shape or (0, 0, 3))
+        description = json.dumps({
+            'shape': shape,
+            'dtype': np.dtype(self.dtype or np.uint8).name,
+            'first_frame': self.first_frame
+        }).encode('utf-8')
+        self._file.seek(0)
+        self._file.write(RAW_FRAMES_MAGIC + struct.pack('<I', len(description)) + description)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,322 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import bytecrush
+
+
+def test_split_frame_range_covers_every_frame_once():
+    ranges = bytecrush.split_frame_range(301, 4)
+    assert ranges == [(0, 75), (75, 150), (150, 225), (225, 301)]
+
+
+def test_split_frame_range_never_makes_empty_segments():
+    # More segments than frames: one frame per segment
+    assert bytecrush.split_frame_range(3, 8) == [(0, 1), (1, 2), (2, 3)]
+    assert bytecrush.split_frame_range(0, 4) == []
+    assert bytecrush.split_frame_range(10, 0) == [(0, 10)]
+
+
+def make_frame(value, shape=(16, 16, 3)):
+    return np.full(shape, value, np.uint8)
+
+
+def counting_enhance():
+    calls = []
+
+    def enhance(frame):
+        calls.append(frame)
+        return frame * 2
+
+    return enhance, calls
+
+
+def test_frame_reuse_cache_exact_duplicates_only_at_zero_threshold():
+    cache = bytecrush.FrameReuseCache(threshold=0)
+    enhance, calls = counting_enhance()
+    enhance = cache.wrap(enhance)
+    enhance(make_frame(10))
+    enhance(make_frame(10))
+    enhance(make_frame(11))
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_frame_reuse_cache_near_duplicates_within_threshold():
+    cache = bytecrush.FrameReuseCache(threshold=2)
+    enhance, calls = counting_enhance()
+    enhance = cache.wrap(enhance)
+    first = enhance(make_frame(10))
+    # Mean difference 2 is within the threshold and gets the first frame's output, 3 is not
+    assert enhance(make_frame(12)) is first
+    enhance(make_frame(13))
+    assert len(calls) == 2
+
+
+def test_frame_reuse_cache_forgets_old_frames():
+    cache = bytecrush.FrameReuseCache(threshold=0, max_entries=2)
+    enhance_frame, calls = counting_enhance()
+    enhance = cache.wrap_batch(lambda frames: [enhance_frame(frame) for frame in frames])
+    enhance([make_frame(1), make_frame(2), make_frame(3)])
+    enhance([make_frame(3), make_frame(1)])
+    # 3 is still cached, 1 was evicted when 3 was stored
+    assert len(calls) == 4
+
+
+def test_result_cache_keys_depend_on_params_and_frame_shape(tmp_path):
+    cache = bytecrush.ResultCache(str(tmp_path))
+    frame = make_frame(5, (4, 6, 3))
+    sharp = cache.bind(path="classic", sharpen=1)
+    assert sharp.key(frame) == cache.bind(sharpen=1, path="classic").key(frame)
+    assert sharp.key(frame) != cache.bind(path="classic", sharpen=2).key(frame)
+    # Same bytes in a different shape are a different frame
+    assert sharp.key(frame) != sharp.key(frame.reshape(6, 4, 3))
+
+    assert sharp.get(frame) is None
+    sharp.put(frame, frame + 1)
+    assert (sharp.get(frame) == frame + 1).all()
+    assert (sharp.hits, sharp.misses) == (1, 1)
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    output = make_frame(0, (32, 32, 3))
+    cache = bytecrush.ResultCache(str(tmp_path))
+    cache.put("aa01", output)
+    entry_size = os.path.getsize(cache.path_for("aa01"))
+    cache.max_bytes = 3 * entry_size
+    cache.put("bb02", output)
+    cache.put("cc03", output)
+    # Last used: aa01 most recently (it was read back), then cc03, then bb02
+    for age, key in enumerate(("aa01", "cc03", "bb02")):
+        os.utime(cache.path_for(key), (1000 - age, 1000 - age))
+
+    # Over the cap: entries go least recently used first until the cache is under 90% of it
+    cache.put("dd04", output)
+    assert [os.path.exists(cache.path_for(key)) for key in ("aa01", "bb02", "cc03", "dd04")] == [True, False, False, True]
+    assert cache.total_bytes == 2 * entry_size
+
+
+def write_test_video(path, num_frames=6, size=(32, 24)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, size)
+    for i in range(num_frames):
+        writer.write(make_frame(i * 20, (size[1], size[0], 3)))
+    writer.release()
+
+
+def test_resumable_job_keeps_progress_when_the_output_is_not_written(tmp_path, monkeypatch):
+    input_path = tmp_path / "input.mp4"
+    write_test_video(input_path)
+    # An output left over from an earlier run, and a mux that fails without raising
+    output_path = tmp_path / "output.mp4"
+    output_path.write_bytes(b"old")
+    old_mtime = time.time() - 3600
+    os.utime(output_path, (old_mtime, old_mtime))
+    monkeypatch.setattr(bytecrush, "add_audio_to_video", lambda *args: False)
+
+    jobs_dir = tmp_path / "jobs"
+    bytecrush.run_resumable_job(str(input_path), str(output_path), 2, 0, 0, segment_frames=3, jobs_dir=str(jobs_dir))
+    assert output_path.read_bytes() == b"old"
+    [job_dir] = jobs_dir.iterdir()
+    manifest = bytecrush.load_job_manifest(str(job_dir))
+    assert all(segment["done"] for segment in manifest["segments"])
+
+
+def test_plan_memory_budget_keeps_the_settings_that_fit():
+    assert bytecrush.plan_memory_budget(100000, (640, 360), (1280, 720), num_workers=4, queue_size=8)[:2] == (8, 4)
+
+
+def test_plan_memory_budget_drops_workers_before_queue_depth():
+    plan = bytecrush.plan_memory_budget(1500, (1920, 1080), (3840, 2160), num_workers=4, queue_size=8, use_realesrgan=True)
+    assert plan[:2] == (8, 1)
+    # Extra workers are only kept when each still gets a useful tile budget
+    for memory_budget in (2000, 3000, 6000):
+        queue_size, num_workers, worker_budget = bytecrush.plan_memory_budget(memory_budget, (1920, 1080), (3840, 2160), num_workers=4, queue_size=8, use_realesrgan=True)
+        assert num_workers == 1 or worker_budget >= bytecrush.WORKER_TILE_MEMORY_BUDGET
+
+
+def test_plan_memory_budget_clamps_to_the_smallest_plan(capsys):
+    plan = bytecrush.plan_memory_budget(10, (1920, 1080), (3840, 2160), num_workers=4, queue_size=8, use_realesrgan=True)
+    assert plan == (1, 1, bytecrush.MIN_TILE_MEMORY_BUDGET)
+    assert "below the" in capsys.readouterr().out
+
+
+def letterboxed_frame(picture=128, bars=0, size=(40, 64), bar_height=8):
+    frame = make_frame(bars, size + (3, ))
+    frame[bar_height:size[0] - bar_height] = picture
+    return frame
+
+
+def upscale_2x(frame):
+    return frame.repeat(2, axis=0).repeat(2, axis=1)
+
+
+def shape_recording_enhance():
+    shapes = []
+
+    def enhance(frame):
+        shapes.append(frame.shape[:2])
+        return upscale_2x(frame)
+
+    return enhance, shapes
+
+
+def test_detect_active_area():
+    assert bytecrush.detect_active_area(letterboxed_frame()) == (0, 8, 64, 32)
+    # Odd edges are widened to even coordinates
+    assert bytecrush.detect_active_area(letterboxed_frame(bar_height=7)) == (0, 6, 64, 34)
+    assert bytecrush.detect_active_area(make_frame(0, (40, 64, 3))) is None
+
+
+def test_active_area_cropper_crops_only_confirmed_bars(capsys):
+    cropper = bytecrush.ActiveAreaCropper(2)
+    enhance_frame, shapes = shape_recording_enhance()
+    enhance = cropper.wrap(enhance_frame)
+    outputs = [enhance(letterboxed_frame()) for _ in range(bytecrush.BORDER_CONFIRM_FRAMES + 1)]
+    assert shapes == [(40, 64)] * (bytecrush.BORDER_CONFIRM_FRAMES - 1) + [(24, 64)] * 2
+    assert "Active area: 64x24 at (0, 8)" in capsys.readouterr().out
+    # The redrawn bars give the same frame as enhancing it whole
+    for output in outputs:
+        assert (output == upscale_2x(letterboxed_frame())).all()
+
+
+def test_active_area_cropper_enhances_frames_with_picture_in_the_bars_whole():
+    cropper = bytecrush.ActiveAreaCropper(2)
+    enhance_frame, shapes = shape_recording_enhance()
+    enhance = cropper.wrap(enhance_frame)
+    for _ in range(bytecrush.BORDER_CONFIRM_FRAMES):
+        enhance(letterboxed_frame())
+    frame = letterboxed_frame(bars=200)
+    assert (enhance(frame) == upscale_2x(frame)).all()
+    assert shapes[-1] == (40, 64)
+
+
+def test_active_area_cropper_ignores_dark_scenes_and_small_savings():
+    cropper = bytecrush.ActiveAreaCropper(2)
+    enhance_frame, shapes = shape_recording_enhance()
+    enhance = cropper.wrap(enhance_frame)
+    for _ in range(bytecrush.BORDER_CONFIRM_FRAMES + 1):
+        # A small bright spot in a dark frame, then thin bars
+        spot = make_frame(0, (40, 64, 3))
+        spot[18:22, 30:34] = 255
+        enhance(spot)
+    for _ in range(bytecrush.BORDER_CONFIRM_FRAMES + 1):
+        enhance(letterboxed_frame(size=(100, 64), bar_height=2))
+    assert set(shapes) == {(40, 64), (100, 64)}
+
+
+def test_active_area_cropper_batches_frames_by_crop_size():
+    cropper = bytecrush.ActiveAreaCropper(2)
+    batch_shapes = []
+
+    def enhance_frames(frames):
+        batch_shapes.append([frame.shape[:2] for frame in frames])
+        return [upscale_2x(frame) for frame in frames]
+
+    enhance = cropper.wrap_batch(enhance_frames)
+    enhance([letterboxed_frame()] * bytecrush.BORDER_CONFIRM_FRAMES)
+    frames = [letterboxed_frame(), letterboxed_frame(bars=200), letterboxed_frame()]
+    outputs = enhance(frames)
+    assert batch_shapes[-2:] == [[(24, 64), (24, 64)], [(40, 64)]]
+    for frame, output in zip(frames, outputs):
+        assert (output == upscale_2x(frame)).all()
+
+
+def test_active_area_cropper_roi():
+    cropper = bytecrush.ActiveAreaCropper(2, roi=(8, 4, 16, 100))
+    enhance_frame, shapes = shape_recording_enhance()
+    frame = letterboxed_frame()
+    output = cropper.wrap(enhance_frame)(frame)
+    # The region is clipped to the frame and goes through the model from the first frame on
+    assert shapes == [(36, 16)]
+    assert output.shape == (80, 128, 3)
+    assert (output[8:80, 16:48] == upscale_2x(frame[4:40, 8:24])).all()
+
+
+def test_process_video_reports_the_result_of_its_stages(tmp_path):
+    input_path = tmp_path / "input.mp4"
+    write_test_video(input_path)
+    output_path = tmp_path / "output.mp4"
+    assert bytecrush.process_video(str(input_path), str(output_path), scale_factor=2, jobs_dir=str(tmp_path / "jobs"))
+    assert cv2.VideoCapture(str(output_path)).get(cv2.CAP_PROP_FRAME_COUNT) == 6
+
+
+def test_process_video_fails_when_a_stage_fails(tmp_path, monkeypatch):
+    input_path = tmp_path / "input.mp4"
+    write_test_video(input_path)
+    # A fresh file at the output path does not make a failed mux count as a success
+    output_path = tmp_path / "output.mp4"
+
+    def failed_mux(input_video_path, temp_video_path, output_video_path):
+        output_path.write_bytes(b"partial")
+        return False
+
+    monkeypatch.setattr(bytecrush, "add_audio_to_video", failed_mux)
+    assert not bytecrush.process_video(str(input_path), str(output_path), scale_factor=2, jobs_dir=str(tmp_path / "jobs"))
+    assert not bytecrush.process_video(str(input_path), str(output_path), scale_factor=2, jobs_dir=str(tmp_path / "jobs"), resumable=True)
+
+
+def test_shot_model_policy_ignores_the_first_run_of_a_model():
+    policy = bytecrush.ShotModelPolicy(4, target_fps=10)
+    # The first batch loads the weights
+    policy.record("realesr-general-x4v3", 60.0, 1)
+    assert policy.cost_unit_seconds is None
+    policy.record("realesr-general-x4v3", 0.05, 1)
+    assert policy.cost_unit_seconds == 0.05
+    assert policy.choose(bytecrush.SHOT_HIGH_DETAIL, False) == "realesr-general-x4v3"
+
+
+def test_shot_model_policy_recovers_from_a_slow_estimate():
+    policy = bytecrush.ShotModelPolicy(4, target_fps=10)
+    policy.record("realesr-animevideov3", 0.0, 1)
+    # One slow batch puts every model over the budget of 0.1 s per frame
+    policy.record("realesr-animevideov3", 0.6, 1)
+    models = [policy.choose(bytecrush.SHOT_HIGH_DETAIL, False) for _ in range(12)]
+    assert models[0] == bytecrush.RESIZE_MODEL
+    assert models[-1] != bytecrush.RESIZE_MODEL
+    # Low-detail shots are resized whatever the budget, and do not relax it
+    cost_unit_seconds = policy.cost_unit_seconds
+    assert policy.choose(0, False) == bytecrush.RESIZE_MODEL
+    assert policy.cost_unit_seconds == cost_unit_seconds
+
+
+def test_raw_spill_goes_through_the_video_in_segments(tmp_path, monkeypatch):
+    input_path = tmp_path / "input.mp4"
+    write_test_video(input_path)
+    first_frames = []
+
+    def upscale(frames_path, output_path, outscale, realesrgan_options, result_cache=None):
+        frames, first_frame = bytecrush.open_raw_frames(frames_path)
+        first_frames.append(first_frame)
+        with bytecrush.RawFrameWriter(output_path, first_frame) as writer:
+            for frame in frames:
+                writer.write(upscale_2x(frame))
+        return True
+
+    monkeypatch.setattr(bytecrush, "upscale_with_realesrgan", upscale)
+    # Four 32x24 frames and their 2x frames per segment
+    monkeypatch.setattr(bytecrush, "RAW_SPILL_SEGMENT_MB", 4 * 32 * 24 * 3 * 5 / bytecrush.MB)
+    output_path = tmp_path / "output.mp4"
+    assert bytecrush.upscale_with_realesrgan_raw(str(input_path), str(output_path), str(tmp_path), 2, {})
+    assert first_frames == [0, 4]
+    cap = cv2.VideoCapture(str(output_path))
+    assert (cap.get(cv2.CAP_PROP_FRAME_COUNT), cap.get(cv2.CAP_PROP_FRAME_WIDTH)) == (6, 64)
+    # Every segment's raw frames are removed once it is encoded
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(bytecrush.RAW_FRAMES_EXT)]
+
+
+def test_concat_video_segments_fails_on_a_segment_without_frames(tmp_path):
+    segment_paths = [str(tmp_path / f"segment_{i}.mkv") for i in range(2)]
+    for segment_path in segment_paths:
+        write_test_video(segment_path, num_frames=3)
+    output_path = str(tmp_path / "joined.mkv")
+    bytecrush.concat_video_segments(segment_paths, output_path)
+    cap = cv2.VideoCapture(output_path)
+    assert sum(1 for _ in iter(lambda: cap.grab(), False)) == 6
+
+    empty_path = tmp_path / "segment_2.mkv"
+    empty_path.write_bytes(b"")
+    with pytest.raises(Exception, match="has no frames"):
+        bytecrush.concat_video_segments(segment_paths + [str(empty_path)], output_path)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import rawframes
+
+
+def test_raw_frames_round_trip(tmp_path):
+    path = str(tmp_path / 'clip.frames')
+    frames = np.arange(3 * 4 * 5 * 3, dtype=np.uint8).reshape(3, 4, 5, 3)
+    with rawframes.RawFrameWriter(path, first_frame=7) as writer:
+        for frame in frames:
+            writer.write(frame)
+
+    assert rawframes.is_raw_frames(path)
+    assert rawframes.read_raw_frames_header(path) == {'shape': [3, 4, 5, 3], 'dtype': 'uint8', 'first_frame': 7}
+    mapped, first_frame = rawframes.open_raw_frames(path)
+    assert first_frame == 7
+    assert (mapped == frames).all()
+
+
+def test_raw_frames_grayscale_frames_get_one_channel(tmp_path):
+    path = str(tmp_path / 'gray.frames')
+    with rawframes.RawFrameWriter(path) as writer:
+        writer.write(np.zeros((4, 5), np.uint8))
+        writer.write(np.ones((4, 5, 1), np.uint8))
+    mapped, _ = rawframes.open_raw_frames(path)
+    assert mapped.shape == (2, 4, 5, 1)
+    assert (mapped[1] == 1).all()
+
+
+def test_raw_frames_without_frames(tmp_path):
+    path = str(tmp_path / 'empty.frames')
+    rawframes.RawFrameWriter(path, first_frame=3).close()
+    frames, first_frame = rawframes.open_raw_frames(path)
+    assert frames.shape == (0, 0, 0, 3)
+    assert first_frame == 3
+
+
+def test_raw_frames_unfinished_file_is_not_recognized(tmp_path):
+    path = str(tmp_path / 'partial.frames')
+    writer = rawframes.RawFrameWriter(path)
+    writer.write(np.zeros((4, 5, 3), np.uint8))
+    writer._file.flush()
+    assert not rawframes.is_raw_frames(path)
+    with pytest.raises(ValueError):
+        rawframes.read_raw_frames_header(path)
+    writer.close()
+
+
+@pytest.mark.parametrize('frame', [
+    np.zeros((4, 5, 4), np.uint8),
+    np.zeros((4, 5), np.uint8),
+    np.zeros((4, 6, 3), np.uint8),
+    np.zeros((4, 5, 3), np.float32),
+])
+def test_raw_frame_writer_rejects_mismatched_frames(tmp_path, frame):
+    with rawframes.RawFrameWriter(str(tmp_path / 'clip.frames')) as writer:
+        writer.write(np.zeros((4, 5, 3), np.uint8))
+        with pytest.raises(ValueError):
+            writer.write(frame)
+        assert writer.count == 1